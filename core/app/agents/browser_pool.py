@@ -0,0 +1,239 @@
+# File: core/app/agents/browser_pool.py
+# --- Purpose: Long-lived pool of headless browser contexts and crawlers for URL assimilation. ---
+
+import asyncio
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+
+# Concurrent browser contexts (and crawler instances) kept warm.
+BROWSER_POOL_SIZE = int(os.getenv("KAIROS_BROWSER_POOL_SIZE", "2"))
+# A context (or crawler) is recycled after serving this many pages, to bound memory leaks.
+PAGES_PER_CONTEXT = int(os.getenv("KAIROS_BROWSER_PAGES_PER_CONTEXT", "25"))
+# Everything is closed after this many idle seconds, and relaunched on the next request.
+BROWSER_IDLE_TIMEOUT = float(os.getenv("KAIROS_BROWSER_IDLE_TIMEOUT", "300"))
+
+
+class _Pooled:
+    """A pooled resource (browser context or crawler) and how many pages it has served."""
+
+    def __init__(self, resource, browser=None):
+        self.resource = resource
+        self.browser = browser
+        self.uses = 0
+        self.broken = False
+
+
+class BrowserPool:
+    """
+    Keeps one Chromium and up to `size` browser contexts and crawl4ai crawlers warm between
+    assimilations. Playwright objects belong to the event loop that created them, so the pool
+    runs its own loop on a background thread; synchronous callers submit coroutines via run().
+    Contexts are recycled after `pages_per_context` pages or on any error, and everything is
+    shut down after `idle_timeout` seconds without use.
+    """
+
+    def __init__(self, load_scrapers, size: int = BROWSER_POOL_SIZE, pages_per_context: int = PAGES_PER_CONTEXT,
+                 idle_timeout: float = BROWSER_IDLE_TIMEOUT):
+        self._load_scrapers = load_scrapers
+        self.size = size
+        self.pages_per_context = pages_per_context
+        self.idle_timeout = idle_timeout
+
+        self._start_lock = threading.Lock()
+        self._loop = None
+        self._thread = None
+
+        # Owned by the pool's loop; only touched from coroutines running on it.
+        self._playwright = None
+        self._browser = None
+        self._contexts = []
+        self._crawlers = []
+        self._context_slots = None
+        self._crawler_slots = None
+        self._browser_lock = None
+        self._in_use = 0
+        self._last_used = time.monotonic()
+        self._reaper = None
+        self.stats = {"browser_launches": 0, "contexts_created": 0, "crawlers_created": 0, "pages_served": 0,
+                      "recycled": 0, "idle_shutdowns": 0}
+
+    # --- Thread / Loop Management ---
+    def run(self, coro, timeout: float = None):
+        """Runs a coroutine on the pool's event loop and waits for its result."""
+        self._ensure_loop()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result(timeout)
+
+    def submit(self, coro):
+        """Schedules a coroutine on the pool's event loop and returns a concurrent Future."""
+        self._ensure_loop()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    @property
+    def running(self) -> bool:
+        """Whether the pool's event loop thread is alive (it is started lazily and stopped by shutdown)."""
+        return self._thread is not None and self._thread.is_alive()
+
+    def _ensure_loop(self):
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._loop = asyncio.new_event_loop()
+            self._context_slots = asyncio.Semaphore(self.size)
+            self._crawler_slots = asyncio.Semaphore(self.size)
+            self._browser_lock = asyncio.Lock()
+            self._thread = threading.Thread(target=self._loop.run_forever, name="kairos-browser-pool", daemon=True)
+            self._thread.start()
+            self._reaper = asyncio.run_coroutine_threadsafe(self._reap_idle(), self._loop)
+
+    def shutdown(self, timeout: float = 30):
+        """Closes every browser, context and crawler and stops the pool's loop. Safe if never started."""
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                return
+            try:
+                asyncio.run_coroutine_threadsafe(self._close_all(), self._loop).result(timeout)
+            except Exception as e:
+                print(f"--- BROWSER POOL: Error during shutdown: {e} ---")
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout)
+            self._thread = None
+
+    # --- Browser Contexts ---
+    async def _ensure_browser(self):
+        if self._browser is not None and self._browser.is_connected():
+            return self._browser
+        # Concurrent first requests must share one driver and one Chromium, not each launch their own.
+        async with self._browser_lock:
+            if self._browser is not None and self._browser.is_connected():
+                return self._browser
+            scrapers = self._load_scrapers()
+            if self._playwright is None:
+                self._playwright = await scrapers.async_playwright().start()
+            print("--- BROWSER POOL: Launching Chromium ---")
+            self._browser = await self._playwright.chromium.launch(headless=True)
+            self.stats["browser_launches"] += 1
+            # Contexts of a crashed browser are useless; drop them so they are rebuilt.
+            self._contexts = [c for c in self._contexts if c.browser is self._browser]
+            return self._browser
+
+    @asynccontextmanager
+    async def page(self):
+        """Yields a fresh stealth page in a warm browser context."""
+        async with self._context_slots:
+            self._in_use += 1
+            pooled = None
+            page = None
+            try:
+                browser = await self._ensure_browser()
+                while self._contexts:
+                    candidate = self._contexts.pop()
+                    if candidate.browser is browser:
+                        pooled = candidate
+                        break
+                if pooled is None:
+                    pooled = _Pooled(await browser.new_context(), browser)
+                    self.stats["contexts_created"] += 1
+                page = await pooled.resource.new_page()
+                await self._load_scrapers().stealth_async(page)
+                yield page
+            except Exception:
+                if pooled is not None:
+                    pooled.broken = True
+                raise
+            finally:
+                if page is not None:
+                    try:
+                        await page.close()
+                    except Exception:
+                        if pooled is not None:
+                            pooled.broken = True
+                if pooled is not None:
+                    pooled.uses += 1
+                    self.stats["pages_served"] += 1
+                    await self._release_context(pooled)
+                self._in_use -= 1
+                self._last_used = time.monotonic()
+
+    async def _release_context(self, pooled: _Pooled):
+        alive = pooled.browser is self._browser and self._browser is not None and self._browser.is_connected()
+        if pooled.broken or not alive or pooled.uses >= self.pages_per_context:
+            self.stats["recycled"] += 1
+            try:
+                await pooled.resource.close()
+            except Exception:
+                pass
+        else:
+            self._contexts.append(pooled)
+
+    # --- crawl4ai Crawlers ---
+    @asynccontextmanager
+    async def crawler(self):
+        """Yields a started AsyncWebCrawler from the pool."""
+        async with self._crawler_slots:
+            self._in_use += 1
+            pooled = self._crawlers.pop() if self._crawlers else None
+            try:
+                if pooled is None:
+                    crawler = self._load_scrapers().AsyncWebCrawler()
+                    await crawler.start()
+                    pooled = _Pooled(crawler)
+                    self.stats["crawlers_created"] += 1
+                yield pooled.resource
+            except Exception:
+                if pooled is not None:
+                    pooled.broken = True
+                raise
+            finally:
+                if pooled is not None:
+                    pooled.uses += 1
+                    if pooled.broken or pooled.uses >= self.pages_per_context:
+                        self.stats["recycled"] += 1
+                        await self._close_quietly(pooled.resource)
+                    else:
+                        self._crawlers.append(pooled)
+                self._in_use -= 1
+                self._last_used = time.monotonic()
+
+    # --- Idle Timeout & Teardown ---
+    async def _reap_idle(self):
+        while True:
+            await asyncio.sleep(min(30.0, max(1.0, self.idle_timeout / 4)))
+            idle_for = time.monotonic() - self._last_used
+            warm = self._browser is not None or self._crawlers
+            if warm and self._in_use == 0 and idle_for >= self.idle_timeout:
+                print(f"--- BROWSER POOL: Idle for {int(idle_for)}s, closing browsers ---")
+                self.stats["idle_shutdowns"] += 1
+                await self._close_resources()
+
+    async def _close_resources(self):
+        contexts, crawlers = self._contexts, self._crawlers
+        self._contexts, self._crawlers = [], []
+        for pooled in contexts:
+            await self._close_quietly(pooled.resource)
+        for pooled in crawlers:
+            await self._close_quietly(pooled.resource)
+        # Waits for a launch in progress, so its driver and browser are closed too.
+        async with self._browser_lock:
+            if self._browser is not None:
+                await self._close_quietly(self._browser)
+                self._browser = None
+            if self._playwright is not None:
+                try:
+                    await self._playwright.stop()
+                except Exception:
+                    pass
+                self._playwright = None
+
+    async def _close_all(self):
+        if self._reaper is not None:
+            self._reaper.cancel()
+        await self._close_resources()
+
+    @staticmethod
+    async def _close_quietly(resource):
+        try:
+            await resource.close()
+        except Exception:
+            pass
@@ -0,0 +1,104 @@
+# File: core/app/agents/completion_cache.py
+# --- Purpose: Opt-in on-disk cache of agent completions for deterministic sampling settings. ---
+
+import hashlib
+import json
+import os
+import threading
+from .. import subsystems
+
+# Off unless KAIROS_COMPLETION_CACHE=1.
+COMPLETION_CACHE_ENABLED = os.getenv("KAIROS_COMPLETION_CACHE", "0") == "1"
+COMPLETION_CACHE_PATH = os.getenv("KAIROS_COMPLETION_CACHE_PATH", "./core/app/data/completion_cache")
+# Entries expire after this many seconds; the least recently stored are evicted beyond the size limit.
+COMPLETION_CACHE_TTL = float(os.getenv("KAIROS_COMPLETION_CACHE_TTL", str(7 * 24 * 3600)))
+COMPLETION_CACHE_SIZE_MB = int(os.getenv("KAIROS_COMPLETION_CACHE_SIZE_MB", "512"))
+# Comma-separated agent names that may be served from the cache.
+COMPLETION_CACHE_AGENTS = {
+    name.strip() for name in
+    os.getenv("KAIROS_COMPLETION_CACHE_AGENTS", "KairosManager,ResearchAgent,GhostwriterAgent,TaskMasterAgent").split(",")
+    if name.strip()
+}
+
+
+def _open_store():
+    # diskcache is SQLite-backed and safe to share between threads and processes.
+    import diskcache
+    return diskcache.Cache(COMPLETION_CACHE_PATH, size_limit=COMPLETION_CACHE_SIZE_MB * 1024 * 1024,
+                           eviction_policy="least-recently-stored")
+
+
+_store = subsystems.register("completion_cache", _open_store) if COMPLETION_CACHE_ENABLED else None
+
+
+def is_deterministic(sampling: dict) -> bool:
+    """A completion can only be replayed if the same request would produce it again."""
+    return (sampling.get("temperature") == 0 or sampling.get("top_k") == 1
+            or sampling.get("seed") is not None)
+
+
+def completion_key(model: str, system_message: str, messages: list, tools, sampling: dict) -> str:
+    """Stable hash of everything that determines a completion."""
+    payload = json.dumps({"model": model, "system": system_message, "messages": messages, "tools": tools or [],
+                          "sampling": sampling}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# bypassed_calls counts replies from listed agents that could not be cached because their
+# sampling is not deterministic.
+_stats = {"hits": 0, "misses": 0, "bypassed_calls": 0}
+_stats_lock = threading.Lock()
+
+
+def _count(name: str):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def stats() -> dict:
+    with _stats_lock:
+        lookups = _stats["hits"] + _stats["misses"]
+        return {**_stats, "enabled": COMPLETION_CACHE_ENABLED,
+                "hit_rate": round(_stats["hits"] / lookups, 4) if lookups else 0.0}
+
+
+def install(agent, model: str, sampling: dict, generate=None) -> bool:
+    """
+    Puts a cache lookup in front of an agent's LLM reply. Misses are answered by `generate`
+    (a reply function, e.g. the Ollama scheduler's) or the agent's own generate_oai_reply.
+    Does nothing (returns False) when the cache is disabled or the agent is not listed in
+    COMPLETION_CACHE_AGENTS. If its sampling is not deterministic, replies are only counted
+    as bypassed and False is returned.
+    """
+    if not COMPLETION_CACHE_ENABLED or agent.name not in COMPLETION_CACHE_AGENTS:
+        return False
+    import autogen
+    if not is_deterministic(sampling):
+        def bypassed_oai_reply(recipient, messages=None, sender=None, config=None):
+            _count("bypassed_calls")
+            return False, None  # Not final: the next reply function answers uncached.
+
+        agent.register_reply([autogen.Agent, None], bypassed_oai_reply, position=0)
+        return False
+
+    def cached_oai_reply(recipient, messages=None, sender=None, config=None):
+        if messages is None:
+            messages = recipient._oai_messages[sender]
+        key = completion_key(model, recipient.system_message, messages, recipient.llm_config.get("tools"), sampling)
+        store = _store.get()
+        reply = store.get(key)
+        if reply is not None:
+            _count("hits")
+            return True, reply
+        _count("misses")
+        if generate is not None:
+            final, reply = generate(recipient, messages=messages, sender=sender, config=config)
+        else:
+            final, reply = recipient.generate_oai_reply(messages=messages, sender=sender, config=config)
+        if final and reply is not None:
+            store.set(key, reply, expire=COMPLETION_CACHE_TTL)
+        return final, reply
+
+    # Position 0 is consulted first, ahead of the built-in LLM reply.
+    agent.register_reply([autogen.Agent, None], cached_oai_reply, position=0)
+    return True
@@ -0,0 +1,252 @@
+# File: core/app/agents/context_packer.py
+# --- Purpose: Keeps each agent's prompt within a per-model token budget as the group chat grows. ---
+
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter, deque
+
+# Set KAIROS_CONTEXT_PACKING=0 to send the full history every turn.
+CONTEXT_PACKING_ENABLED = os.getenv("KAIROS_CONTEXT_PACKING", "1") == "1"
+# Prompt tokens allowed per model (system prompt, tool schemas and history), leaving room for
+# the reply inside the model's context window. Override with KAIROS_CONTEXT_BUDGETS="model=tokens,...".
+CONTEXT_BUDGETS = {
+    "hermes-2-pro-llama-3-8b": 6144,  # 8k context
+    "qwq-abliterated:32b": 6144,
+    "mythomax-l2-13b": 3072,  # 4k context
+    "deepseek-coder:6.7b": 6144,
+    "huihui_ai/baronllm-abliterated:8b": 6144,
+}
+CONTEXT_BUDGETS.update({
+    model.strip(): int(tokens)
+    for model, _, tokens in (entry.partition("=") for entry in os.getenv("KAIROS_CONTEXT_BUDGETS", "").split(","))
+    if model.strip() and tokens.strip().isdigit()
+})
+DEFAULT_CONTEXT_BUDGET = int(os.getenv("KAIROS_CONTEXT_BUDGET", "3072"))
+# The newest messages are always sent verbatim; older ones are folded into a summary.
+KEEP_RECENT_MESSAGES = 4
+# Sentences kept from each summarized turn, and the cap on a summary line.
+SUMMARY_SENTENCES = 2
+SUMMARY_LINE_TOKENS = 60
+# Rough tokens-per-character ratio for Llama-family tokenizers on English text. No tokenizer for
+# the Ollama models is available in-process, so budgets are enforced on this estimate.
+CHARS_PER_TOKEN = 4
+# Separator retrieve_context puts between notes.
+RETRIEVAL_SEPARATOR = "\n---\n"
+
+_SENTENCE = re.compile(r"(?<=[.!?])\s+|\n+")
+_WORD = re.compile(r"[a-z0-9']{3,}")
+
+
+def count_tokens(text) -> int:
+    if not text:
+        return 0
+    if not isinstance(text, str):
+        text = json.dumps(text, default=str)
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def truncate_to_tokens(text: str, tokens: int) -> str:
+    """Cuts text to about `tokens`, at a word boundary where possible."""
+    limit = max(0, tokens) * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    cut = text[:limit]
+    space = cut.rfind(" ")
+    return (cut[:space] if space > limit // 2 else cut).rstrip() + " [...]"
+
+
+def _message_tokens(message: dict) -> int:
+    # Content plus the role/name framing and any tool call arguments.
+    return (4 + count_tokens(message.get("content")) + count_tokens(message.get("tool_calls"))
+            + count_tokens(message.get("function_call")))
+
+
+def _text_of(message: dict) -> str:
+    content = message.get("content") or ""
+    if isinstance(content, list):  # Multimodal content parts
+        content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content
+
+
+# --- Metrics ---
+_stats = {"turns": 0, "packed_turns": 0, "tokens_before": 0, "tokens_after": 0}
+_recent_turns = deque(maxlen=100)
+_stats_lock = threading.Lock()
+
+
+def _record(turn: dict):
+    with _stats_lock:
+        _stats["turns"] += 1
+        _stats["packed_turns"] += turn["saved"] > 0
+        _stats["tokens_before"] += turn["tokens_before"]
+        _stats["tokens_after"] += turn["tokens_after"]
+        _recent_turns.append(turn)
+
+
+def stats() -> dict:
+    """Totals of estimated prompt tokens before and after packing, plus the most recent turns."""
+    with _stats_lock:
+        return {**_stats, "tokens_saved": _stats["tokens_before"] - _stats["tokens_after"],
+                "enabled": CONTEXT_PACKING_ENABLED, "recent_turns": list(_recent_turns)[-20:]}
+
+
+# --- Retrieval Results ---
+def trim_retrieval(text: str, tokens: int) -> str:
+    """
+    Fits retrieve_context output to `tokens`. Notes are already in relevance order, so whole
+    notes are kept from the top and the first one that doesn't fit is truncated.
+    """
+    if count_tokens(text) <= tokens:
+        return text
+    kept, used = [], 0
+    for block in text.split(RETRIEVAL_SEPARATOR):
+        cost = count_tokens(block) + 1
+        if used + cost > tokens:
+            remaining = tokens - used
+            if remaining >= 32 or not kept:
+                kept.append(truncate_to_tokens(block, remaining))
+            break
+        kept.append(block)
+        used += cost
+    return RETRIEVAL_SEPARATOR.join(kept)
+
+
+# --- Packing ---
+class ContextPacker:
+    """
+    process_all_messages_before_reply hook for one agent. When the conversation no longer fits
+    the model's budget it:
+      1. keeps the first message (the user's request) and the newest KEEP_RECENT_MESSAGES
+         verbatim, never separating a tool call from its results;
+      2. replaces everything in between with an extractive summary: the most informative
+         sentences of each turn, scored by how often their words recur in the conversation.
+         Summaries are remembered per message, so the summary rolls forward cheaply;
+      3. trims retrieved context in tool results, lowest-ranked notes first;
+      4. as a last resort, truncates the longest remaining messages.
+    The agent's stored history is never modified; only the copy sent to the model is.
+    """
+
+    def __init__(self, agent, model: str, budget: int = None):
+        self.agent = agent
+        self.model = model
+        self.budget = budget or CONTEXT_BUDGETS.get(model, DEFAULT_CONTEXT_BUDGET)
+        self._summaries = {}
+
+    def _overhead(self) -> int:
+        # The system message and tool schemas are sent alongside the history every turn.
+        tools = (self.agent.llm_config or {}).get("tools") if isinstance(self.agent.llm_config, dict) else None
+        return count_tokens(self.agent.system_message) + count_tokens(tools)
+
+    def _recent_start(self, messages: list) -> int:
+        start = max(1, len(messages) - KEEP_RECENT_MESSAGES)
+        # Tool results must stay behind the assistant message that requested them.
+        while start > 1 and (messages[start].get("role") == "tool" or messages[start].get("tool_responses")):
+            start -= 1
+        return start
+
+    def _summary_line(self, message: dict, frequencies: Counter) -> str:
+        text = _text_of(message)
+        key = hashlib.sha1(f"{message.get('name')}\0{text}\0{message.get('tool_calls')}".encode("utf-8")).hexdigest()
+        line = self._summaries.get(key)
+        if line is not None:
+            return line
+        speaker = message.get("name") or message.get("role", "unknown")
+        if message.get("tool_calls"):
+            calls = ", ".join(call.get("function", {}).get("name", "?") for call in message["tool_calls"])
+            line = f"{speaker} called {calls}."
+        else:
+            sentences = [s.strip() for s in _SENTENCE.split(text) if len(s.strip()) > 3]
+            ranked = sorted(range(len(sentences)), reverse=True, key=lambda i: sum(
+                frequencies[word] for word in set(_WORD.findall(sentences[i].lower()))) / (1 + len(sentences[i]) / 80))
+            chosen = sorted(ranked[:SUMMARY_SENTENCES])
+            body = " ".join(sentences[i] for i in chosen) or "(no text)"
+            label = f"{speaker} (tool result)" if message.get("role") == "tool" or message.get("tool_responses") else speaker
+            line = f"{label}: {body}"
+        line = truncate_to_tokens(line, SUMMARY_LINE_TOKENS)
+        self._summaries[key] = line
+        return line
+
+    def _summarize(self, older: list, all_messages: list) -> dict:
+        frequencies = Counter(word for message in all_messages for word in _WORD.findall(_text_of(message).lower()))
+        lines = [self._summary_line(message, frequencies) for message in older]
+        return {"role": "user", "name": "ContextSummary",
+                "content": "Summary of earlier turns in this conversation:\n- " + "\n- ".join(lines)}
+
+    def _trim_tool_results(self, packed: list, excess: int) -> int:
+        """Shrinks tool results (retrieved context) from the oldest, returning the tokens removed."""
+        removed = 0
+        for message in packed:
+            if removed >= excess:
+                break
+            if not (message.get("role") == "tool" or message.get("tool_responses")):
+                continue
+            content = message.get("content")
+            if not isinstance(content, str):
+                continue
+            before = count_tokens(content)
+            target = max(64, before - (excess - removed))
+            message["content"] = trim_retrieval(content, target)
+            if message.get("tool_responses"):
+                # AutoGen sends the individual responses; copy them so the stored history is untouched.
+                message["tool_responses"] = [
+                    dict(response, content=trim_retrieval(response["content"], target))
+                    if isinstance(response.get("content"), str) else response
+                    for response in message["tool_responses"]]
+            removed += before - count_tokens(message["content"])
+        return removed
+
+    def _truncate_longest(self, packed: list, excess: int):
+        # The newest message is what the agent is replying to; it is cut only if nothing else is left.
+        candidates = sorted(range(len(packed)), key=lambda i: (i == len(packed) - 1, -count_tokens(packed[i].get("content"))))
+        for index in candidates:
+            if excess <= 0:
+                return
+            content = packed[index].get("content")
+            if not isinstance(content, str):
+                continue
+            tokens = count_tokens(content)
+            keep = max(32, tokens - excess)
+            if keep < tokens:
+                packed[index]["content"] = truncate_to_tokens(content, keep)
+                excess -= tokens - count_tokens(packed[index]["content"])
+
+    def __call__(self, messages: list) -> list:
+        overhead = self._overhead()
+        before = overhead + sum(_message_tokens(message) for message in messages)
+        turn = {"agent": self.agent.name, "model": self.model, "budget": self.budget, "messages": len(messages),
+                "tokens_before": before, "tokens_after": before, "saved": 0, "summarized": 0}
+        if before <= self.budget or len(messages) < 2:
+            _record(turn)
+            return messages
+
+        packed = [dict(message) for message in messages]
+        start = self._recent_start(packed)
+        if start > 1:
+            turn["summarized"] = start - 1
+            packed = [packed[0], self._summarize(packed[1:start], packed)] + packed[start:]
+
+        excess = overhead + sum(_message_tokens(message) for message in packed) - self.budget
+        if excess > 0:
+            excess -= self._trim_tool_results(packed, excess)
+        if excess > 0:
+            self._truncate_longest(packed, excess)
+
+        after = overhead + sum(_message_tokens(message) for message in packed)
+        turn.update(tokens_after=after, saved=before - after)
+        _record(turn)
+        print(f"--- CONTEXT: {self.agent.name} prompt packed from ~{before} to ~{after} tokens "
+              f"({turn['summarized']} turns summarized) ---")
+        return packed
+
+
+def install(agent, model: str):
+    """Packs the messages `agent` sends to `model` on every reply."""
+    if not CONTEXT_PACKING_ENABLED:
+        return None
+    packer = ContextPacker(agent, model)
+    agent.register_hook("process_all_messages_before_reply", packer)
+    return packer
@@ -0,0 +1,111 @@
+# File: core/app/agents/fetch_cache.py
+# --- Purpose: URL canonicalization and an on-disk cache of extracted pages for URL assimilation. ---
+
+import hashlib
+import json
+import os
+import threading
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+FETCH_CACHE_PATH = os.getenv("KAIROS_FETCH_CACHE_PATH", "./core/app/data/fetch_cache")
+# Entries without an ETag or Last-Modified validator are trusted for this many seconds.
+FETCH_CACHE_TTL = float(os.getenv("KAIROS_FETCH_CACHE_TTL", str(24 * 3600)))
+
+# Query parameters that only track the visitor and never change the page.
+_TRACKING_PARAMS = {"fbclid", "gclid", "dclid", "msclkid", "mc_cid", "mc_eid", "ref", "ref_src", "igshid"}
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def canonicalize_url(url: str) -> str:
+    """
+    Normalizes a URL so trivially different spellings of the same page dedupe: lowercases the
+    scheme and host, drops default ports, fragments and tracking parameters, and sorts the query.
+    Raises ValueError for anything that is not an absolute http(s) URL.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    if scheme not in _DEFAULT_PORTS or not parts.hostname:
+        raise ValueError(f"Not an http(s) URL: {url!r}")
+
+    host = parts.hostname.lower().rstrip(".")
+    if parts.port and parts.port != _DEFAULT_PORTS[scheme]:
+        host = f"{host}:{parts.port}"
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith("utm_") and key.lower() not in _TRACKING_PARAMS
+    )
+    return urlunsplit((scheme, host, parts.path or "/", urlencode(query), ""))
+
+
+def host_of(url: str) -> str:
+    return urlsplit(url).netloc
+
+
+class FetchCache:
+    """
+    Extracted page content keyed by canonical URL, one JSON file per URL. Entries keep the
+    ETag / Last-Modified validators the server sent, so a later fetch can revalidate with a
+    conditional request instead of crawling the page again.
+    """
+
+    def __init__(self, path: str = FETCH_CACHE_PATH, ttl: float = FETCH_CACHE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+
+    def _file_for(self, url: str) -> str:
+        return os.path.join(self.path, hashlib.sha256(url.encode("utf-8")).hexdigest() + ".json")
+
+    def get(self, url: str):
+        """Returns the cached entry for a canonical URL, or None."""
+        try:
+            with open(self._file_for(url), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return entry if entry.get("url") == url else None
+
+    def put(self, url: str, title: str, content: str, headers=None) -> dict:
+        """Stores extracted content together with the response's cache validators."""
+        headers = {k.lower(): v for k, v in (headers or {}).items()}
+        entry = {
+            "url": url,
+            "title": title,
+            "content": content,
+            "etag": headers.get("etag"),
+            "last_modified": headers.get("last-modified"),
+            "fetched_at": time.time(),
+        }
+        self._write(url, entry)
+        return entry
+
+    def touch(self, url: str, entry: dict) -> dict:
+        """Records a successful revalidation (304) so TTL-based freshness restarts."""
+        entry = {**entry, "fetched_at": time.time()}
+        self._write(url, entry)
+        return entry
+
+    def is_fresh(self, entry: dict) -> bool:
+        """Entries without validators cannot be revalidated, so they are trusted until the TTL."""
+        if entry.get("etag") or entry.get("last_modified"):
+            return False
+        return time.time() - entry.get("fetched_at", 0) < self.ttl
+
+    @staticmethod
+    def conditional_headers(entry: dict) -> dict:
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def _write(self, url: str, entry: dict):
+        target = self._file_for(url)
+        with self._lock:
+            os.makedirs(self.path, exist_ok=True)
+            temp = f"{target}.{threading.get_ident()}.tmp"
+            with open(temp, "w", encoding="utf-8") as f:
+                json.dump(entry, f)
+            os.replace(temp, target)
@@ -0,0 +1,253 @@
+# File: core/app/agents/ollama_scheduler.py
+# --- Purpose: Orders agent LLM calls so Ollama swaps models as rarely as possible. ---
+
+import os
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from contextlib import contextmanager
+import requests
+
+OLLAMA_URL = os.getenv("KAIROS_OLLAMA_URL", "http://localhost:11434").rstrip("/")
+# Set KAIROS_OLLAMA_SCHEDULER=0 to send every call straight to Ollama.
+OLLAMA_SCHEDULER_ENABLED = os.getenv("KAIROS_OLLAMA_SCHEDULER", "1") == "1"
+# Models that fit in memory together (keep in line with OLLAMA_MAX_LOADED_MODELS on the server).
+OLLAMA_MAX_RESIDENT = int(os.getenv("KAIROS_OLLAMA_MAX_RESIDENT", "1"))
+# How long Ollama keeps a model we loaded, in its duration format.
+OLLAMA_KEEP_ALIVE = os.getenv("KAIROS_OLLAMA_KEEP_ALIVE", "30m")
+# Seconds a call for a non-resident model may be held back while the resident model's batch
+# keeps running; after that the resident batch is drained and the model is swapped.
+OLLAMA_MAX_BATCH_WAIT = float(os.getenv("KAIROS_OLLAMA_MAX_BATCH_WAIT", "20"))
+# Seconds allowed for loading or unloading a model.
+OLLAMA_LOAD_TIMEOUT = float(os.getenv("KAIROS_OLLAMA_LOAD_TIMEOUT", "600"))
+# How often the resident set is re-read from /api/ps, so expiries and outside loads are noticed.
+PS_REFRESH_SECONDS = 10
+# A model is preloaded after a call when it has followed the current one this often...
+PREDICTION_MIN_SHARE = 0.6
+PREDICTION_MIN_SAMPLES = 3
+# ...counting only calls from the same conversation that came within this many seconds.
+PREDICTION_WINDOW = 120
+
+
+def _base_name(model: str) -> str:
+    # /api/ps reports untagged models as "<name>:latest".
+    return model[:-len(":latest")] if model.endswith(":latest") else model
+
+
+class ModelScheduler:
+    """
+    Admission control for calls to a local Ollama server, one model per call:
+
+    - Calls for a resident model run at once. Calls for other models queue by model, so that
+      when a swap is unavoidable the model with the most queued calls is loaded next and
+      they all run against a single load (calls from concurrent chats are batched by model).
+    - A swap only evicts a model with no calls in flight or queued. It unloads the victim and preloads
+      the target with keep_alive, instead of letting Ollama evict on its own schedule.
+    - Nobody waits forever: once a queued call has waited OLLAMA_MAX_BATCH_WAIT seconds, new
+      calls for resident models are held until the resident batch drains and its model gets loaded.
+    - Model-to-model transitions within a conversation are counted. When the server goes idle
+      and one successor clearly dominates, that model is preloaded ahead of the next call.
+
+    The resident set is learned from /api/ps and kept current as the scheduler loads models.
+    """
+
+    def __init__(self, base_url: str = OLLAMA_URL, max_resident: int = OLLAMA_MAX_RESIDENT,
+                 keep_alive: str = OLLAMA_KEEP_ALIVE, max_wait: float = OLLAMA_MAX_BATCH_WAIT):
+        self.base_url = base_url.rstrip("/")
+        self.max_resident = max(1, max_resident)
+        self.keep_alive = keep_alive
+        self.max_wait = max_wait
+        self._cond = threading.Condition()
+        self._resident = OrderedDict()  # model -> loaded (False while a load is in progress); LRU first
+        self._running = Counter()
+        self._waiting = {}  # model -> deque of enqueue times
+        self._transitions = {}  # model -> Counter of the model called next
+        self._local = threading.local()
+        self._synced_at = 0.0
+        self.stats = {"calls": 0, "immediate": 0, "queued": 0, "wait_seconds": 0.0, "loads": 0, "unloads": 0,
+                      "preloads": 0, "load_failures": 0}
+
+    # --- Ollama API ---
+    def _generate(self, model: str, keep_alive) -> bool:
+        """An empty /api/generate loads a model (or unloads it with keep_alive=0) without generating."""
+        try:
+            response = requests.post(f"{self.base_url}/api/generate", json={"model": model, "keep_alive": keep_alive},
+                                     timeout=OLLAMA_LOAD_TIMEOUT)
+            response.raise_for_status()
+            return True
+        except requests.RequestException as e:
+            print(f"--- OLLAMA: Could not {'unload' if keep_alive == 0 else 'load'} '{model}': {e} ---")
+            return False
+
+    def _sync(self):
+        """Re-reads the resident set from /api/ps, keeping models we are loading or using."""
+        if time.monotonic() - self._synced_at < PS_REFRESH_SECONDS:
+            return
+        self._synced_at = time.monotonic()
+        try:
+            response = requests.get(f"{self.base_url}/api/ps", timeout=5)
+            response.raise_for_status()
+            entries = response.json().get("models") or []
+        except (requests.RequestException, ValueError) as e:
+            print(f"--- OLLAMA: Could not read /api/ps: {e} ---")
+            return
+        reported = [_base_name(entry.get("name") or entry.get("model", "")) for entry in entries]
+        with self._cond:
+            for model in list(self._resident):
+                if model not in reported and self._resident[model] and not self._running[model]:
+                    del self._resident[model]
+            for model in reported:
+                self._resident.setdefault(model, True)
+            self._cond.notify_all()
+
+    # --- Admission ---
+    def _starving(self):
+        """The non-resident model whose oldest queued call has waited past max_wait, if any."""
+        now = time.monotonic()
+        overdue = [(queue[0], model) for model, queue in self._waiting.items()
+                   if model not in self._resident and now - queue[0] >= self.max_wait]
+        return min(overdue)[1] if overdue else None
+
+    def _admit(self, model: str):
+        """None to keep waiting, "run" if the model is resident, "load" if this call should load it."""
+        starving = self._starving()
+        if model in self._resident:
+            if not self._resident[model]:
+                return None  # Another call is loading it.
+            return "run" if starving in (None, model) else None
+        target = starving or max(
+            (model for model in self._waiting if model not in self._resident),
+            key=lambda candidate: (len(self._waiting[candidate]), -self._waiting[candidate][0]))
+        if model != target:
+            return None
+        if len(self._resident) < self.max_resident or self._victim(spare_queued=model != starving):
+            return "load"
+        return None
+
+    def _victim(self, spare_queued: bool = True):
+        """
+        Least recently used loaded model with no calls in flight. Models with calls still queued
+        are spared too, so a batch isn't split across two loads, unless a starving call needs the room.
+        """
+        return next((model for model, loaded in self._resident.items()
+                     if loaded and not self._running[model] and not (spare_queued and model in self._waiting)), None)
+
+    def _make_room(self, model: str):
+        """Reserves a slot for `model`, returning the model to unload first (if any). Caller holds the lock."""
+        victim = None
+        if len(self._resident) >= self.max_resident:
+            victim = self._victim(spare_queued=model != self._starving())
+            del self._resident[victim]
+        self._resident[model] = False
+        return victim
+
+    def _load(self, model: str, victim):
+        if victim is not None and self._generate(victim, 0):
+            self.stats["unloads"] += 1
+        loaded = self._generate(model, self.keep_alive)
+        with self._cond:
+            if loaded:
+                self.stats["loads"] += 1
+                self._resident[model] = True
+            else:
+                # The call itself will make Ollama load it; stop treating it as loading.
+                self.stats["load_failures"] += 1
+                self._resident.pop(model, None)
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, model: str):
+        """Holds the calling thread until a call to `model` can run without thrashing, then runs it."""
+        model = _base_name(model)
+        self._sync()
+        queued_at = time.monotonic()
+        with self._cond:
+            self.stats["calls"] += 1
+            self._waiting.setdefault(model, deque()).append(queued_at)
+            action = self._admit(model)
+            self.stats["immediate" if action else "queued"] += 1
+            while action is None:
+                # Waiting calls time out periodically so starvation is noticed without a notify.
+                self._cond.wait(timeout=1.0)
+                action = self._admit(model)
+            # Room is made while this call still counts as queued, so a starving call may evict.
+            victim = self._make_room(model) if action == "load" else None
+            queue = self._waiting[model]
+            queue.remove(queued_at)
+            if not queue:
+                del self._waiting[model]
+            self.stats["wait_seconds"] += time.monotonic() - queued_at
+            self._running[model] += 1
+            self._record_transition(model)
+            self._cond.notify_all()
+
+        try:
+            if action == "load":
+                self._load(model, victim)
+            yield
+        finally:
+            with self._cond:
+                self._running[model] -= 1
+                if model in self._resident:
+                    self._resident.move_to_end(model)
+                self._local.last = (model, time.monotonic())
+                self._cond.notify_all()
+            self._maybe_preload(model)
+
+    # --- Prediction ---
+    def new_conversation(self):
+        """Forgets the calling thread's previous model, so transitions aren't counted across chats."""
+        self._local.last = None
+
+    def _record_transition(self, model: str):
+        last = getattr(self._local, "last", None)
+        if last and time.monotonic() - last[1] <= PREDICTION_WINDOW:
+            self._transitions.setdefault(last[0], Counter())[model] += 1
+
+    def _maybe_preload(self, model: str):
+        with self._cond:
+            followers = self._transitions.get(model)
+            if not followers:
+                return
+            predicted, count = followers.most_common(1)[0]
+            total = sum(followers.values())
+            if total < PREDICTION_MIN_SAMPLES or count / total < PREDICTION_MIN_SHARE:
+                return
+            # Only when idle: a preload must never delay or evict work that is already queued.
+            if predicted in self._resident or self._waiting or any(self._running.values()):
+                return
+            if len(self._resident) >= self.max_resident and not self._victim():
+                return
+            victim = self._make_room(predicted)
+            self.stats["preloads"] += 1
+        threading.Thread(target=self._load, args=(predicted, victim), daemon=True,
+                         name=f"ollama-preload-{predicted}").start()
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            return {**self.stats, "wait_seconds": round(self.stats["wait_seconds"], 3),
+                    "resident": [model for model, loaded in self._resident.items() if loaded],
+                    "loading": [model for model, loaded in self._resident.items() if not loaded],
+                    "queued_now": {model: len(queue) for model, queue in self._waiting.items()},
+                    "enabled": OLLAMA_SCHEDULER_ENABLED}
+
+
+scheduler = ModelScheduler()
+
+
+def install(agent, model: str):
+    """
+    Routes an agent's LLM replies through the scheduler. Returns the scheduled reply function,
+    so a reply function placed in front of it (the completion cache) can call it on a miss;
+    returns None when the scheduler is disabled.
+    """
+    if not OLLAMA_SCHEDULER_ENABLED:
+        return None
+
+    def scheduled_oai_reply(recipient, messages=None, sender=None, config=None):
+        with scheduler.slot(model):
+            return recipient.generate_oai_reply(messages=messages, sender=sender, config=config)
+
+    import autogen
+    agent.register_reply([autogen.Agent, None], scheduled_oai_reply, position=0)
+    return scheduled_oai_reply
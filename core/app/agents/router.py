@@ -0,0 +1,118 @@
+# File: core/app/agents/router.py
+# --- Purpose: Picks the next group chat speaker without an LLM call whenever the choice is clear. ---
+
+import math
+import os
+import re
+import threading
+from .. import crud
+
+# Set KAIROS_SPEAKER_ROUTER=0 to go back to plain LLM ("auto") selection.
+SPEAKER_ROUTER_ENABLED = os.getenv("KAIROS_SPEAKER_ROUTER", "1") == "1"
+# An embedding match is trusted when the best role scores at least this cosine similarity
+# and beats the runner-up by the margin; otherwise the LLM decides.
+ROUTER_MIN_SIMILARITY = float(os.getenv("KAIROS_ROUTER_MIN_SIMILARITY", "0.3"))
+ROUTER_MIN_MARGIN = float(os.getenv("KAIROS_ROUTER_MIN_MARGIN", "0.05"))
+
+_stats = {"tool_state": 0, "mention": 0, "similarity": 0, "llm_fallback": 0}
+_stats_lock = threading.Lock()
+
+
+def _count(name: str):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def stats() -> dict:
+    """How each turn's speaker was chosen; everything except llm_fallback saved a selection call."""
+    with _stats_lock:
+        avoided = _stats["tool_state"] + _stats["mention"] + _stats["similarity"]
+        return {**_stats, "avoided_llm_selections": avoided, "enabled": SPEAKER_ROUTER_ENABLED}
+
+
+def _cosine(a, b) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class SpeakerRouter:
+    """
+    A GroupChat speaker_selection_method. In order of precedence:
+      1. Tool-call state: a suggested tool call goes to the executor, and its result goes back
+         to the agent that asked for it.
+      2. Explicit mentions: a message that names exactly one other agent hands over to it.
+      3. Similarity between the message and each agent's role prompt (the executor excluded).
+    When none of these is conclusive it returns "auto" and AutoGen asks the LLM as before.
+    """
+
+    def __init__(self, executor, roles: dict):
+        # roles maps each routable agent to the text that describes it (its system prompt).
+        self.executor = executor
+        self.roles = roles
+        self._role_embeddings = None
+
+    def _embed_roles(self):
+        if self._role_embeddings is None:
+            agents = list(self.roles)
+            # Role prompts never change, so after the first conversation these come from the query LRU.
+            vectors = crud.embed_queries([self.roles[agent] for agent in agents])
+            self._role_embeddings = dict(zip(agents, vectors))
+        return self._role_embeddings
+
+    def _by_tool_state(self, last_speaker, groupchat):
+        message = groupchat.messages[-1]
+        if message.get("tool_calls") or message.get("function_call"):
+            return self.executor
+        if last_speaker is self.executor and (message.get("role") == "tool" or message.get("tool_responses")):
+            # The executor just returned a result: back to whoever requested the call.
+            for earlier in reversed(groupchat.messages[:-1]):
+                if earlier.get("tool_calls") or earlier.get("function_call"):
+                    return groupchat.agent_by_name(earlier.get("name"))
+        return None
+
+    def _by_mention(self, last_speaker, content: str):
+        mentioned = {agent for agent in self.roles
+                     if agent is not last_speaker and re.search(rf"\b{re.escape(agent.name)}\b", content)}
+        return mentioned.pop() if len(mentioned) == 1 else None
+
+    def _by_similarity(self, last_speaker, content: str):
+        candidates = [agent for agent in self.roles if agent is not last_speaker]
+        if len(candidates) < 2:
+            return None
+        roles = self._embed_roles()
+        query = crud.embed_queries([content], remember=False)[0]
+        scored = sorted(((_cosine(query, roles[agent]), agent) for agent in candidates),
+                        key=lambda pair: pair[0], reverse=True)
+        (best, agent), (runner_up, _) = scored[0], scored[1]
+        if best >= ROUTER_MIN_SIMILARITY and best - runner_up >= ROUTER_MIN_MARGIN:
+            return agent
+        return None
+
+    def __call__(self, last_speaker, groupchat):
+        if not groupchat.messages:
+            _count("llm_fallback")
+            return "auto"
+        speaker = self._by_tool_state(last_speaker, groupchat)
+        if speaker is not None:
+            _count("tool_state")
+            return speaker
+
+        content = groupchat.messages[-1].get("content") or ""
+        if isinstance(content, list):  # Multimodal content parts
+            content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+        if content.strip():
+            speaker = self._by_mention(last_speaker, content)
+            if speaker is not None:
+                _count("mention")
+                return speaker
+            try:
+                speaker = self._by_similarity(last_speaker, content)
+            except Exception as e:
+                print(f"--- ROUTER: Similarity routing failed, asking the LLM: {e} ---")
+                speaker = None
+            if speaker is not None:
+                _count("similarity")
+                return speaker
+        _count("llm_fallback")
+        return "auto"
@@ -0,0 +1,96 @@
+# File: core/app/agents/streaming.py
+# --- Purpose: Runs an agent conversation while pushing turns, tool calls and tokens to a listener. ---
+
+import threading
+
+
+class ChatCancelled(Exception):
+    """Raised inside the conversation thread once the client has gone away."""
+
+
+class _EventIOStream:
+    """
+    AutoGen IOStream that forwards streamed model tokens as events instead of printing them.
+    AutoGen writes token chunks with end="" (or, on newer versions, as stream events through
+    send()); everything else it prints is console chatter we already report as turn events.
+    """
+
+    def __init__(self, emit, cancelled: threading.Event):
+        self._emit = emit
+        self._cancelled = cancelled
+
+    def _check_cancelled(self):
+        if self._cancelled.is_set():
+            raise ChatCancelled()
+
+    def print(self, *objects, sep: str = " ", end: str = "\n", flush: bool = False):
+        self._check_cancelled()
+        if end == "":
+            text = sep.join(str(o) for o in objects)
+            if text:
+                self._emit({"type": "token", "content": text})
+
+    def send(self, message):
+        self._check_cancelled()
+        content = getattr(message, "content", None)
+        if "Stream" in type(message).__name__ and isinstance(content, str) and content:
+            self._emit({"type": "token", "content": content})
+
+    def input(self, prompt: str = "", *, password: bool = False) -> str:
+        # Agents run with human_input_mode="NEVER"; there is never a human to ask.
+        return ""
+
+
+def _turn_events(sender_name: str, message) -> list:
+    """Translates one agent message into stream events: a tool call, tool results or a turn."""
+    if isinstance(message, str):
+        message = {"content": message}
+    events = []
+    if message.get("tool_calls"):
+        for call in message["tool_calls"]:
+            function = call.get("function", {})
+            events.append({"type": "tool_call", "sender": sender_name, "id": call.get("id"),
+                           "name": function.get("name"), "arguments": function.get("arguments")})
+    elif message.get("tool_responses"):
+        for response in message["tool_responses"]:
+            events.append({"type": "tool_result", "sender": sender_name, "id": response.get("tool_call_id"),
+                           "content": response.get("content")})
+    elif message.get("content"):
+        events.append({"type": "message", "sender": sender_name, "content": message["content"]})
+    return events
+
+
+def _attach_hooks(kairos_team, emit, cancelled: threading.Event):
+    """Reports every message an agent posts to the group chat, and aborts once cancelled."""
+    manager = kairos_team.group_chat_manager
+
+    def before_send(sender, message, recipient, silent):
+        if cancelled.is_set():
+            raise ChatCancelled()
+        # Agents post turns to the manager, which rebroadcasts them; report each turn once.
+        if recipient is manager:
+            for event in _turn_events(sender.name, message):
+                emit(event)
+        return message
+
+    for agent in kairos_team.groupchat.agents:
+        agent.register_hook("process_message_before_send", before_send)
+
+
+def run_streaming(kairos_team, message: str, emit, cancelled: threading.Event):
+    """
+    Runs the conversation on the calling thread, emitting events as they happen and always
+    finishing with exactly one of: done (with the final reply), cancelled, or error.
+    """
+    from autogen.io import IOStream
+
+    _attach_hooks(kairos_team, emit, cancelled)
+    try:
+        with IOStream.set_default(_EventIOStream(emit, cancelled)):
+            reply = kairos_team.run(message)
+        emit({"type": "done", "reply": reply})
+    except ChatCancelled:
+        print("--- CHAT: Client disconnected, conversation cancelled. ---")
+        emit({"type": "cancelled"})
+    except Exception as e:
+        emit({"type": "error", "detail": str(e)})
@@ -1,8 +1,12 @@
 # File: core/app/agents/team.py
 # --- Purpose: Defines the multi-agent team using AutoGen. ---
 
+import os
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
 import autogen
-from . import prompts, tools
+from . import completion_cache, context_packer, ollama_scheduler, prompts, router, tools
 from functools import partial
 
 # --- LLM Configuration ---
@@ -12,105 +16,247 @@ llm_config_list = [
     {
         "model": "hermes-2-pro-llama-3-8b",  # The Manager
         "api_key": "ollama",
-        "base_url": "http://localhost:11434/v1",
+        "base_url": f"{ollama_scheduler.OLLAMA_URL}/v1",
     },
     {
         "model": "qwq-abliterated:32b",  # The Deep Thinker
         "api_key": "ollama",
-        "base_url": "http://localhost:11434/v1",
+        "base_url": f"{ollama_scheduler.OLLAMA_URL}/v1",
     },
     {
         "model": "mythomax-l2-13b",  # The Ghostwriter
         "api_key": "ollama",
-        "base_url": "http://localhost:11434/v1",
+        "base_url": f"{ollama_scheduler.OLLAMA_URL}/v1",
     },
     {
         "model": "deepseek-coder:6.7b",  # The Code Writer
         "api_key": "ollama",
-        "base_url": "http://localhost:11434/v1",
+        "base_url": f"{ollama_scheduler.OLLAMA_URL}/v1",
     },
     {
         "model": "huihui_ai/baronllm-abliterated:8b",  # The Security Expert
         "api_key": "ollama",
-        "base_url": "http://localhost:11434/v1",
+        "base_url": f"{ollama_scheduler.OLLAMA_URL}/v1",
     },
 ]
 
-# --- Agent Definitions ---
-
-# The user's proxy. It represents you in the conversation and executes tools.
-user_proxy = autogen.UserProxyAgent(
-    name="UserProxy",
-    human_input_mode="NEVER",
-    max_consecutive_auto_reply=10,
-    is_termination_msg=lambda x: x.get("content", "").rstrip().endswith("TERMINATE"),
-    code_execution_config=False,
-    system_message="You are the user's representative. You execute functions on their behalf. Reply TERMINATE when the task is done."
-)
-
-# The Manager Agent
-manager = autogen.ConversableAgent(
-    name="KairosManager",
-    system_message=prompts.MANAGER_PROMPT,
-    llm_config={"config_list": llm_config_list, "filter_dict": {"model": ["hermes-2-pro-llama-3-8b"]}},
-)
-
-# The Research Agent (Deep Thinker)
-researcher = autogen.ConversableAgent(
-    name="ResearchAgent",
-    system_message=prompts.DEEP_THINKER_PROMPT,
-    llm_config={"config_list": llm_config_list, "filter_dict": {"model": ["qwq-abliterated:32b"]}},
-)
-
-# The Ghostwriter Agent
-ghostwriter = autogen.ConversableAgent(
-    name="GhostwriterAgent",
-    system_message=prompts.GHOSTWRITER_PROMPT,
-    llm_config={"config_list": llm_config_list, "filter_dict": {"model": ["mythomax-l2-13b"]}},
-)
-
-# The TaskMaster Agent
-taskmaster = autogen.ConversableAgent(
-    name="TaskMasterAgent",
-    system_message=prompts.TASK_MASTER_PROMPT,
-    llm_config={"config_list": llm_config_list, "filter_dict": {"model": ["hermes-2-pro-llama-3-8b"]}},
-)
-
-# --- The Group Chat ---
-# We create a group chat that includes all our agents.
-groupchat = autogen.GroupChat(
-    agents=[user_proxy, manager, researcher, ghostwriter, taskmaster],
-    messages=[],
-    max_round=15,
-    speaker_selection_method="auto"  # The manager will decide who speaks next
-)
-
-# The Group Chat Manager orchestrates the conversation.
-group_chat_manager = autogen.GroupChatManager(
-    groupchat=groupchat,
-    llm_config={"config_list": llm_config_list, "filter_dict": {"model": ["hermes-2-pro-llama-3-8b"]}},
-)
+# --- Concurrency ---
+# How many /chat/ conversations may run at once in this process, and how long (seconds)
+# a request waits for a free slot before it is turned away.
+MAX_CONCURRENT_CHATS = int(os.getenv("KAIROS_MAX_CONCURRENT_CHATS", "4"))
+CHAT_SLOT_TIMEOUT = float(os.getenv("KAIROS_CHAT_SLOT_TIMEOUT", "30"))
+
+_chat_slots = threading.BoundedSemaphore(MAX_CONCURRENT_CHATS)
+
+
+class ChatCapacityError(RuntimeError):
+    """Raised when every chat slot stays busy for longer than the wait timeout."""
+
+
+def acquire_chat_slot(timeout: float = CHAT_SLOT_TIMEOUT):
+    """Takes one of the MAX_CONCURRENT_CHATS slots; pair with release_chat_slot()."""
+    if not _chat_slots.acquire(timeout=timeout):
+        raise ChatCapacityError(f"All {MAX_CONCURRENT_CHATS} chat slots are busy.")
+
+
+def release_chat_slot():
+    _chat_slots.release()
+
+
+@contextmanager
+def chat_slot(timeout: float = CHAT_SLOT_TIMEOUT):
+    """Holds one of the MAX_CONCURRENT_CHATS slots for the duration of a conversation."""
+    acquire_chat_slot(timeout)
+    try:
+        yield
+    finally:
+        release_chat_slot()
+
+
+# --- Sampling ---
+# Unset means the model's own default. Completions are only cached when sampling is
+# deterministic: KAIROS_LLM_TEMPERATURE=0 or a fixed KAIROS_LLM_SEED.
+LLM_TEMPERATURE = os.getenv("KAIROS_LLM_TEMPERATURE")
+LLM_SEED = os.getenv("KAIROS_LLM_SEED")
+
+
+def _sampling() -> dict:
+    sampling = {}
+    if LLM_TEMPERATURE is not None:
+        sampling["temperature"] = float(LLM_TEMPERATURE)
+    if LLM_SEED is not None:
+        sampling["seed"] = int(LLM_SEED)
+    return sampling
+
+
+def _llm_config(model: str, stream: bool = False) -> dict:
+    """LLM config that pins an agent to one of the models in llm_config_list."""
+    # AutoGen's own cache_seed cache has no expiry and ignores sampling; completion_cache replaces it.
+    config = {"config_list": llm_config_list, "filter_dict": {"model": [model]}, "cache_seed": None, **_sampling()}
+    if stream:
+        config["stream"] = True
+    return config
+
+
+# --- Agent Team ---
+# The model the GroupChatManager asks when the router leaves speaker selection to the LLM.
+SELECTOR_MODEL = "hermes-2-pro-llama-3-8b"
+
+
+class ScheduledGroupChat(autogen.GroupChat):
+    """
+    A GroupChat whose LLM speaker selection waits for an Ollama scheduler slot, like every agent
+    reply. Selection runs on private helper agents that carry none of the agents' reply functions,
+    so without this it would call SELECTOR_MODEL whenever it liked and force the model swaps the
+    scheduler is there to prevent. Router decisions made without the LLM don't take a slot.
+    """
+
+    def _auto_select_speaker(self, *args, **kwargs):
+        if not ollama_scheduler.OLLAMA_SCHEDULER_ENABLED:
+            return super()._auto_select_speaker(*args, **kwargs)
+        with ollama_scheduler.scheduler.slot(SELECTOR_MODEL):
+            return super()._auto_select_speaker(*args, **kwargs)
+
+
+@dataclass
+class KairosTeam:
+    """One isolated set of agents and group chat. Never shared between conversations."""
+    user_proxy: autogen.UserProxyAgent
+    manager: autogen.ConversableAgent
+    researcher: autogen.ConversableAgent
+    ghostwriter: autogen.ConversableAgent
+    taskmaster: autogen.ConversableAgent
+    groupchat: autogen.GroupChat
+    group_chat_manager: autogen.GroupChatManager
+
+    def run(self, message: str) -> str:
+        """Runs a conversation to completion and returns the final reply."""
+        ollama_scheduler.scheduler.new_conversation()
+        self.user_proxy.initiate_chat(recipient=self.group_chat_manager, message=message)
+        # The last message in the chat history is the final reply
+        return self.groupchat.messages[-1]['content']
+
+
+def build_team(db_session, user_id, stream: bool = False) -> KairosTeam:
+    """
+    Builds a fresh agent team and group chat whose tools are bound to one request's database
+    session and user. Agents are cheap to construct (no model is loaded here), so every
+    conversation gets its own history and tool context instead of sharing module globals.
+    With stream=True the specialist agents request token streaming from their models.
+    """
+    # The user's proxy. It represents you in the conversation and executes tools.
+    user_proxy = autogen.UserProxyAgent(
+        name="UserProxy",
+        human_input_mode="NEVER",
+        max_consecutive_auto_reply=10,
+        is_termination_msg=lambda x: x.get("content", "").rstrip().endswith("TERMINATE"),
+        code_execution_config=False,
+        system_message="You are the user's representative. You execute functions on their behalf. Reply TERMINATE when the task is done."
+    )
+
+    # The Manager Agent
+    manager = autogen.ConversableAgent(
+        name="KairosManager",
+        system_message=prompts.MANAGER_PROMPT,
+        llm_config=_llm_config("hermes-2-pro-llama-3-8b", stream),
+    )
+
+    # The Research Agent (Deep Thinker)
+    researcher = autogen.ConversableAgent(
+        name="ResearchAgent",
+        system_message=prompts.DEEP_THINKER_PROMPT,
+        llm_config=_llm_config("qwq-abliterated:32b", stream),
+    )
+
+    # The Ghostwriter Agent
+    ghostwriter = autogen.ConversableAgent(
+        name="GhostwriterAgent",
+        system_message=prompts.GHOSTWRITER_PROMPT,
+        llm_config=_llm_config("mythomax-l2-13b", stream),
+    )
+
+    # The TaskMaster Agent
+    taskmaster = autogen.ConversableAgent(
+        name="TaskMasterAgent",
+        system_message=prompts.TASK_MASTER_PROMPT,
+        llm_config=_llm_config("hermes-2-pro-llama-3-8b", stream),
+    )
+
+    # --- The Group Chat ---
+    # We create a group chat that includes all our agents.
+    # The router settles clear-cut turns itself and leaves the rest to the manager's LLM ("auto").
+    speaker_selection = "auto"
+    if router.SPEAKER_ROUTER_ENABLED:
+        speaker_selection = router.SpeakerRouter(executor=user_proxy, roles={
+            manager: prompts.MANAGER_PROMPT,
+            researcher: prompts.DEEP_THINKER_PROMPT,
+            ghostwriter: prompts.GHOSTWRITER_PROMPT,
+            taskmaster: prompts.TASK_MASTER_PROMPT,
+        })
+    groupchat = ScheduledGroupChat(
+        agents=[user_proxy, manager, researcher, ghostwriter, taskmaster],
+        messages=[],
+        max_round=15,
+        speaker_selection_method=speaker_selection
+    )
+
+    # The Group Chat Manager orchestrates the conversation. Its speaker selection never streams.
+    group_chat_manager = autogen.GroupChatManager(
+        groupchat=groupchat,
+        llm_config=_llm_config(SELECTOR_MODEL),
+    )
+
+    team = KairosTeam(
+        user_proxy=user_proxy,
+        manager=manager,
+        researcher=researcher,
+        ghostwriter=ghostwriter,
+        taskmaster=taskmaster,
+        groupchat=groupchat,
+        group_chat_manager=group_chat_manager,
+    )
+    register_tools(team, db_session=db_session, user_id=user_id)
+    # Registered after the tools so the cache key and token budget include each agent's tool
+    # schemas. History is packed to the model's budget before the cache is consulted; only
+    # misses wait for the Ollama scheduler.
+    for agent, model in ((manager, "hermes-2-pro-llama-3-8b"), (researcher, "qwq-abliterated:32b"),
+                         (ghostwriter, "mythomax-l2-13b"), (taskmaster, "hermes-2-pro-llama-3-8b")):
+        context_packer.install(agent, model)
+        scheduled_reply = ollama_scheduler.install(agent, model)
+        completion_cache.install(agent, model, _sampling(), generate=scheduled_reply)
+    return team
 
 
 # --- Tool Registration ---
 # We need to register our Python functions as tools that the agents can use.
 # We use functools.partial to pass the db session and user_id to the tools when they are called.
-def register_tools(db_session, user_id):
+def register_tools(team: KairosTeam, db_session, user_id):
     # Create partial functions with the database session and user_id baked in.
     retrieve_context_with_context = partial(tools.retrieve_context, db=db_session, user_id=user_id)
+    retrieve_context_batch_with_context = partial(tools.retrieve_context_batch, db=db_session, user_id=user_id)
     create_note_with_context = partial(tools.create_note_tool, db=db_session, user_id=user_id)
     create_project_with_context = partial(tools.create_project_tool, db=db_session, user_id=user_id)
     create_task_with_context = partial(tools.create_task_tool, db=db_session, user_id=user_id)
     log_anchor_with_context = partial(tools.log_anchor_tool, db=db_session, user_id=user_id)
 
+    user_proxy, researcher, taskmaster = team.user_proxy, team.researcher, team.taskmaster
+
     # Register tools with the agents that should have access to them.
     # The UserProxy executes the code, and the specialist agents suggest calling it.
 
     # Research Tool
     user_proxy.register_for_execution(name="retrieve_context")(retrieve_context_with_context)
     researcher.register_for_llm(name="retrieve_context",
-                                description="Search the user's knowledge base for context on a query.")(
+                                description="Search the user's knowledge base for context on a query. "
+                                            "Optional mode: 'hybrid' (default), 'vector' for conceptual "
+                                            "questions, or 'lexical' for exact terms like error codes or flags.")(
         retrieve_context_with_context)
+    user_proxy.register_for_execution(name="retrieve_context_batch")(retrieve_context_batch_with_context)
+    researcher.register_for_llm(name="retrieve_context_batch",
+                                description="Search the user's knowledge base for several queries in one call, "
+                                            "e.g. the sub-questions of a research question. Returns results "
+                                            "grouped per query. Same optional mode as retrieve_context.")(
+        retrieve_context_batch_with_context)
 
     # Task Management Tools
     user_proxy.register_for_execution(name="create_note_tool")(create_note_with_context)
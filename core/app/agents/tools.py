@@ -3,42 +3,72 @@
 
 import asyncio
 import json
-from bs4 import BeautifulSoup
+import os
+import queue
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from typing import List
 from sqlalchemy.orm import Session
-from .. import crud, schemas, models
-from ..crud import notes_collection, embedding_model
-import trafilatura
-from crawl4ai import AsyncWebCrawler
-from playwright.async_api import async_playwright
-from playwright_stealth import stealth_async
+from .. import crud, schemas, models, cache, search, subsystems, takeout
+from ..vector_store import collections
+from .browser_pool import BrowserPool
+from .context_packer import trim_retrieval, RETRIEVAL_SEPARATOR
+from .fetch_cache import FetchCache, canonicalize_url, host_of
+
+
+# --- Lazily Loaded Scraping Stack ---
+def _load_scrapers():
+    # crawl4ai, playwright and trafilatura are slow to import, so they load on first use.
+    import trafilatura
+    from crawl4ai import AsyncWebCrawler
+    from playwright.async_api import async_playwright
+    from playwright_stealth import stealth_async
+    return SimpleNamespace(
+        trafilatura=trafilatura,
+        AsyncWebCrawler=AsyncWebCrawler,
+        async_playwright=async_playwright,
+        stealth_async=stealth_async,
+    )
+
+
+_scrapers = subsystems.register("scrapers", _load_scrapers)
+
+
+# Warm browsers and crawlers shared by every assimilation (see browser_pool.py).
+browser_pool = BrowserPool(_scrapers.get)
+
 
 # --- Helper function for async Playwright ---
 async def _run_playwright_stealth(url: str):
-    """Internal async function to run a headless browser with stealth to scrape a page."""
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
-        page = await browser.new_page()
-        await stealth_async(page)
-        await page.goto(url, wait_until="networkidle")
-        html_content = await page.content()
-        await browser.close()
-        return html_content
+    """
+    Internal async function to load a page with stealth in a pooled headless browser context.
+    Returns (html, response_headers).
+    """
+    async with browser_pool.page() as page:
+        response = await page.goto(url, wait_until="networkidle")
+        return await page.content(), (response.headers if response else {})
 
 # --- Async Core Logic for Scraping ---
-async def _scrape_and_assimilate_url_async(url: str, db: Session, user_id: int) -> str:
-    """Async core logic for scraping a URL, trying crawl4ai first, then playwright."""
-    print(f"--- TOOL: Assimilating URL: {url} ---")
+async def _scrape_url_async(url: str):
+    """
+    Async core logic for scraping a URL, trying crawl4ai first, then playwright.
+    Runs on the browser pool's event loop. Returns (page_title, content, headers, error).
+    """
+    scrapers = _scrapers.get()
     content = None
     page_title = None
+    headers = {}
 
     try:
         # --- Attempt 1: Use the powerful crawl4ai for structured data ---
         print("--- Trying crawl4ai... ---")
-        async with AsyncWebCrawler() as crawler:
+        async with browser_pool.crawler() as crawler:
             result = await crawler.arun(url=url)
             if result and result.markdown:
                 content = result.markdown
-                page_title = result.metadata.get("title", url)
+                page_title = (result.metadata or {}).get("title", url)
+                headers = getattr(result, "response_headers", None) or {}
     except Exception as e:
         print(f"--- crawl4ai failed: {e}. Falling back to Playwright Stealth. ---")
         content = None
@@ -47,65 +77,248 @@ async def _scrape_and_assimilate_url_async(url: str, db: Session, user_id: int)
         try:
             # --- Attempt 2: Fallback to Playwright Stealth for JS-heavy sites ---
             print("--- Trying Playwright Stealth... ---")
-            html_content = await _run_playwright_stealth(url)
-            content = trafilatura.extract(html_content)
+            html_content, headers = await _run_playwright_stealth(url)
+            content = scrapers.trafilatura.extract(html_content)
             if content:
-                page_title = trafilatura.extract_metadata(html_content).title or url
+                metadata = scrapers.trafilatura.extract_metadata(html_content)
+                page_title = (metadata.title if metadata else None) or url
         except Exception as e:
-            return f"An error occurred with both scrapers: {e}"
+            return None, None, {}, f"An error occurred with both scrapers: {e}"
 
     if not content:
-        return f"Error: Could not extract main content from {url}."
+        return None, None, {}, f"Error: Could not extract main content from {url}."
+    return page_title, content, headers, None
+
+
+# --- Batch URL Assimilation ---
+# Pages fetched at once across all hosts, at once per host, and the pause (seconds)
+# between two requests to the same host.
+ASSIMILATE_CONCURRENCY = int(os.getenv("KAIROS_ASSIMILATE_CONCURRENCY", "4"))
+ASSIMILATE_PER_HOST = int(os.getenv("KAIROS_ASSIMILATE_PER_HOST", "1"))
+ASSIMILATE_HOST_DELAY = float(os.getenv("KAIROS_ASSIMILATE_HOST_DELAY", "1.0"))
+REVALIDATE_TIMEOUT = 15
+# How often (seconds) a batch waiting on results checks that its crawl is still alive.
+ASSIMILATE_POLL_SECONDS = 5
+
+# Extracted pages by canonical URL, so re-assimilating an unchanged page skips the crawl.
+fetch_cache = FetchCache()
+
+
+class _HostLimiter:
+    """Per-host politeness: at most `per_host` requests in flight and `delay` seconds between them."""
+
+    def __init__(self, per_host: int = ASSIMILATE_PER_HOST, delay: float = ASSIMILATE_HOST_DELAY):
+        self.per_host = per_host
+        self.delay = delay
+        self._slots = {}
+        self._next_start = {}
+
+    @asynccontextmanager
+    async def slot(self, host: str):
+        loop = asyncio.get_running_loop()
+        async with self._slots.setdefault(host, asyncio.Semaphore(self.per_host)):
+            wait = self._next_start.get(host, 0) - loop.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            try:
+                yield
+            finally:
+                self._next_start[host] = loop.time() + self.delay
+
+
+def _revalidate(url: str, entry: dict) -> bool:
+    """Sends a conditional GET with the cached validators; True when the page is unchanged (304)."""
+    import requests
+    response = requests.get(url, headers=fetch_cache.conditional_headers(entry), timeout=REVALIDATE_TIMEOUT,
+                            stream=True)
+    response.close()
+    return response.status_code == 304
+
 
-    # Use the create_note_tool to save it to the database
-    result = create_note_tool(title=f"Assimilated: {page_title}", content=content, db=db, user_id=user_id)
-    return result
+async def _fetch_for_assimilation(url: str, limiter: _HostLimiter, slots: asyncio.Semaphore):
+    """Returns (entry, source) where source is 'cache', 'revalidated' or 'fetched', or (error, None)."""
+    entry = await asyncio.to_thread(fetch_cache.get, url)
+    if entry and fetch_cache.is_fresh(entry):
+        return entry, "cache"
+
+    # The host slot (and its politeness delay) comes first, so URLs waiting on a busy host
+    # don't hold global slots that other hosts could use.
+    async with limiter.slot(host_of(url)), slots:
+        if entry:
+            try:
+                if await asyncio.to_thread(_revalidate, url, entry):
+                    return await asyncio.to_thread(fetch_cache.touch, url, entry), "revalidated"
+            except Exception as e:
+                print(f"--- Revalidation of {url} failed: {e}. Fetching again. ---")
+        page_title, content, headers, error = await _scrape_url_async(url)
+
+    if error:
+        return error, None
+    return await asyncio.to_thread(fetch_cache.put, url, page_title, content, headers), "fetched"
+
+
+async def _crawl_batch(jobs, report, concurrency: int = ASSIMILATE_CONCURRENCY):
+    """Fetches every (index, url) job on the browser pool's loop, reporting each as it finishes."""
+    limiter = _HostLimiter()
+    slots = asyncio.Semaphore(concurrency)
+
+    async def run(index, url):
+        try:
+            outcome, source = await _fetch_for_assimilation(url, limiter, slots)
+        except Exception as e:
+            outcome, source = f"An error occurred while fetching: {e}", None
+        report((index, url, outcome, source))
+
+    await asyncio.gather(*(run(index, url) for index, url in jobs))
+
+
+def assimilate_urls(urls, db: Session, user_id: int):
+    """
+    Assimilates many URLs, yielding one result dict per input URL in completion order.
+    URLs are canonicalized and deduplicated, then crawled concurrently on the browser pool
+    (bounded globally and per host). Notes are created here, on the caller's thread and
+    session; a page identical to one of the user's existing notes is not saved twice.
+    """
+    jobs, seen = [], {}
+    for index, raw_url in enumerate(urls):
+        try:
+            url = canonicalize_url(raw_url)
+        except ValueError as e:
+            yield {"index": index, "url": raw_url, "status": "invalid", "error": str(e)}
+            continue
+        if url in seen:
+            yield {"index": index, "url": url, "status": "duplicate", "duplicate_of": seen[url]}
+            continue
+        seen[url] = index
+        jobs.append((index, url))
+    if not jobs:
+        return
+
+    print(f"--- TOOL: Assimilating {len(jobs)} URLs ---")
+    finished = queue.Queue()
+    crawl = browser_pool.submit(_crawl_batch(jobs, finished.put))
+    pending = dict(jobs)
+    try:
+        while pending:
+            try:
+                index, url, outcome, source = finished.get(timeout=ASSIMILATE_POLL_SECONDS)
+            except queue.Empty:
+                if crawl.done() and finished.empty():
+                    # Every job reports before the crawl returns, so the rest were lost with it.
+                    if not crawl.cancelled() and crawl.exception() is not None:
+                        raise crawl.exception()
+                    error = "The crawl ended before this URL was fetched."
+                elif not browser_pool.running:
+                    error = "The browser pool stopped before this URL was fetched."
+                else:
+                    continue
+                for index, url in sorted(pending.items()):
+                    yield {"index": index, "url": url, "status": "failed", "error": error}
+                return
+            del pending[index]
+            if source is None:
+                yield {"index": index, "url": url, "status": "failed", "error": outcome}
+                continue
+            title = f"Assimilated: {outcome['title']}"
+            note_id = crud.find_note_id(db, user_id, title, outcome["content"])
+            status = "exists"
+            if note_id is None:
+                note = crud.create_user_note(db=db, note=schemas.NoteCreate(title=title, content=outcome["content"]),
+                                             user_id=user_id)
+                note_id, status = note.id, "created"
+            yield {"index": index, "url": url, "status": status, "note_id": note_id, "title": title,
+                   "source": source}
+    finally:
+        # Stops outstanding fetches if the consumer goes away early.
+        crawl.cancel()
 
 # --- Synchronous Wrapper for AutoGen ---
 def scrape_and_assimilate_url(url: str, db: Session, user_id: int) -> str:
     """
     Synchronous wrapper for the async scraping tool. This is the function
-    that will be registered with AutoGen.
+    that will be registered with AutoGen. Single URLs share the batch path,
+    including the fetch cache.
     """
-    return asyncio.run(_scrape_and_assimilate_url_async(url, db, user_id))
+    result = next(assimilate_urls([url], db, user_id))
+    if result["status"] == "created":
+        return f"Successfully created note titled '{result['title']}'."
+    if result["status"] == "exists":
+        return f"Note '{result['title']}' is already in the knowledge base."
+    return result["error"]
 
 # --- New Tool: Google Takeout Processor ---
-def process_google_takeout(file_path: str, db: Session, user_id: int) -> str:
+# Searches embedded and written to the vector store per batch.
+TAKEOUT_BATCH_SIZE = 512
+
+
+def _index_takeout_batch(collection, records, user_id: int) -> int:
+    """Embeds and stores the searches of one batch that are not indexed yet; returns how many were added."""
+    unique = {takeout.record_id(user_id, record): record for record in records}
+    existing = set(collection.get(ids=list(unique), include=[])["ids"])
+    new = [(vector_id, record) for vector_id, record in unique.items() if vector_id not in existing]
+    if not new:
+        return 0
+
+    documents = [record["query"] for _, record in new]
+    metadatas = []
+    for _, record in new:
+        metadata = {"source": "google_takeout", "owner_id": user_id}
+        if record["timestamp"]:
+            metadata["timestamp"] = record["timestamp"]
+        if record["searched_at"]:
+            metadata["searched_at"] = int(record["searched_at"].timestamp())
+        metadatas.append(metadata)
+
+    embeddings = crud.embed_texts(documents)
+    collection.add(
+        embeddings=embeddings,
+        documents=documents,
+        metadatas=metadatas,
+        ids=[vector_id for vector_id, _ in new]
+    )
+    return len(new)
+
+
+def process_google_takeout(file_path: str, db: Session, user_id: int, progress=None) -> str:
     """
     Processes a Google Takeout 'My Activity' HTML file, extracts search queries,
-    and adds them to the AI's knowledge base.
+    and adds them to the AI's knowledge base. The export is streamed and indexed in
+    batches of TAKEOUT_BATCH_SIZE; searches already indexed by an earlier import are
+    skipped. `progress`, if given, is called after each batch with a counters dict.
     """
     print(f"--- TOOL: Processing Google Takeout file: {file_path} ---")
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            soup = BeautifulSoup(f, 'html.parser')
-
-        # Find all content cells that contain search queries
-        content_cells = soup.find_all('div', class_='content-cell')
-        search_queries = []
-        for cell in content_cells:
-            # Google uses a specific structure for search queries
-            if cell.text.strip().startswith('Searched for'):
-                query_link = cell.find('a')
-                if query_link and query_link.text:
-                    search_queries.append(query_link.text)
-
-        if not search_queries:
-            return "No search queries found in the provided file."
+        reader = takeout.SearchActivityReader(file_path)
+        collection = collections.get(user_id)
+        found = added = 0
+        batch = []
+
+        def flush():
+            nonlocal added
+            added += _index_takeout_batch(collection, batch, user_id)
+            batch.clear()
+            counters = {"found": found, "added": added, "bytes_read": reader.bytes_read,
+                        "total_bytes": reader.total_bytes}
+            percent = 100 * reader.bytes_read // max(reader.total_bytes, 1)
+            print(f"--- TAKEOUT: {percent}% read, {found} searches found, {added} new ---")
+            if progress:
+                progress(counters)
 
-        # Embed and add the queries to the vector store
-        embeddings = embedding_model.encode(search_queries).tolist()
-        ids = [f"takeout_{user_id}_{i}" for i in range(len(search_queries))]
-        metadatas = [{"source": "google_takeout", "owner_id": user_id} for _ in search_queries]
+        for record in reader:
+            found += 1
+            batch.append(record)
+            if len(batch) >= TAKEOUT_BATCH_SIZE:
+                flush()
+        if batch:
+            flush()
 
-        notes_collection.add(
-            embeddings=embeddings,
-            documents=search_queries,
-            metadatas=metadatas,
-            ids=ids
-        )
+        if not found:
+            return "No search queries found in the provided file."
+        if added:
+            cache.invalidate_owner(user_id)
 
-        return f"Successfully processed and assimilated {len(search_queries)} search queries from your Google Takeout file."
+        return (f"Successfully processed {found} search queries from your Google Takeout file: "
+                f"{added} newly assimilated, {found - added} already in your knowledge base.")
 
     except FileNotFoundError:
         return f"Error: The file was not found at the specified path: {file_path}"
@@ -113,27 +326,239 @@ def process_google_takeout(file_path: str, db: Session, user_id: int) -> str:
         return f"An error occurred while processing the Takeout file: {e}"
 
 
-# --- Other Tools (Unchanged) ---
+# --- Retrieval Settings ---
+# Passages fetched from the vector store per query, before grouping by note.
+RETRIEVAL_CANDIDATES = 20
+# Notes returned to the agent, and the best passages kept for each of them.
+RETRIEVAL_MAX_NOTES = 5
+PASSAGES_PER_NOTE = 2
+# "vector" (embeddings only), "lexical" (SQLite FTS5 / BM25 only) or "hybrid" (both, fused).
+RETRIEVAL_MODES = ("vector", "lexical", "hybrid")
+DEFAULT_RETRIEVAL_MODE = "hybrid"
+# Estimated tokens of context one retrieve_context call may return; lower-ranked notes are cut first.
+RETRIEVAL_TOKEN_BUDGET = int(os.getenv("KAIROS_RETRIEVAL_TOKEN_BUDGET", "1500"))
+# Queries accepted by one retrieve_context_batch call, and the smallest share of the token
+# budget each query's section is trimmed to.
+RETRIEVAL_MAX_QUERIES = 8
+RETRIEVAL_MIN_QUERY_TOKENS = 256
+
+# Runs the vector half of a hybrid search while the calling thread runs BM25.
+_search_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="kairos-search")
+
+
+def _is_duplicate_passage(passage, kept) -> bool:
+    """A passage is redundant if its text was already kept or at least half of it overlaps a kept passage."""
+    if passage["document"] == kept["document"]:
+        return True
+    if passage["start"] is None or kept["start"] is None:
+        return False
+    shared = min(passage["end"], kept["end"]) - max(passage["start"], kept["start"])
+    return shared > 0 and shared * 2 >= passage["end"] - passage["start"]
 
-def retrieve_context(query: str, db: Session, user_id: int) -> str:
+
+def _group_passages(ids, documents, metadatas, distances, max_notes: int = RETRIEVAL_MAX_NOTES):
     """
-    This is the primary tool for the ResearchAgent.
-    It performs a RAG query against the user's ChromaDB vector store.
+    Groups ranked passage hits by the note they came from, keeping notes in order of
+    their best passage. Within a note, duplicate and overlapping passages are dropped.
+    Hits without a note_id (e.g. Takeout queries, legacy whole-note vectors) stand alone.
     """
-    print(f"--- TOOL: Retrieving context for query: '{query}' ---")
-    query_embedding = embedding_model.encode(query).tolist()
-    results = notes_collection.query(
+    groups = {}
+    for hit_id, document, metadata, distance in zip(ids, documents, metadatas, distances):
+        metadata = metadata or {}
+        key = metadata.get("note_id", hit_id)
+        group = groups.setdefault(key, {"key": key, "title": metadata.get("title"), "score": distance, "passages": []})
+        if len(group["passages"]) >= PASSAGES_PER_NOTE:
+            continue
+        passage = {"document": document, "start": metadata.get("start"), "end": metadata.get("end")}
+        if not any(_is_duplicate_passage(passage, kept) for kept in group["passages"]):
+            group["passages"].append(passage)
+    ranked = sorted(groups.values(), key=lambda g: g["score"])
+    return ranked[:max_notes]
+
+
+def _render_group(group) -> str:
+    """Formats one note's passages in document order, trimming the chunker's overlap between them."""
+    passages = sorted(group["passages"], key=lambda p: p["start"] if p["start"] is not None else 0)
+    body = ""
+    previous_end = None
+    for passage in passages:
+        text = passage["document"]
+        contiguous = previous_end is not None and passage["start"] is not None and passage["start"] <= previous_end
+        if contiguous:
+            body += text[previous_end - passage["start"]:]
+        else:
+            body += ("\n[...]\n" if body else "") + text
+        if passage["end"] is not None:
+            previous_end = max(previous_end or 0, passage["end"])
+    return f"Title: {group['title']}\n{body}" if group["title"] else body
+
+
+def _vector_groups(query: str, user_id: int, max_notes: int = RETRIEVAL_MAX_NOTES) -> list:
+    """Nearest-neighbour passages from the user's collection, grouped per note."""
+    query_embedding = crud.embed_query(query)
+    results = collections.get(user_id).query(
         query_embeddings=[query_embedding],
-        n_results=5,
-        where={"owner_id": user_id}
+        n_results=RETRIEVAL_CANDIDATES,
+        where=collections.where_for(user_id),
+        include=["documents", "metadatas", "distances"]
+    )
+    ids = results.get('ids', [[]])[0]
+    if not ids:
+        return []
+    return _group_passages(
+        ids, results['documents'][0], results['metadatas'][0], results['distances'][0], max_notes=max_notes
     )
-    retrieved_documents = results.get('documents', [[]])[0]
-    if not retrieved_documents:
-        return "No relevant information found in the knowledge base."
-    context_str = "\n---\n".join(retrieved_documents)
-    print(f"--- TOOL: Found context: {context_str[:200]}... ---")
+
+
+def _lexical_groups(query: str, db: Session, user_id: int, max_notes: int = RETRIEVAL_MAX_NOTES) -> list:
+    """BM25 matches from the FTS5 index, shaped like vector groups (one snippet passage each)."""
+    return [
+        {"key": hit["note_id"], "title": hit["title"], "score": hit["score"],
+         "passages": [{"document": hit["snippet"], "start": None, "end": None}]}
+        for hit in search.lexical_search(db, user_id, query, limit=max_notes)
+    ]
+
+
+def _vector_groups_batch(queries: list, user_id: int, max_notes: int = RETRIEVAL_MAX_NOTES) -> list:
+    """
+    Like _vector_groups for many queries at once: one encode pass for all of them and one
+    multi-embedding query against the collection. Returns one group list per query.
+    """
+    results = collections.get(user_id).query(
+        query_embeddings=crud.embed_queries(queries),
+        n_results=RETRIEVAL_CANDIDATES,
+        where=collections.where_for(user_id),
+        include=["documents", "metadatas", "distances"]
+    )
+    batches = []
+    for index in range(len(queries)):
+        ids = results['ids'][index]
+        batches.append(_group_passages(
+            ids, results['documents'][index], results['metadatas'][index], results['distances'][index],
+            max_notes=max_notes
+        ) if ids else [])
+    return batches
+
+
+def _hybrid_groups(query: str, db: Session, user_id: int) -> list:
+    """
+    Runs vector and BM25 search concurrently and merges them with reciprocal rank fusion.
+    A note found by both keeps its vector passages, which are richer than the FTS snippet.
+    """
+    vector_future = _search_pool.submit(_vector_groups, query, user_id, RETRIEVAL_CANDIDATES)
+    lexical = _lexical_groups(query, db, user_id, max_notes=RETRIEVAL_CANDIDATES)
+    return _fuse_groups(vector_future.result(), lexical)
+
+
+def _fuse_groups(vector: list, lexical: list) -> list:
+    """Reciprocal rank fusion of one query's vector and BM25 groups, keeping vector passages."""
+    by_key = {group["key"]: group for group in lexical}
+    by_key.update({group["key"]: group for group in vector})
+    fused = search.reciprocal_rank_fusion([
+        [group["key"] for group in vector],
+        [group["key"] for group in lexical],
+    ])
+    return [by_key[key] for key in fused[:RETRIEVAL_MAX_NOTES]]
+
+
+def retrieve_context(query: str, db: Session, user_id: int, mode: str = DEFAULT_RETRIEVAL_MODE) -> str:
+    """
+    This is the primary tool for the ResearchAgent.
+    It searches the user's knowledge base and returns the best-matching passages, grouped
+    per note. `mode` picks the search: "vector" (semantic), "lexical" (exact terms such as
+    error codes, names or CLI flags) or "hybrid" (both, fused). Results are cached per user
+    until their notes change.
+    """
+    print(f"--- TOOL: Retrieving context ({mode}) for query: '{query}' ---")
+    if mode not in RETRIEVAL_MODES:
+        return f"Error: Unknown retrieval mode '{mode}'. Use one of: {', '.join(RETRIEVAL_MODES)}."
+
+    cache_key = cache.retrieval_results.key_for(user_id, (mode, cache.normalize_query(query)))
+    cached = cache.retrieval_results.get(cache_key)
+    if cached is not cache.MISSING:
+        print("--- TOOL: Retrieval cache hit ---")
+        return cached
+
+    if mode == "vector":
+        groups = _vector_groups(query, user_id)
+    elif mode == "lexical":
+        groups = _lexical_groups(query, db, user_id)
+    else:
+        groups = _hybrid_groups(query, db, user_id)
+
+    if not groups:
+        context_str = "No relevant information found in the knowledge base."
+    else:
+        context_str = trim_retrieval(RETRIEVAL_SEPARATOR.join(_render_group(group) for group in groups),
+                                     RETRIEVAL_TOKEN_BUDGET)
+        print(f"--- TOOL: Found context: {context_str[:200]}... ---")
+    cache.retrieval_results.put(cache_key, context_str)
     return context_str
 
+def _batch_groups(queries: list, db: Session, user_id: int, mode: str) -> list:
+    """One group list per query, with every vector lookup done in a single batched query."""
+    if mode == "lexical":
+        return [_lexical_groups(query, db, user_id) for query in queries]
+    if mode == "vector":
+        return _vector_groups_batch(queries, user_id)
+    vector_future = _search_pool.submit(_vector_groups_batch, queries, user_id, RETRIEVAL_CANDIDATES)
+    lexical = [_lexical_groups(query, db, user_id, max_notes=RETRIEVAL_CANDIDATES) for query in queries]
+    return [_fuse_groups(vector, lexical_groups) for vector, lexical_groups in zip(vector_future.result(), lexical)]
+
+
+def retrieve_context_batch(queries: List[str], db: Session, user_id: int, mode: str = DEFAULT_RETRIEVAL_MODE) -> str:
+    """
+    Batched retrieve_context for a research question broken into several sub-queries: all
+    queries are embedded together and searched with one vector-store call. Results come back
+    grouped per query; a note that matches several queries is shown only under the first,
+    and later queries point back to it.
+    """
+    print(f"--- TOOL: Retrieving context ({mode}) for {len(queries or [])} queries ---")
+    if mode not in RETRIEVAL_MODES:
+        return f"Error: Unknown retrieval mode '{mode}'. Use one of: {', '.join(RETRIEVAL_MODES)}."
+    if isinstance(queries, str):
+        queries = [queries]
+    unique = {}
+    for query in queries or []:
+        if isinstance(query, str) and query.strip():
+            unique.setdefault(cache.normalize_query(query), query.strip())
+    if not unique:
+        return "Error: Provide at least one non-empty query."
+    if len(unique) > RETRIEVAL_MAX_QUERIES:
+        return f"Error: At most {RETRIEVAL_MAX_QUERIES} queries can be searched at once."
+    queries = list(unique.values())
+
+    cache_key = cache.retrieval_results.key_for(user_id, ("batch", mode, tuple(unique)))
+    cached = cache.retrieval_results.get(cache_key)
+    if cached is not cache.MISSING:
+        print("--- TOOL: Retrieval cache hit ---")
+        return cached
+
+    section_budget = max(RETRIEVAL_TOKEN_BUDGET // len(queries), RETRIEVAL_MIN_QUERY_TOKENS)
+    shown = {}
+    sections = []
+    for number, (query, groups) in enumerate(zip(queries, _batch_groups(queries, db, user_id, mode)), start=1):
+        blocks, seen_earlier = [], []
+        for group in groups:
+            if group["key"] in shown:
+                seen_earlier.append(f"'{group['title'] or group['key']}' (query {shown[group['key']]})")
+                continue
+            shown[group["key"]] = number
+            blocks.append(_render_group(group))
+        if blocks:
+            body = trim_retrieval(RETRIEVAL_SEPARATOR.join(blocks), section_budget)
+        else:
+            body = "No new information found in the knowledge base."
+        if seen_earlier:
+            body += f"\nAlso relevant, shown above: {', '.join(seen_earlier)}."
+        sections.append(f"### Query {number}: {query}\n{body}")
+
+    context_str = "\n\n".join(sections)
+    print(f"--- TOOL: Found context for {len(queries)} queries, {len(shown)} distinct notes ---")
+    cache.retrieval_results.put(cache_key, context_str)
+    return context_str
+
+
 def create_note_tool(title: str, content: str, db: Session, user_id: int) -> str:
     """Creates a new note in the user's database."""
     print(f"--- TOOL: Creating note with title: '{title}' ---")
@@ -144,19 +569,27 @@ def create_note_tool(title: str, content: str, db: Session, user_id: int) -> str
 def create_project_tool(name: str, db: Session, user_id: int) -> str:
     """Creates a new project in the user's database."""
     print(f"--- TOOL: Creating project with name: '{name}' ---")
+    if crud.get_project_id_by_name(db=db, user_id=user_id, name=name) is not None:
+        return f"Project '{name}' already exists."
     project_data = schemas.ProjectCreate(name=name)
-    crud.create_user_project(db=db, project=project_data, user_id=user_id)
+    # The check above is cached; another chat may have created the project since.
+    project, created = crud.get_or_create_user_project(db=db, project=project_data, user_id=user_id)
+    if not created:
+        return f"Project '{project.name}' already exists."
     return f"Successfully created project named '{name}'."
 
 def create_task_tool(project_name: str, title: str, db: Session, user_id: int) -> str:
     """Creates a new task under a specific project for the user."""
     print(f"--- TOOL: Creating task '{title}' for project '{project_name}' ---")
-    projects = crud.get_projects(db=db, user_id=user_id, limit=1000)
-    target_project = next((p for p in projects if p.name.lower() == project_name.lower()), None)
-    if not target_project:
+    project_id = crud.get_project_id_by_name(db=db, user_id=user_id, name=project_name)
+    if project_id is None:
+        suggestions = crud.suggest_project_names(db=db, user_id=user_id, name=project_name)
+        if suggestions:
+            options = ", ".join(f"'{s}'" for s in suggestions)
+            return f"Error: Project '{project_name}' not found. Did you mean: {options}?"
         return f"Error: Project '{project_name}' not found."
     task_data = schemas.TaskCreate(title=title)
-    crud.create_project_task(db=db, task=task_data, project_id=target_project.id)
+    crud.create_project_task(db=db, task=task_data, project_id=project_id)
     return f"Successfully created task '{title}' in project '{project_name}'."
 
 def log_anchor_tool(anchor_name: str, reflection: str, db: Session, user_id: int) -> str:
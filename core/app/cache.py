@@ -0,0 +1,150 @@
+# File: core/app/cache.py
+# --- Purpose: Small in-process caches used to skip repeated embedding and retrieval work. ---
+
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+# Sentinel returned by get() on a miss, so that None can be cached as a value.
+MISSING = object()
+
+
+class LRUCache:
+    """A thread-safe, size-bounded LRU mapping that counts hits and misses."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=MISSING):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            return self._data.pop(key, default)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+class TTLCache(LRUCache):
+    """An LRUCache whose entries also expire `ttl` seconds after they were stored."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        super().__init__(maxsize)
+        self.ttl = ttl
+
+    def get(self, key, default=MISSING):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value, ttl: float = None):
+        """Stores a value for `ttl` seconds (default: the cache's ttl). Non-positive TTLs are not stored."""
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+        super().put(key, (time.monotonic() + ttl, value))
+
+    def pop(self, key, default=None):
+        entry = super().pop(key, None)
+        return default if entry is None else entry[1]
+
+
+class OwnerScopedCache(LRUCache):
+    """
+    An LRU cache whose entries belong to an owner (user). invalidate_owner() bumps the
+    owner's generation, so every entry cached for them before the bump stops matching and
+    simply ages out of the LRU. That keeps invalidation O(1) regardless of cache size.
+    """
+
+    def __init__(self, maxsize: int):
+        super().__init__(maxsize)
+        self._generations = {}
+        self.invalidations = 0
+
+    def key_for(self, owner_id, key):
+        """
+        Returns the scoped key for an owner's entry. Take it *before* computing the value, so a
+        result computed across an invalidation is stored under the old, already-dead generation.
+        """
+        with self._lock:
+            return owner_id, self._generations.get(owner_id, 0), key
+
+    def invalidate_owner(self, owner_id):
+        with self._lock:
+            self._generations[owner_id] = self._generations.get(owner_id, 0) + 1
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats["invalidations"] = self.invalidations
+        return stats
+
+
+def normalize_query(text: str) -> str:
+    """Canonical form used as a cache key: trimmed, lower-cased, whitespace collapsed."""
+    return re.sub(r"\s+", " ", (text or "").strip()).lower()
+
+
+# --- Shared Cache Instances ---
+# Query embeddings keyed by (model name, normalized query).
+query_embeddings = LRUCache(int(os.getenv("KAIROS_QUERY_EMBEDDING_CACHE_SIZE", "1024")))
+# Rendered retrieval results keyed per user; invalidated whenever that user's vectors change.
+retrieval_results = OwnerScopedCache(int(os.getenv("KAIROS_RETRIEVAL_CACHE_SIZE", "256")))
+
+
+def invalidate_owner(owner_id):
+    """Drops every cached retrieval result for a user. Call after any vector-store write for them."""
+    retrieval_results.invalidate_owner(owner_id)
+
+
+def stats() -> dict:
+    """Hit/miss counters for every shared cache, for tuning their sizes."""
+    return {
+        "query_embeddings": query_embeddings.stats(),
+        "retrieval_results": retrieval_results.stats(),
+    }
@@ -0,0 +1,47 @@
+# File: core/app/chunking.py
+# --- Purpose: Splits long note content into overlapping passages for the vector store. ---
+
+import os
+from typing import List, Tuple
+
+# Passage window and overlap, in characters. ~1200 characters keeps a passage well inside
+# the embedding model's sequence limit, so nothing is silently truncated by the encoder.
+CHUNK_SIZE = int(os.getenv("KAIROS_CHUNK_SIZE", "1200"))
+CHUNK_OVERLAP = int(os.getenv("KAIROS_CHUNK_OVERLAP", "200"))
+
+# Preferred places to end a passage, best first.
+_BREAKS = ("\n\n", "\n", ". ", "? ", "! ", "; ", ", ", " ")
+
+
+def chunk_text(text: str, size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> List[Tuple[int, int]]:
+    """
+    Returns (start, end) character offsets of overlapping passages covering `text`.
+    Passages end on a paragraph, sentence or word boundary when one falls in the last
+    quarter of the window. Short text yields a single passage.
+    """
+    if size <= 0:
+        raise ValueError("Chunk size must be positive.")
+    if not 0 <= overlap < size:
+        raise ValueError("Chunk overlap must be non-negative and smaller than the chunk size.")
+
+    text = text or ""
+    if len(text) <= size:
+        return [(0, len(text))]
+
+    spans = []
+    start = 0
+    while start < len(text):
+        end = min(start + size, len(text))
+        if end < len(text):
+            floor = start + (size * 3) // 4
+            for separator in _BREAKS:
+                cut = text.rfind(separator, floor, end)
+                if cut != -1:
+                    end = cut + len(separator)
+                    break
+        spans.append((start, end))
+        if end >= len(text):
+            break
+        # Step back by the overlap, but always make progress.
+        start = max(end - overlap, start + 1)
+    return spans
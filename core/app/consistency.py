@@ -0,0 +1,80 @@
+# File: core/app/consistency.py
+# --- Purpose: Detects (and optionally repairs) drift between the notes table and the vector store. ---
+#
+#   python -m core.app.consistency [--user-id N] [--repair]
+
+import argparse
+import re
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from . import crud, models
+from .database import SessionLocal
+from .vector_store import collections
+
+# Vector ids are note_{id}_p{chunk}; notes indexed before chunking used note_{id}.
+_NOTE_VECTOR_ID = re.compile(r"^note_(\d+)(?:_p\d+)?$")
+# Vector ids fetched from ChromaDB per request.
+ID_PAGE_SIZE = 5000
+
+
+def _indexed_note_ids(owner_id: int) -> set:
+    """Note ids that have at least one passage in the owner's collection, read as bare ids."""
+    collection = collections.get(owner_id)
+    where = collections.where_for(owner_id)
+    note_ids = set()
+    offset = 0
+    while True:
+        page = collection.get(where=where, include=[], limit=ID_PAGE_SIZE, offset=offset)
+        if not page["ids"]:
+            return note_ids
+        offset += len(page["ids"])
+        for vector_id in page["ids"]:
+            match = _NOTE_VECTOR_ID.match(vector_id)
+            if match:
+                note_ids.add(int(match.group(1)))
+
+
+def check_owner(db: Session, owner_id: int, repair: bool = False) -> dict:
+    """
+    Diffs one user's note ids against the note ids present in their collection. Notes with a
+    pending outbox write are in flight, not drift. With repair=True, missing notes are queued
+    for re-embedding and orphaned vectors for deletion, through the outbox.
+    """
+    stored = set(db.scalars(select(models.Note.id).where(models.Note.owner_id == owner_id)))
+    in_flight = set(db.scalars(select(models.VectorOutbox.note_id).where(models.VectorOutbox.owner_id == owner_id)))
+    indexed = _indexed_note_ids(owner_id)
+
+    missing = sorted(stored - indexed - in_flight)
+    orphaned = sorted(indexed - stored - in_flight)
+    report = {"owner_id": owner_id, "notes": len(stored), "indexed": len(indexed & stored),
+              "missing": missing, "orphaned": orphaned, "queued": 0}
+    if repair and (missing or orphaned):
+        report["queued"] = crud.queue_vector_repairs(db, owner_id, reindex_ids=missing, delete_ids=orphaned)
+    return report
+
+
+def check_all(db: Session, repair: bool = False, user_id: int = None) -> list:
+    """Runs check_owner for one user or for every user, in id order."""
+    query = select(models.User.id).order_by(models.User.id)
+    if user_id is not None:
+        query = query.where(models.User.id == user_id)
+    return [check_owner(db, owner_id, repair=repair) for owner_id in db.scalars(query).all()]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the notes table with the vector store.")
+    parser.add_argument("--user-id", type=int, default=None, help="Only check this user.")
+    parser.add_argument("--repair", action="store_true", help="Queue fixes for missing and orphaned vectors.")
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        reports = check_all(db, repair=args.repair, user_id=args.user_id)
+    for report in reports:
+        if report["missing"] or report["orphaned"]:
+            print(f"--- CONSISTENCY: user {report['owner_id']}: {len(report['missing'])} missing, "
+                  f"{len(report['orphaned'])} orphaned, {report['queued']} fixes queued ---")
+    drifted = sum(1 for report in reports if report["missing"] or report["orphaned"])
+    print(f"--- CONSISTENCY: {len(reports)} users checked, {drifted} with drift. ---")
+    if args.repair:
+        # The fixes are applied by this process's embedding queue; wait for them.
+        crud.embedding_queue.shutdown(timeout=None)
@@ -1,21 +1,231 @@
 # File: core/app/crud.py
 # --- Purpose: Holds all the database interaction logic (Create, Read, Update, Delete). ---
 
-from sqlalchemy.orm import Session
-from . import models, schemas, dependencies
-import chromadb
-from sentence_transformers import SentenceTransformer
+import difflib
+import hashlib
+import os
+import re
+import threading
+import uuid
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
+from typing import List, Optional
+from . import models, schemas, dependencies, indexing, chunking, cache, subsystems
+from .embedding_cache import EmbeddingCache
+from .database import SessionLocal
+from .vector_store import collections
 
 # --- RAG Pipeline Setup ---
-# Initialize the embedding model. This will download the model on first run.
-embedding_model = SentenceTransformer('nomic-embed-text')
+EMBEDDING_MODEL_NAME = os.getenv("KAIROS_EMBEDDING_MODEL", 'nomic-embed-text')
 
-# Initialize the ChromaDB client. It will store data in the 'vector_store' directory.
-chroma_client = chromadb.PersistentClient(path="./core/app/data/vector_store")
 
-# Get or create a collection to store the note embeddings.
-# In a multi-user app, you would create a separate collection for each user.
-notes_collection = chroma_client.get_or_create_collection(name="kairos_notes")
+def _load_embedding_model():
+    # Imported here: sentence-transformers pulls in torch, which takes seconds to import.
+    from sentence_transformers import SentenceTransformer
+    # This will download the model on first run.
+    return SentenceTransformer(EMBEDDING_MODEL_NAME)
+
+
+# The embedding model is loaded on first use (or by the startup warm-up), not at import time.
+_embedding_model = subsystems.register("embedding_model", _load_embedding_model)
+
+
+def get_embedding_model():
+    """Returns the shared SentenceTransformer, loading it on first call."""
+    return _embedding_model.get()
+
+# Each user's vectors live in their own ChromaDB collection, resolved through
+# vector_store.collections (see vector_store.py for the migration off the old global one).
+
+# Upper bound on how many documents the encoder processes per forward pass.
+ENCODE_BATCH_SIZE = 64
+
+# Every embedding we compute is kept on disk, keyed by the text, so duplicate content
+# (re-assimilated pages, re-imported searches, repeated notes) skips the model entirely.
+embedding_cache = EmbeddingCache(EMBEDDING_MODEL_NAME)
+
+
+def _encode(texts: list) -> list:
+    return get_embedding_model().encode(texts, batch_size=min(len(texts), ENCODE_BATCH_SIZE)).tolist()
+
+
+def embed_texts(texts: list) -> list:
+    """
+    Embeds stored content (note passages, imported searches), encoding only texts not already
+    in the persistent embedding cache. Queries and chat text go through embed_queries instead,
+    so they don't evict content from the fixed-size cache.
+    """
+    return embedding_cache.encode(texts, _encode)
+
+
+def embed_queries(queries: list, remember: bool = True) -> list:
+    """
+    Embeds transient text (search queries, chat messages) in one encode for all misses. With
+    remember=True vectors are kept in the in-memory query LRU; nothing is written to disk.
+    """
+    keys = [(EMBEDDING_MODEL_NAME, cache.normalize_query(query)) for query in queries]
+    embeddings = [cache.query_embeddings.get(key) if remember else cache.MISSING for key in keys]
+    missing = [i for i, embedding in enumerate(embeddings) if embedding is cache.MISSING]
+    if missing:
+        for i, embedding in zip(missing, _encode([queries[i] for i in missing])):
+            embeddings[i] = embedding
+            if remember:
+                cache.query_embeddings.put(keys[i], embedding)
+    return embeddings
+
+
+def embed_query(query: str) -> list:
+    """Embeds a search query, reusing the cached vector for an identical (normalized) query."""
+    return embed_queries([query])[0]
+
+
+def _note_passages(note_id: int, owner_id: int, title: str, content: str) -> list:
+    """
+    Splits a note into the passages that represent it in the vector store. Each passage is
+    embedded together with the note title, but only the passage text is stored as the document.
+    """
+    content = content or ""
+    passages = []
+    for i, (start, end) in enumerate(chunking.chunk_text(content)):
+        passage = content[start:end]
+        passages.append({
+            "id": f"note_{note_id}_p{i}",
+            "text": f"Title: {title}\nContent: {passage}",
+            "document": passage,
+            "metadata": {"title": title, "owner_id": owner_id, "note_id": note_id,
+                         "chunk": i, "start": start, "end": end},
+        })
+    return passages
+
+
+def _index_note_batch(passages):
+    """
+    Encodes a batch of passages in as few forward passes as possible, then writes them to
+    ChromaDB with one call per owner collection.
+    """
+    embeddings = embed_texts([p["text"] for p in passages])
+    by_owner = {}
+    for passage, embedding in zip(passages, embeddings):
+        by_owner.setdefault(passage["metadata"]["owner_id"], []).append((passage, embedding))
+    for owner_id, owned in by_owner.items():
+        collections.get(owner_id).upsert(
+            embeddings=[embedding for _, embedding in owned],
+            documents=[p["document"] for p, _ in owned],
+            metadatas=[p["metadata"] for p, _ in owned],
+            ids=[p["id"] for p, _ in owned]
+        )
+        cache.invalidate_owner(owner_id)
+
+
+# --- Vector Outbox ---
+# Every note change that the vector store must follow is recorded as a VectorOutbox row in the
+# same transaction as the change itself, then applied by the embedding queue's worker, which
+# deletes the row afterwards. Rows left behind by a crash are re-queued at startup.
+OUTBOX_UPSERT = "upsert"    # new note: write its passages
+OUTBOX_REPLACE = "replace"  # changed note: drop its old passages, write the new ones
+OUTBOX_DELETE = "delete"    # deleted note: drop its passages
+
+
+def _record_vector_write(db: Session, note_id: int, owner_id: int, op: str) -> dict:
+    """
+    Adds an outbox row to the caller's transaction, where it stands or falls with the note
+    change. Returns the item to queue once that transaction has committed.
+    """
+    entry = models.VectorOutbox(note_id=note_id, owner_id=owner_id, op=op)
+    db.add(entry)
+    db.flush()
+    return {"note_id": note_id, "owner_id": owner_id, "op": op, "outbox_id": entry.id}
+
+
+def _clear_outbox(entry_ids: list):
+    if not entry_ids:
+        return
+    with SessionLocal() as outbox_db:
+        outbox_db.query(models.VectorOutbox).filter(models.VectorOutbox.id.in_(entry_ids)) \
+            .delete(synchronize_session=False)
+        outbox_db.commit()
+
+
+def delete_note_vectors(owner_id: int, note_ids: list):
+    """
+    Removes every passage of the given notes from the owner's collection, including the single
+    whole-note vector (id note_{id}, no note_id metadata) written before notes were chunked.
+    """
+    where = {"note_id": {"$in": list(note_ids)}}
+    owner_filter = collections.where_for(owner_id)
+    if owner_filter:
+        where = {"$and": [where, owner_filter]}
+    collection = collections.get(owner_id)
+    collection.delete(where=where)
+    # Note ids are global, so the legacy ids can only belong to this owner's notes.
+    collection.delete(ids=[f"note_{note_id}" for note_id in note_ids])
+
+
+def _apply_vector_batch(items: list):
+    """
+    Applies a batch of queued outbox items: drops the passages of changed and deleted notes,
+    writes the new passages in one encode, then clears the outbox rows. When a note appears
+    more than once, only its latest item is applied.
+    """
+    latest = {}
+    for item in items:
+        latest[item["note_id"]] = item
+    stale = {}
+    for item in latest.values():
+        if item.get("op", OUTBOX_UPSERT) != OUTBOX_UPSERT:
+            stale.setdefault(item["owner_id"], []).append(item["note_id"])
+    for owner_id, note_ids in stale.items():
+        delete_note_vectors(owner_id, note_ids)
+        cache.invalidate_owner(owner_id)
+
+    passages = [passage for item in latest.values() for passage in item["passages"]]
+    if passages:
+        _index_note_batch(passages)
+    _clear_outbox([item["outbox_id"] for item in items if item.get("outbox_id")])
+
+
+# Notes are embedded off the request thread by this queue's background worker.
+embedding_queue = indexing.EmbeddingQueue(_apply_vector_batch)
+
+
+def _submit_vector_write(write: dict, note: models.Note = None):
+    """Queues a committed outbox item; upserts and replaces carry the note's current passages."""
+    passages = []
+    if write["op"] != OUTBOX_DELETE and note is not None:
+        passages = _note_passages(note.id, note.owner_id, note.title, note.content)
+    embedding_queue.submit(write["note_id"], passages, op=write["op"], owner_id=write["owner_id"],
+                           outbox_id=write["outbox_id"])
+
+
+def replay_vector_outbox(db: Session) -> int:
+    """Re-queues vector writes that a previous process committed but never applied. Returns how many."""
+    entries = db.query(models.VectorOutbox).order_by(models.VectorOutbox.id).all()
+    if not entries:
+        return 0
+    note_ids = {entry.note_id for entry in entries}
+    notes = {note.id: note for note in db.query(models.Note).filter(models.Note.id.in_(note_ids))}
+    for entry in entries:
+        note = notes.get(entry.note_id)
+        # Passages may have been written before the crash, so upserts are replayed as replaces.
+        op = OUTBOX_DELETE if note is None or entry.op == OUTBOX_DELETE else OUTBOX_REPLACE
+        _submit_vector_write({"note_id": entry.note_id, "owner_id": entry.owner_id, "op": op,
+                              "outbox_id": entry.id}, note)
+    print(f"--- INDEXER: Re-queued {len(entries)} unapplied vector writes from the outbox. ---")
+    return len(entries)
+
+
+def queue_vector_repairs(db: Session, owner_id: int, reindex_ids=(), delete_ids=()) -> int:
+    """Records and queues outbox writes that re-embed `reindex_ids` and drop `delete_ids`."""
+    notes = {note.id: note for note in db.query(models.Note).filter(models.Note.id.in_(list(reindex_ids)))}
+    writes = [(_record_vector_write(db, note_id, owner_id, OUTBOX_REPLACE), notes[note_id])
+              for note_id in reindex_ids if note_id in notes]
+    writes += [(_record_vector_write(db, note_id, owner_id, OUTBOX_DELETE), None) for note_id in delete_ids]
+    db.commit()
+    for write, note in writes:
+        _submit_vector_write(write, note)
+    return len(writes)
 
 
 # --- User CRUD ---
@@ -31,53 +241,384 @@ def create_user(db: Session, user: schemas.UserCreate):
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
+    # Any token cached for this email (e.g. from a deleted account) must be re-verified.
+    dependencies.invalidate_user(db_user.email)
     return db_user
 
 
+# Collections /users/me/ can embed via include=, and the most entries embedded per collection.
+PROFILE_COLLECTIONS = ("notes", "projects", "anchor_logs")
+PROFILE_MAX_ITEMS = 100
+
+
+def get_user_profile(db: Session, user_id: int, email: str, include=(), limit: int = 20) -> dict:
+    """
+    Builds a user's profile: aggregate counts computed in one SQL statement, plus the most
+    recent `limit` entries of each collection named in `include`. Only requested collections
+    are queried, each with an explicit loading strategy, so nothing is lazily loaded per row.
+    """
+    def count_of(model, *criteria):
+        return select(func.count()).select_from(model).where(*criteria).scalar_subquery()
+
+    counts = db.execute(select(
+        count_of(models.Note, models.Note.owner_id == user_id).label("note_count"),
+        count_of(models.Project, models.Project.owner_id == user_id).label("project_count"),
+        count_of(models.Task, models.Task.project_id.in_(
+            select(models.Project.id).where(models.Project.owner_id == user_id)
+        )).label("task_count"),
+        count_of(models.MicroAnchorLog, models.MicroAnchorLog.owner_id == user_id).label("anchor_log_count"),
+    )).one()
+    profile = {"id": user_id, "email": email, **counts._asdict()}
+
+    limit = max(0, min(limit, PROFILE_MAX_ITEMS))
+    if "notes" in include:
+        profile["notes"] = get_note_summaries(db, user_id=user_id, limit=limit, newest_first=True)
+    if "projects" in include:
+        profile["projects"] = (
+            db.query(models.Project)
+            .options(selectinload(models.Project.tasks))
+            .filter(models.Project.owner_id == user_id)
+            .order_by(models.Project.id.desc())
+            .limit(limit)
+            .all()
+        )
+    if "anchor_logs" in include:
+        profile["anchor_logs"] = (
+            db.query(models.MicroAnchorLog)
+            .filter(models.MicroAnchorLog.owner_id == user_id)
+            .order_by(models.MicroAnchorLog.id.desc())
+            .limit(limit)
+            .all()
+        )
+    return profile
+
+
+# --- Note List Versions ---
+# A per-user counter bumped on every note write, used to build ETags for note listings so an
+# unchanged page can be answered with 304 without querying. Counters live in this process;
+# the random epoch keeps ETags from a previous process (or another worker) from matching.
+# Deployments running several API workers should disable conditional listing or pin users.
+_NOTES_EPOCH = uuid.uuid4().hex
+_notes_versions = {}
+_notes_versions_lock = threading.Lock()
+
+# Characters of content included in a note summary.
+SNIPPET_LENGTH = 200
+
+
+def touch_user_notes(user_id: int):
+    """Marks a user's note listings as changed. Call after any note insert, update or delete."""
+    with _notes_versions_lock:
+        _notes_versions[user_id] = _notes_versions.get(user_id, 0) + 1
+
+
+def notes_etag(user_id: int, *parts) -> str:
+    """Weak ETag for one listing of a user's notes; changes whenever any of their notes change."""
+    version = _notes_versions.get(user_id, 0)
+    key = ":".join(str(p) for p in (_NOTES_EPOCH, user_id, version, *parts))
+    return f'W/"{hashlib.sha1(key.encode()).hexdigest()}"'
+
+
 # --- Note CRUD ---
-def get_notes(db: Session, user_id: int, skip: int = 0, limit: int = 100):
-    """Fetches all notes for a specific user."""
-    return db.query(models.Note).filter(models.Note.owner_id == user_id).offset(skip).limit(limit).all()
+def _page(statement, skip: int, limit: int, after_id: Optional[int], newest_first: bool = False):
+    """Orders and limits a notes statement: keyset after `after_id`, else offset `skip`."""
+    if newest_first:
+        return statement.order_by(models.Note.id.desc()).offset(skip).limit(limit)
+    if after_id is not None:
+        return statement.where(models.Note.id > after_id).order_by(models.Note.id).limit(limit)
+    return statement.order_by(models.Note.id).offset(skip).limit(limit)
+
+
+def _notes_statement(user_id: int, skip: int, limit: int, after_id: Optional[int]):
+    return _page(select(models.Note).where(models.Note.owner_id == user_id), skip, limit, after_id)
+
+
+def _note_summaries_statement(user_id: int, skip: int, limit: int, after_id: Optional[int], newest_first: bool):
+    return _page(select(
+        models.Note.id,
+        models.Note.title,
+        func.coalesce(func.length(models.Note.content), 0).label("size"),
+        func.substr(models.Note.content, 1, SNIPPET_LENGTH).label("snippet"),
+    ).where(models.Note.owner_id == user_id), skip, limit, after_id, newest_first)
+
+
+def get_notes(db: Session, user_id: int, skip: int = 0, limit: int = 100, after_id: Optional[int] = None):
+    """
+    Fetches notes for a specific user in id order. Pass the last id of the previous page as
+    `after_id` for keyset pagination, which stays fast at any depth; `skip` is the legacy offset.
+    """
+    return db.scalars(_notes_statement(user_id, skip, limit, after_id)).all()
+
+
+def get_note_summaries(db: Session, user_id: int, skip: int = 0, limit: int = 100, after_id: Optional[int] = None,
+                       newest_first: bool = False):
+    """Like get_notes, but returns (id, title, size, snippet) rows without loading full content."""
+    return db.execute(_note_summaries_statement(user_id, skip, limit, after_id, newest_first)).all()
 
 
 def create_user_note(db: Session, note: schemas.NoteCreate, user_id: int):
     """
-    Creates a new note for a specific user and adds its content to the vector store.
+    Creates a new note for a specific user and queues its content for the vector store.
+    The note is committed immediately; its embedding is written by the background indexer.
     """
-    # 1. Create the note in the regular SQL database
+    # 1. Create the note in the regular SQL database, with its vector write in the same transaction
     db_note = models.Note(**note.model_dump(), owner_id=user_id)
     db.add(db_note)
+    db.flush()
+    write = _record_vector_write(db, db_note.id, user_id, OUTBOX_UPSERT)
     db.commit()
     db.refresh(db_note)
+    # The FTS index changed with the commit, so lexical results for this user are stale now.
+    cache.invalidate_owner(user_id)
+    touch_user_notes(user_id)
+
+    # 2. Hand the note to the embedding queue for the RAG pipeline
+    _submit_vector_write(write, db_note)
+
+    return db_note
+
+
+def create_user_notes_bulk(db: Session, notes: List[schemas.NoteCreate], user_id: int):
+    """
+    Inserts one chunk of notes in a single transaction, then embeds the whole chunk and
+    writes it to the vector store with a single add. If the vector write fails, the notes
+    fall back to the background embedding queue. Returns one result dict per note, in order.
+    """
+    db_notes = [models.Note(**note.model_dump(), owner_id=user_id) for note in notes]
+    db.add_all(db_notes)
+    db.flush()
+    entries = [models.VectorOutbox(note_id=n.id, owner_id=user_id, op=OUTBOX_UPSERT) for n in db_notes]
+    db.add_all(entries)
+    db.flush()
+    # Capture what we need before commit expires the instances, to avoid a refresh per row.
+    note_passages = [(n.id, _note_passages(n.id, user_id, n.title, n.content)) for n in db_notes]
+    entry_ids = [entry.id for entry in entries]
+    db.commit()
+    cache.invalidate_owner(user_id)
+    touch_user_notes(user_id)
+
+    try:
+        _index_note_batch([p for _, passages in note_passages for p in passages])
+        _clear_outbox(entry_ids)
+        status = indexing.STATUS_INDEXED
+    except Exception as e:
+        print(f"--- BULK: Vector write failed for {len(note_passages)} notes, deferring to the queue: {e} ---")
+        for (note_id, passages), entry_id in zip(note_passages, entry_ids):
+            embedding_queue.submit(note_id, passages, op=OUTBOX_UPSERT, owner_id=user_id, outbox_id=entry_id)
+        status = indexing.STATUS_PENDING
+
+    return [{"id": note_id, "index_status": status} for note_id, _ in note_passages]
+
 
-    # 2. Create the embedding for the RAG pipeline
-    note_content = f"Title: {db_note.title}\nContent: {db_note.content}"
-    embedding = embedding_model.encode(note_content).tolist()
+def get_note(db: Session, note_id: int, user_id: int):
+    """Fetches a single note owned by a specific user."""
+    return db.query(models.Note).filter(models.Note.id == note_id, models.Note.owner_id == user_id).first()
 
-    # 3. Add the embedding to the ChromaDB vector store
-    notes_collection.add(
-        embeddings=[embedding],
-        documents=[note_content],
-        metadatas=[{"title": db_note.title, "owner_id": user_id}],
-        ids=[f"note_{db_note.id}"]  # Create a unique ID for the vector
-    )
 
+def update_user_note(db: Session, note_id: int, user_id: int, changes: schemas.NoteUpdate):
+    """
+    Applies the given fields to a user's note. Only a real change to the title or content is
+    committed, and only then are the note's passages re-embedded. Returns the note, or None.
+    """
+    db_note = get_note(db, note_id=note_id, user_id=user_id)
+    if db_note is None:
+        return None
+    changed = {field: value for field, value in changes.model_dump(exclude_unset=True).items()
+               if getattr(db_note, field) != value}
+    if not changed:
+        return db_note
+
+    for field, value in changed.items():
+        setattr(db_note, field, value)
+    write = _record_vector_write(db, note_id, user_id, OUTBOX_REPLACE)
+    db.commit()
+    db.refresh(db_note)
+    cache.invalidate_owner(user_id)
+    touch_user_notes(user_id)
+    _submit_vector_write(write, db_note)
     return db_note
 
 
+def delete_user_note(db: Session, note_id: int, user_id: int) -> bool:
+    """Deletes a user's note and queues the removal of its passages. Returns False if it didn't exist."""
+    db_note = get_note(db, note_id=note_id, user_id=user_id)
+    if db_note is None:
+        return False
+    db.delete(db_note)
+    write = _record_vector_write(db, note_id, user_id, OUTBOX_DELETE)
+    db.commit()
+    cache.invalidate_owner(user_id)
+    touch_user_notes(user_id)
+    _submit_vector_write(write)
+    return True
+
+
+def find_note_id(db: Session, user_id: int, title: str, content: str):
+    """Returns the id of a user's note with exactly this title and content, or None."""
+    row = db.query(models.Note.id).filter(
+        models.Note.owner_id == user_id, models.Note.title == title, models.Note.content == content
+    ).first()
+    return row[0] if row else None
+
+
+def get_note_index_status(note_id: int) -> str:
+    """Returns the vector-store indexing status of a note ('pending', 'indexed', 'failed' or 'unknown')."""
+    return embedding_queue.status(note_id)
+
+
+# --- Async CRUD ---
+# For the async endpoints. Reads run natively on an AsyncSession. Writes reuse the sync
+# functions above through run_sync, which executes them in the session's greenlet with all
+# I/O going through aiosqlite, so outbox, cache and queue handling exist in one place only.
+async def get_note_async(db: AsyncSession, note_id: int, user_id: int):
+    """Fetches a single note owned by a specific user."""
+    return (await db.scalars(
+        select(models.Note).where(models.Note.id == note_id, models.Note.owner_id == user_id)
+    )).first()
+
+
+async def get_notes_async(db: AsyncSession, user_id: int, skip: int = 0, limit: int = 100,
+                          after_id: Optional[int] = None):
+    return (await db.scalars(_notes_statement(user_id, skip, limit, after_id))).all()
+
+
+async def get_note_summaries_async(db: AsyncSession, user_id: int, skip: int = 0, limit: int = 100,
+                                   after_id: Optional[int] = None, newest_first: bool = False):
+    return (await db.execute(_note_summaries_statement(user_id, skip, limit, after_id, newest_first))).all()
+
+
+async def get_user_profile_async(db: AsyncSession, user_id: int, email: str, include=(), limit: int = 20) -> dict:
+    return await db.run_sync(get_user_profile, user_id, email, include, limit)
+
+
+async def create_user_note_async(db: AsyncSession, note: schemas.NoteCreate, user_id: int):
+    return await db.run_sync(create_user_note, note, user_id)
+
+
+async def update_user_note_async(db: AsyncSession, note_id: int, user_id: int, changes: schemas.NoteUpdate):
+    return await db.run_sync(update_user_note, note_id, user_id, changes)
+
+
+async def delete_user_note_async(db: AsyncSession, note_id: int, user_id: int) -> bool:
+    return await db.run_sync(delete_user_note, note_id, user_id)
+
+
 # --- Project CRUD ---
+# Per-user cache of normalized project name -> project id (None for names known not to exist).
+# create_user_project invalidates the owner's entries, which also clears cached misses.
+_project_ids = cache.OwnerScopedCache(4096)
+
+
+def normalize_project_name(name: str) -> str:
+    """The form project names are matched by: case-folded with whitespace trimmed and collapsed."""
+    return re.sub(r"\s+", " ", (name or "").strip()).casefold()
+
+
 def get_projects(db: Session, user_id: int, skip: int = 0, limit: int = 100):
     """Fetches all projects for a specific user."""
     return db.query(models.Project).filter(models.Project.owner_id == user_id).offset(skip).limit(limit).all()
 
 
-def create_user_project(db: Session, project: schemas.ProjectCreate, user_id: int):
-    """Creates a new project for a specific user."""
-    db_project = models.Project(**project.model_dump(), owner_id=user_id)
+def get_project_id_by_name(db: Session, user_id: int, name: str) -> Optional[int]:
+    """
+    Resolves a user's project by name, ignoring case and extra whitespace, with a single
+    lookup on the (owner_id, name_norm) index. Results, including misses, are cached per user.
+    Duplicates renamed by backfill_project_name_norms ("name#id") are found once no project
+    holds the plain name, oldest first.
+    """
+    name_norm = normalize_project_name(name)
+    key = _project_ids.key_for(user_id, name_norm)
+    project_id = _project_ids.get(key)
+    if project_id is cache.MISSING:
+        project_id = db.query(models.Project.id).filter(
+            models.Project.owner_id == user_id, models.Project.name_norm == name_norm
+        ).scalar()
+        if project_id is None and name_norm:
+            project_id = _backfilled_duplicate_id(db, user_id, name_norm)
+        _project_ids.put(key, project_id)
+    return project_id
+
+
+def _backfilled_duplicate_id(db: Session, user_id: int, name_norm: str) -> Optional[int]:
+    candidates = db.query(models.Project.id, models.Project.name_norm).filter(
+        models.Project.owner_id == user_id,
+        models.Project.name_norm > name_norm + "#",
+        models.Project.name_norm < name_norm + "#\uffff",
+    ).order_by(models.Project.id)
+    return next((row.id for row in candidates if row.name_norm[len(name_norm) + 1:] == str(row.id)), None)
+
+
+def suggest_project_names(db: Session, user_id: int, name: str, limit: int = 3) -> List[str]:
+    """
+    Near-miss candidates for a project name that did not resolve: projects whose normalized
+    name starts with it (an index range scan), otherwise the closest names by similarity.
+    """
+    name_norm = normalize_project_name(name)
+    if not name_norm:
+        return []
+    prefixed = db.query(models.Project.name).filter(
+        models.Project.owner_id == user_id,
+        models.Project.name_norm >= name_norm,
+        models.Project.name_norm < name_norm + "\uffff",
+    ).order_by(models.Project.name_norm).limit(limit).all()
+    if prefixed:
+        return [row.name for row in prefixed]
+
+    names = {row.name_norm: row.name for row in db.query(models.Project.name, models.Project.name_norm)
+             .filter(models.Project.owner_id == user_id).limit(5000)}
+    close = difflib.get_close_matches(name_norm, list(names), n=limit, cutoff=0.75)
+    return [names[match] for match in close]
+
+
+def get_or_create_user_project(db: Session, project: schemas.ProjectCreate, user_id: int):
+    """
+    Creates a project for a user, or returns the one whose name already normalizes to the same
+    form. Returns (project, created). The unique (owner_id, name_norm) index settles races
+    between concurrent chats: the loser rolls back and gets the winner's project.
+    """
+    name_norm = normalize_project_name(project.name)
+    db_project = models.Project(**project.model_dump(), name_norm=name_norm, owner_id=user_id)
     db.add(db_project)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        existing = db.query(models.Project).filter(
+            models.Project.owner_id == user_id, models.Project.name_norm == name_norm).first()
+        if existing is None:
+            raise
+        return existing, False
+    finally:
+        _project_ids.invalidate_owner(user_id)
     db.refresh(db_project)
-    return db_project
+    return db_project, True
+
+
+def create_user_project(db: Session, project: schemas.ProjectCreate, user_id: int):
+    """Creates a new project for a specific user; an existing project with the same name is returned instead."""
+    return get_or_create_user_project(db, project, user_id)[0]
+
+
+def backfill_project_name_norms(db: Session):
+    """
+    Fills name_norm for projects created before the column existed. When a user already has
+    several projects with the same normalized name, the oldest keeps it and the others get an
+    id-suffixed value ("name#id"), so the unique index can be built without renaming anything.
+    Lookups by name resolve to the oldest; the others are reached by name only once it is gone.
+    """
+    rows = db.query(models.Project).filter(models.Project.name_norm.is_(None)).order_by(models.Project.id).all()
+    if not rows:
+        return
+    taken = {(owner_id, norm) for owner_id, norm in db.query(models.Project.owner_id, models.Project.name_norm)
+             .filter(models.Project.name_norm.isnot(None))}
+    for project in rows:
+        norm = normalize_project_name(project.name)
+        if (project.owner_id, norm) in taken:
+            norm = f"{norm}#{project.id}"
+        taken.add((project.owner_id, norm))
+        project.name_norm = norm
+    db.commit()
+    print(f"--- DATABASE: Backfilled normalized names for {len(rows)} projects. ---")
 
 
 # --- Task CRUD ---
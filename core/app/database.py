@@ -2,28 +2,80 @@
 # --- Purpose: Sets up the database connection and session management. ---
 
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from typing import Optional
 # --- Ensure the data directory exists before creating the database file ---
 # Define the path for the data directory
-# This navigates up one level from the current file's directory (app) to 'core', then into 'data'
-data_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
+# This navigates up one level from the current file's directory (app) to 'core', then into 'data'.
+# KAIROS_DATA_DIR puts the database somewhere else (the tests use a temporary directory).
+data_dir = os.getenv("KAIROS_DATA_DIR") or os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
 # Create the directory if it doesn't exist
 os.makedirs(data_dir, exist_ok=True)
 
 # Define the local SQLite database URL. The database file will be created in core/app/data/
 SQLALCHEMY_DATABASE_URL = f"sqlite:///{os.path.join(data_dir, 'kairos.db')}"
+# The same file, opened through aiosqlite for async endpoints.
+ASYNC_SQLALCHEMY_DATABASE_URL = f"sqlite+aiosqlite:///{os.path.join(data_dir, 'kairos.db')}"
+
+# --- SQLite Performance Profile ---
+# WAL lets readers proceed while a write commits, and synchronous=NORMAL is durable in WAL mode
+# except for the last transactions before a power loss. Writers wait up to busy_timeout for
+# the lock instead of failing with "database is locked".
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("KAIROS_SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("KAIROS_SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("KAIROS_SQLITE_CACHE_SIZE_KB", str(64 * 1024)))
+SQLITE_PRAGMAS = (
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),
+    ("busy_timeout", SQLITE_BUSY_TIMEOUT_MS),
+    ("mmap_size", SQLITE_MMAP_SIZE),
+    ("cache_size", -SQLITE_CACHE_SIZE_KB),  # negative means KiB rather than pages
+    ("temp_store", "MEMORY"),
+)
+
+# Connections kept open per engine, and extra ones allowed under bursts.
+DB_POOL_SIZE = int(os.getenv("KAIROS_DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("KAIROS_DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("KAIROS_DB_POOL_TIMEOUT", "30"))
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """Applies SQLITE_PRAGMAS to every new connection; they are per-connection settings."""
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS:
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
 
 # Create the SQLAlchemy engine
 engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+    SQLALCHEMY_DATABASE_URL,
+    connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
 )
+event.listen(engine, "connect", _apply_sqlite_pragmas)
 
 # Create a SessionLocal class. Each instance will be a database session.
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# The async engine shares the file and the profile. Its sessions don't expire objects on
+# commit, since reloading an attribute lazily is not possible in async code.
+async_engine = create_async_engine(
+    ASYNC_SQLALCHEMY_DATABASE_URL,
+    connect_args={"timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+)
+event.listen(async_engine.sync_engine, "connect", _apply_sqlite_pragmas)
+
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 # Create a Base class. Our ORM models will inherit from this.
 Base = declarative_base()
 
@@ -34,3 +86,37 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    """Async counterpart of get_db, for `async def` endpoints."""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+# --- Schema Upkeep ---
+def add_missing_columns(metadata):
+    """
+    Adds nullable columns declared on the models that an existing table lacks. This covers
+    additive model changes; anything more involved needs a real migration.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing and column.nullable:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    conn.exec_driver_sql(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}')
+
+
+def create_missing_indexes(metadata):
+    """
+    Creates indexes declared on the models that an existing database does not have yet.
+    create_all() only builds indexes together with new tables, so older databases need this.
+    """
+    for table in metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
@@ -1,13 +1,18 @@
 # File: core/app/dependencies.py
 # --- Purpose: Holds security functions, authentication logic, and other shared dependencies. ---
 
+import os
+import threading
+import time
 from passlib.context import CryptContext
 from datetime import datetime, timedelta, timezone
 from jose import JWTError, jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from . import schemas, models, crud
-from .database import get_db # <-- CORRECT: Import get_db directly from database.py
+from . import schemas, models, cache
+from .database import get_db, get_async_db # <-- CORRECT: Import get_db directly from database.py
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import Optional
 # --- Configuration ---
@@ -16,6 +21,11 @@ SECRET_KEY = "memento_mori"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 # 24 hours
 
+# Verified tokens are remembered for this long (seconds, never past their own expiry), so
+# polling clients skip the JWT decode and user lookup on most requests.
+TOKEN_CACHE_TTL = float(os.getenv("KAIROS_TOKEN_CACHE_TTL", "300"))
+TOKEN_CACHE_SIZE = int(os.getenv("KAIROS_TOKEN_CACHE_SIZE", "4096"))
+
 # --- Password Hashing ---
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -42,13 +52,44 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)): # <-- CORRECT: Use get_db from database.py
-    """Decodes the token and returns the current user from the database."""
-    credentials_exception = HTTPException(
+# --- Token Verification Cache ---
+_verified_tokens = cache.TTLCache(TOKEN_CACHE_SIZE, TOKEN_CACHE_TTL)
+# Bumped whenever a user changes; cached principals from an older generation are ignored.
+_user_generations = {}
+_generations_lock = threading.Lock()
+
+
+def invalidate_user(email: str):
+    """Forgets every cached token verification for a user. Call whenever the user row changes."""
+    with _generations_lock:
+        _user_generations[email] = _user_generations.get(email, 0) + 1
+
+
+def token_cache_stats() -> dict:
+    return _verified_tokens.stats()
+
+
+def _credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+
+def _cached_principal(token: str):
+    """The principal remembered for a token, or None if absent, expired or from an older user generation."""
+    cached = _verified_tokens.get(token)
+    if cached is not cache.MISSING:
+        generation, principal = cached
+        if _user_generations.get(principal.email, 0) == generation:
+            return principal
+    return None
+
+
+def _decode_token(token: str) -> tuple:
+    """Verifies a JWT and returns (email, payload); raises 401 for anything invalid."""
+    credentials_exception = _credentials_exception()
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
@@ -57,7 +98,44 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
         token_data = schemas.TokenData(email=email)
     except JWTError:
         raise credentials_exception
-    user = crud.get_user_by_email(db, email=token_data.email)
-    if user is None:
-        raise credentials_exception
-    return user
+    return token_data.email, payload
+
+
+def _remember_principal(token: str, payload: dict, generation: int, row) -> schemas.Principal:
+    if row is None:
+        raise _credentials_exception()
+    principal = schemas.Principal(id=row.id, email=row.email)
+    expires_in = payload.get("exp", 0) - time.time()
+    _verified_tokens.put(token, (generation, principal), ttl=expires_in)
+    return principal
+
+
+def _principal_query(email: str):
+    return select(models.User.id, models.User.email).where(models.User.email == email)
+
+
+def get_current_principal(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> schemas.Principal:
+    """
+    Returns the lightweight identity (id and email) behind a bearer token. A cache hit costs
+    neither a JWT decode nor a query; a miss selects just the two columns, never the ORM User.
+    """
+    principal = _cached_principal(token)
+    if principal is not None:
+        return principal
+    email, payload = _decode_token(token)
+    # Read the generation before the lookup, so a change racing with it invalidates this entry.
+    generation = _user_generations.get(email, 0)
+    row = db.execute(_principal_query(email)).first()
+    return _remember_principal(token, payload, generation, row)
+
+
+async def get_current_principal_async(token: str = Depends(oauth2_scheme),
+                                      db: AsyncSession = Depends(get_async_db)) -> schemas.Principal:
+    """get_current_principal for async endpoints: the same token cache, with the lookup on aiosqlite."""
+    principal = _cached_principal(token)
+    if principal is not None:
+        return principal
+    email, payload = _decode_token(token)
+    generation = _user_generations.get(email, 0)
+    row = (await db.execute(_principal_query(email))).first()
+    return _remember_principal(token, payload, generation, row)
@@ -0,0 +1,241 @@
+# File: core/app/embedding_cache.py
+# --- Purpose: Persistent cache of text embeddings, so identical text is only ever encoded once. ---
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, so only one process should write the cache.
+    fcntl = None
+
+EMBEDDING_CACHE_PATH = os.getenv("KAIROS_EMBEDDING_CACHE_PATH", "./core/app/data/embedding_cache")
+# Vectors kept per model. At 768 float32 dimensions, 50,000 rows take about 150 MB on disk.
+# 0 disables the cache.
+EMBEDDING_CACHE_SIZE = int(os.getenv("KAIROS_EMBEDDING_CACHE_SIZE", "50000"))
+
+# Stored rows are synced to disk once this many are pending or this many seconds have passed,
+# not on every store; flush() forces it, e.g. at shutdown. Unflushed rows are already in the
+# shared mapping, so other processes see them before they are synced.
+FLUSH_EVERY_ROWS = 256
+FLUSH_INTERVAL_SECONDS = 30.0
+
+_KEY_BYTES = 32  # sha256 digest
+
+
+def normalize_text(text: str) -> str:
+    """Form that is hashed for the cache key: NFC, trimmed, whitespace collapsed. Case is kept."""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text or "").strip())
+
+
+class EmbeddingCache:
+    """
+    Fixed-capacity ring of embeddings for one model, keyed by sha256 of the normalized text.
+    Vectors live in a memory-mapped float32 matrix (<model>.f32) and their keys in a parallel
+    matrix of digests (<model>.keys); a small JSON header records the dimension and capacity.
+    When full, the oldest row is overwritten. The files are opened on first use and the vector
+    dimension is learned from the first stored batch.
+
+    Several processes (the API and a reindex run) share the files. <model>.count is a mapped
+    counter of rows ever written, so the ring's cursor is shared: writers append under a file
+    lock (<model>.lock), and before each lookup a process indexes the rows others appended
+    since it last looked. A row's key is cleared while its vector is rewritten and reads
+    re-check the key afterwards, so a lookup never returns a vector that belongs to other text.
+    """
+
+    def __init__(self, model_name: str, path: str = EMBEDDING_CACHE_PATH, capacity: int = EMBEDDING_CACHE_SIZE):
+        self.model_name = model_name
+        self.path = path
+        self.capacity = capacity
+        self._base = os.path.join(path, re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name))
+        self._lock = threading.Lock()
+        self._opened = False
+        self._vectors = None
+        self._keys = None
+        self._written = None  # shared counter of rows ever written; the cursor is written % capacity
+        self._slots = {}  # key -> slot
+        self._slot_keys = []  # slot -> key, to forget a key when its slot is overwritten
+        self._seen = 0  # value of the shared counter that _slots reflects
+        self.dim = None
+        self._unflushed = 0
+        self._flushed_at = time.monotonic()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key_for(text: str) -> bytes:
+        return hashlib.sha256(normalize_text(text).encode("utf-8")).digest()
+
+    # --- Storage ---
+    @contextmanager
+    def _file_lock(self):
+        """Serializes writers across processes; threads in this process already hold self._lock."""
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(self.path, exist_ok=True)
+        with open(self._base + ".lock", "a+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _header(self):
+        try:
+            with open(self._base + ".json", "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _open(self, dim: int = None):
+        """Maps the files for `dim` (or the stored dimension), discarding them if they don't match."""
+        import numpy as np
+
+        header = self._header()
+        files_exist = all(os.path.exists(self._base + suffix) for suffix in (".f32", ".keys", ".count"))
+        usable = (header and files_exist and header.get("model") == self.model_name
+                  and header.get("capacity") == self.capacity and dim in (None, header.get("dim")))
+        if not usable and dim is None:
+            return  # Nothing usable on disk yet; the first store() creates the files.
+
+        dim = header["dim"] if usable else dim
+        mode = "r+" if usable else "w+"
+        os.makedirs(self.path, exist_ok=True)
+        self._vectors = np.memmap(self._base + ".f32", dtype=np.float32, mode=mode, shape=(self.capacity, dim))
+        self._keys = np.memmap(self._base + ".keys", dtype=np.uint8, mode=mode, shape=(self.capacity, _KEY_BYTES))
+        self._written = np.memmap(self._base + ".count", dtype=np.uint64, mode=mode, shape=(1,))
+        self.dim = dim
+        self._slots, self._slot_keys, self._seen = {}, [None] * self.capacity, 0
+        self._index_slots(range(self.capacity))
+        self._seen = int(self._written[0])
+        if not usable:
+            self._write_header()
+        self._opened = True
+
+    def _index_slots(self, slots):
+        """Points _slots at whatever keys the given rows hold now."""
+        empty = bytes(_KEY_BYTES)
+        for slot in slots:
+            previous = self._slot_keys[slot]
+            if previous is not None and self._slots.get(previous) == slot:
+                del self._slots[previous]
+            key = self._keys[slot].tobytes()
+            self._slot_keys[slot] = key if key != empty else None
+            if key != empty:
+                self._slots[key] = slot
+
+    def _catch_up(self):
+        """Indexes rows other processes appended since this one last looked."""
+        written = int(self._written[0])
+        if written == self._seen:
+            return
+        if written - self._seen >= self.capacity or written < self._seen:
+            self._index_slots(range(self.capacity))
+        else:
+            self._index_slots(position % self.capacity for position in range(self._seen, written))
+        self._seen = written
+
+    def _write_header(self):
+        temp = self._base + ".json.tmp"
+        with open(temp, "w", encoding="utf-8") as f:
+            json.dump({"model": self.model_name, "dim": self.dim, "capacity": self.capacity}, f)
+        os.replace(temp, self._base + ".json")
+
+    def _store(self, keys, vectors):
+        import numpy as np
+
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._file_lock():
+            if not self._opened or vectors.shape[1] != self.dim:
+                self._open(vectors.shape[1])
+            # Another process may have appended (or cached these very texts) since the lookup.
+            self._catch_up()
+            written = int(self._written[0])
+            for key, vector in zip(keys, vectors):
+                if key in self._slots:
+                    continue
+                slot = written % self.capacity
+                # Clear the key, write the vector, then set the key: readers check the key on both sides.
+                self._keys[slot] = 0
+                self._vectors[slot] = vector
+                self._keys[slot] = np.frombuffer(key, dtype=np.uint8)
+                self._index_slots([slot])
+                written += 1
+                self._unflushed += 1
+            self._written[0] = written
+            self._seen = written
+        if self._unflushed >= FLUSH_EVERY_ROWS or time.monotonic() - self._flushed_at >= FLUSH_INTERVAL_SECONDS:
+            self._flush()
+
+    def _flush(self):
+        if self._opened and self._unflushed:
+            self._vectors.flush()
+            self._keys.flush()
+            self._written.flush()
+        self._unflushed = 0
+        self._flushed_at = time.monotonic()
+
+    # --- Public API ---
+    def encode(self, texts, encode_fn) -> list:
+        """
+        Returns one embedding (a list of floats) per text. Cached texts are looked up; the rest
+        are encoded with a single encode_fn(list_of_texts) call and stored. Duplicate texts
+        within one call are encoded once.
+        """
+        if self.capacity <= 0:
+            return encode_fn(list(texts)) if texts else []
+        keys = [self.key_for(text) for text in texts]
+        found = {}
+        with self._lock:
+            if not self._opened:
+                self._open()
+            if self._opened:
+                self._catch_up()
+            for key in keys:
+                slot = self._slots.get(key)
+                if slot is None or self._keys[slot].tobytes() != key:
+                    continue
+                vector = self._vectors[slot].tolist()
+                if self._keys[slot].tobytes() == key:
+                    found[key] = vector
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+        with self._lock:
+            self.hits += len(keys) - sum(1 for key in keys if key in missing)
+            self.misses += len(missing)
+
+        if missing:
+            vectors = encode_fn(list(missing.values()))
+            found.update(zip(missing, vectors))
+            try:
+                with self._lock:
+                    self._store(list(missing), vectors)
+            except Exception as e:
+                print(f"--- EMBEDDING CACHE: Could not store vectors: {e} ---")
+        return [found[key] for key in keys]
+
+    def flush(self):
+        """Syncs stored rows and the shared counter to disk."""
+        with self._lock:
+            self._flush()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._slots),
+                "maxsize": self.capacity,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,142 @@
+# File: core/app/indexing.py
+# --- Purpose: Background embedding queue that indexes notes into the vector store in micro-batches. ---
+
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+# --- Indexing Status Values ---
+STATUS_PENDING = "pending"
+STATUS_INDEXED = "indexed"
+STATUS_FAILED = "failed"
+STATUS_UNKNOWN = "unknown"
+
+# Marker put on the queue to tell the worker thread to exit.
+_STOP = object()
+
+
+class EmbeddingQueue:
+    """
+    Collects notes waiting to be embedded and hands them to `index_batch` in batches.
+
+    A batch is flushed when it holds `batch_size` passages or when `max_wait` seconds have
+    passed since its first note arrived, whichever comes first. A note's passages always
+    travel in the same batch. `index_batch` receives the queued items in submission order:
+    dicts with `note_id`, `passages` (passage dicts with `id`, `text`, `document`, `metadata`)
+    and any extra details given to submit(). It is expected to write them to the vector store
+    in bulk.
+    """
+
+    def __init__(self, index_batch, batch_size: int = 32, max_wait: float = 0.25, status_capacity: int = 10000):
+        self._index_batch = index_batch
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self._status_capacity = status_capacity
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._flush_requested = threading.Event()
+        self._status = OrderedDict()
+        self._pending = 0
+        self._thread = None
+        self._closed = False
+
+    # --- Producer API ---
+    def submit(self, note_id: int, passages: list, **details):
+        """Queues a single note's passages (and any details for index_batch) and marks the note as pending."""
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Embedding queue has been shut down.")
+            self._ensure_worker()
+            self._set_status(note_id, STATUS_PENDING)
+            self._pending += 1
+        self._queue.put({**details, "note_id": note_id, "passages": passages})
+
+    def status(self, note_id: int) -> str:
+        """Returns the indexing status of a note submitted during this process's lifetime."""
+        with self._lock:
+            return self._status.get(note_id, STATUS_UNKNOWN)
+
+    @property
+    def pending(self) -> int:
+        with self._lock:
+            return self._pending
+
+    # --- Drain / Shutdown Hooks ---
+    def flush(self, timeout: float = None) -> bool:
+        """
+        Blocks until every queued note has been processed, skipping the batching deadline.
+        Returns False if the timeout expired first.
+        """
+        self._flush_requested.set()
+        try:
+            with self._idle:
+                return self._idle.wait_for(lambda: self._pending == 0, timeout=timeout)
+        finally:
+            self._flush_requested.clear()
+
+    def shutdown(self, timeout: float = None) -> bool:
+        """Drains the queue and stops the worker thread. Further submissions are rejected."""
+        with self._lock:
+            self._closed = True
+            thread = self._thread
+        drained = self.flush(timeout=timeout)
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join(timeout=timeout)
+        return drained
+
+    # --- Worker Internals ---
+    def _ensure_worker(self):
+        # Called with self._lock held.
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="kairos-embedding-queue", daemon=True)
+            self._thread.start()
+
+    def _set_status(self, note_id: int, status: str):
+        # Called with self._lock held. Oldest entries are dropped once the map is full.
+        self._status[note_id] = status
+        self._status.move_to_end(note_id)
+        while len(self._status) > self._status_capacity:
+            self._status.popitem(last=False)
+
+    def _collect_batch(self, first_item):
+        batch = [first_item]
+        size = max(len(first_item["passages"]), 1)
+        deadline = time.monotonic() + self.max_wait
+        while size < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if self._flush_requested.is_set() or remaining <= 0:
+                    item = self._queue.get_nowait()
+                else:
+                    item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                # Put the marker back so the main loop exits after this batch.
+                self._queue.put(_STOP)
+                break
+            batch.append(item)
+            size += max(len(item["passages"]), 1)
+        return batch
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            batch = self._collect_batch(item)
+            try:
+                self._index_batch(batch)
+                outcome = STATUS_INDEXED
+            except Exception as e:
+                print(f"--- INDEXER: Failed to index batch of {len(batch)} notes: {e} ---")
+                outcome = STATUS_FAILED
+            with self._idle:
+                for queued in batch:
+                    self._set_status(queued["note_id"], outcome)
+                self._pending -= len(batch)
+                self._idle.notify_all()
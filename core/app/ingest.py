@@ -0,0 +1,185 @@
+# File: core/app/ingest.py
+# --- Purpose: Streams bulk note payloads (JSON array or NDJSON) into chunked database writes. ---
+
+import codecs
+import json
+from typing import AsyncIterator
+from pydantic import ValidationError
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from . import crud, schemas
+
+# How many notes are written per transaction / vector-store add.
+BULK_CHUNK_SIZE = 500
+# Refuse to buffer a single JSON item larger than this while waiting for it to complete.
+MAX_ITEM_BYTES = 16 * 1024 * 1024
+
+NDJSON_CONTENT_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl", "application/x-jsonlines")
+
+
+class BulkPayloadError(ValueError):
+    """Raised when the bulk request body cannot be parsed any further."""
+
+
+def is_ndjson(content_type: str) -> bool:
+    """Returns True if the request content type announces newline-delimited JSON."""
+    return (content_type or "").split(";")[0].strip().lower() in NDJSON_CONTENT_TYPES
+
+
+# --- Incremental Parsers ---
+# Both parsers yield (index, item) pairs where item is either the decoded JSON value or
+# a BulkPayloadError describing why that single item was rejected.
+
+async def iter_ndjson(chunks: AsyncIterator[bytes]):
+    """Yields one item per non-empty line of an NDJSON body."""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    index = 0
+    final = False
+    stream = chunks.__aiter__()
+    while not final:
+        try:
+            buffer += decoder.decode(await stream.__anext__())
+        except StopAsyncIteration:
+            buffer += decoder.decode(b"", final=True)
+            final = True
+        *lines, buffer = buffer.split("\n")
+        if final:
+            lines.append(buffer)
+        elif len(buffer) > MAX_ITEM_BYTES:
+            raise BulkPayloadError(f"Line {index + 1} exceeds {MAX_ITEM_BYTES} bytes.")
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                yield index, json.loads(line)
+            except json.JSONDecodeError as e:
+                yield index, BulkPayloadError(f"Invalid JSON: {e}")
+            index += 1
+
+
+async def iter_json_array(chunks: AsyncIterator[bytes]):
+    """Yields the elements of a top-level JSON array without decoding the whole body at once."""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    json_decoder = json.JSONDecoder()
+    buffer = ""
+    index = 0
+    started = False
+    expect_comma = False
+    final = False
+    stream = chunks.__aiter__()
+    while not final:
+        try:
+            buffer += decoder.decode(await stream.__anext__())
+        except StopAsyncIteration:
+            buffer += decoder.decode(b"", final=True)
+            final = True
+
+        pos = 0
+        while True:
+            while pos < len(buffer) and buffer[pos].isspace():
+                pos += 1
+            if pos >= len(buffer):
+                break
+            char = buffer[pos]
+            if not started:
+                if char != "[":
+                    raise BulkPayloadError("Expected a JSON array.")
+                started = True
+                pos += 1
+            elif char == "]":
+                return
+            elif expect_comma:
+                if char != ",":
+                    raise BulkPayloadError(f"Expected ',' after item {index - 1}.")
+                expect_comma = False
+                pos += 1
+            else:
+                try:
+                    item, end = json_decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    # Most likely the item is split across chunks; wait for more data.
+                    break
+                if end == len(buffer) and not final and not isinstance(item, (dict, list, str)):
+                    # A bare number at the end of the buffer may still be incomplete.
+                    break
+                yield index, item
+                index += 1
+                expect_comma = True
+                pos = end
+
+        buffer = buffer[pos:]
+        if len(buffer) > MAX_ITEM_BYTES:
+            raise BulkPayloadError(f"Item {index} exceeds {MAX_ITEM_BYTES} bytes.")
+
+    if not started:
+        raise BulkPayloadError("Expected a JSON array.")
+    raise BulkPayloadError("Unexpected end of body or malformed item in JSON array.")
+
+
+# --- Response ---
+class IngestResponse(StreamingResponse):
+    """
+    StreamingResponse for endpoints whose body is still being read while results stream out.
+    Under ASGI spec versions before 2.4, StreamingResponse listens for the client disconnect by
+    calling receive() concurrently, which would steal the request body's messages from
+    request.stream() and stall the upload. Here the body iterator is the only reader of
+    receive(); a client that goes away surfaces as ClientDisconnect from request.stream() or
+    as a failed send.
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+# --- Chunked Ingestion ---
+async def ingest_notes(chunks: AsyncIterator[bytes], ndjson: bool, db: Session, user_id: int,
+                       chunk_size: int = BULK_CHUNK_SIZE):
+    """
+    Parses a bulk body incrementally and writes valid notes in chunks of `chunk_size`.
+    Yields one result dict per input item: invalid items right away, valid ones as soon
+    as their chunk has been committed. Results carry the item's position as `index`.
+    """
+    items = iter_ndjson(chunks) if ndjson else iter_json_array(chunks)
+    pending = []  # (index, NoteCreate) waiting for the current chunk to fill
+
+    async def write_chunk():
+        try:
+            results = await run_in_threadpool(crud.create_user_notes_bulk, db, [note for _, note in pending], user_id)
+            written = [{"index": index, "status": "created", **result} for (index, _), result in zip(pending, results)]
+        except Exception as e:
+            # A failed chunk (a locked database, a constraint) is reported item by item; later chunks still run.
+            print(f"--- BULK: Could not save {len(pending)} notes: {e} ---")
+            await run_in_threadpool(db.rollback)
+            written = [{"index": index, "status": "error", "detail": f"Could not save this note: {e}"}
+                       for index, _ in pending]
+        pending.clear()
+        return written
+
+    try:
+        async for index, item in items:
+            if isinstance(item, BulkPayloadError):
+                yield {"index": index, "status": "error", "detail": str(item)}
+                continue
+            try:
+                pending.append((index, schemas.NoteCreate.model_validate(item)))
+            except ValidationError as e:
+                yield {"index": index, "status": "error", "detail": json.loads(e.json())}
+                continue
+            if len(pending) >= chunk_size:
+                for result in await write_chunk():
+                    yield result
+    except BulkPayloadError as e:
+        # Keep what was parsed so far, then report why the rest of the body was dropped.
+        if pending:
+            for result in await write_chunk():
+                yield result
+        yield {"index": None, "status": "error", "detail": str(e)}
+        return
+
+    if pending:
+        for result in await write_chunk():
+            yield result
@@ -1,22 +1,67 @@
 # File: core/app/main.py
 # --- Purpose: The main entry point for the FastAPI application, defining API endpoints. ---
 
-from fastapi import FastAPI, Depends, HTTPException, status
+import asyncio
+import json
+import threading
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Depends, Header, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Literal, Optional, Union
 from datetime import timedelta
 
 # Import all our modules
-from . import crud, models, schemas, dependencies
-from .database import engine, get_db
-from .agents import team  # Import the agent team
+from . import crud, models, schemas, dependencies, ingest, cache, search, subsystems
+from .database import engine, async_engine, get_db, get_async_db, SessionLocal, add_missing_columns, \
+    create_missing_indexes
+from .agents import tools, streaming, completion_cache, context_packer, ollama_scheduler, router  # Lightweight: autogen and the scrapers load lazily
 
 # This crucial line tells SQLAlchemy to create all the database tables
 # based on the models defined in models.py.
 models.Base.metadata.create_all(bind=engine)
+# Bring databases created by older versions up to date with the models.
+add_missing_columns(models.Base.metadata)
+with SessionLocal() as _db:
+    crud.backfill_project_name_norms(_db)
+create_missing_indexes(models.Base.metadata)
+# The FTS5 index used for lexical/hybrid retrieval lives alongside the ORM tables.
+search.init_fts(engine)
+# Vector writes committed by a previous run but never applied (e.g. after a crash) are re-queued.
+with SessionLocal() as _db:
+    crud.replay_vector_outbox(_db)
 
-app = FastAPI(title="Project Kairos Core")
+
+# --- Lazy Subsystems & Lifespan ---
+def _load_agent_team():
+    # Importing the team pulls in autogen and builds every agent, so it waits until first use.
+    from .agents import team
+    return team
+
+
+_agent_team = subsystems.register("agents", _load_agent_team)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Starts the optional background warm-up. On shutdown, drains queued embeddings and closes
+    any warm headless browsers.
+    """
+    if subsystems.WARMUP_ON_STARTUP:
+        subsystems.start_background_warmup()
+    yield
+    # Give queued note embeddings a chance to reach the vector store before exit.
+    crud.embedding_queue.shutdown(timeout=30)
+    crud.embedding_cache.flush()
+    tools.browser_pool.shutdown(timeout=30)
+    await async_engine.dispose()
+
+
+app = FastAPI(title="Project Kairos Core", lifespan=lifespan)
 
 
 # --- Chat Schema ---
@@ -34,7 +79,18 @@ def read_root():
     return {"status": "Kairos Core is online"}
 
 
+@app.get("/ready")
+def read_readiness():
+    """
+    Reports which heavy subsystems (embedding model, vector store, agents, scrapers) are loaded.
+    Auth and CRUD endpoints serve before these are ready; anything missing loads on first use.
+    """
+    loaded = subsystems.status()
+    return {"ready": all(s["loaded"] for s in loaded.values()), "subsystems": loaded}
+
+
 # --- Authentication Endpoints ---
+# These stay sync: bcrypt hashing is CPU-bound and belongs on the threadpool, not the event loop.
 @app.post("/token", response_model=schemas.Token)
 def login_for_access_token(db: Session = Depends(get_db), form_data: OAuth2PasswordRequestForm = Depends()):
     """
@@ -65,54 +121,239 @@ def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
     return crud.create_user(db=db, user=user)
 
 
-@app.get("/users/me/", response_model=schemas.User)
-def read_users_me(current_user: models.User = Depends(dependencies.get_current_user)):
-    """Returns the details of the currently authenticated user."""
-    return current_user
+@app.get("/users/me/", response_model=schemas.UserProfile, response_model_exclude_none=True)
+async def read_users_me(include: str = "", include_limit: int = Query(20, ge=0, le=crud.PROFILE_MAX_ITEMS),
+                        db: AsyncSession = Depends(get_async_db),
+                        current_user: schemas.Principal = Depends(dependencies.get_current_principal_async)):
+    """
+    Returns the currently authenticated user's profile with note, project, task and anchor-log
+    counts. Embed recent entries with `include`, a comma-separated subset of notes, projects and
+    anchor_logs, capped at `include_limit` each. Embedded notes are summaries, not full bodies.
+    """
+    requested = {name.strip() for name in include.split(",") if name.strip()}
+    unknown = requested - set(crud.PROFILE_COLLECTIONS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown include: {', '.join(sorted(unknown))}. "
+                                                    f"Choose from {', '.join(crud.PROFILE_COLLECTIONS)}.")
+    return await crud.get_user_profile_async(db, user_id=current_user.id, email=current_user.email,
+                                             include=requested, limit=include_limit)
 
 
 # --- Note Endpoints ---
 @app.post("/notes/", response_model=schemas.Note)
-def create_note_for_user(
-        note: schemas.NoteCreate, db: Session = Depends(get_db),
-        current_user: models.User = Depends(dependencies.get_current_user)
+async def create_note_for_user(
+        note: schemas.NoteCreate, db: AsyncSession = Depends(get_async_db),
+        current_user: schemas.Principal = Depends(dependencies.get_current_principal_async)
 ):
     """Creates a new note for the currently authenticated user."""
-    return crud.create_user_note(db=db, note=note, user_id=current_user.id)
+    return await crud.create_user_note_async(db=db, note=note, user_id=current_user.id)
+
+
+@app.post("/notes/bulk")
+async def bulk_create_notes(request: Request,
+                            current_user: schemas.Principal = Depends(dependencies.get_current_principal)):
+    """
+    Creates many notes from a JSON array or an NDJSON body (Content-Type: application/x-ndjson).
+    The body is parsed as it arrives and written in chunked transactions. The response is an
+    NDJSON stream with one result object per input item.
+    """
+    user_id = current_user.id
+    ndjson = ingest.is_ndjson(request.headers.get("content-type"))
+
+    async def results():
+        # The response outlives request-scoped dependencies, so it owns its own session.
+        db = SessionLocal()
+        try:
+            async for result in ingest.ingest_notes(request.stream(), ndjson=ndjson, db=db, user_id=user_id):
+                yield json.dumps(result) + "\n"
+        finally:
+            db.close()
+
+    return ingest.IngestResponse(results(), media_type="application/x-ndjson")
 
 
-@app.get("/notes/", response_model=List[schemas.Note])
-def read_notes(skip: int = 0, limit: int = 100, db: Session = Depends(get_db),
-               current_user: models.User = Depends(dependencies.get_current_user)):
-    """Lists all notes for the currently authenticated user."""
-    notes = crud.get_notes(db, user_id=current_user.id, skip=skip, limit=limit)
+@app.get("/notes/", response_model=Union[List[schemas.Note], List[schemas.NoteSummary]])
+async def read_notes(response: Response, skip: int = 0, limit: int = Query(100, ge=1, le=1000),
+                     after_id: Optional[int] = None, view: Literal["full", "summary"] = "full",
+                     if_none_match: Optional[str] = Header(None),
+                     db: AsyncSession = Depends(get_async_db),
+                     current_user: schemas.Principal = Depends(dependencies.get_current_principal_async)):
+    """
+    Lists notes for the currently authenticated user in id order.
+    - Paginate with `after_id` (the `X-Next-Cursor` header of the previous page); `skip` still works.
+    - `view=summary` returns id, title, size and a snippet instead of the full content.
+    - Send the previous `ETag` as `If-None-Match` to get 304 when nothing has changed.
+    """
+    etag = crud.notes_etag(current_user.id, view, after_id, skip, limit)
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+    if view == "summary":
+        notes = await crud.get_note_summaries_async(db, user_id=current_user.id, skip=skip, limit=limit,
+                                                    after_id=after_id)
+    else:
+        notes = await crud.get_notes_async(db, user_id=current_user.id, skip=skip, limit=limit, after_id=after_id)
+
+    response.headers["ETag"] = etag
+    if len(notes) == limit:
+        response.headers["X-Next-Cursor"] = str(notes[-1].id)
     return notes
 
 
+@app.patch("/notes/{note_id}", response_model=schemas.Note)
+async def update_note(note_id: int, changes: schemas.NoteUpdate, db: AsyncSession = Depends(get_async_db),
+                      current_user: schemas.Principal = Depends(dependencies.get_current_principal_async)):
+    """Updates a note's title and/or content. Its passages are re-embedded only if either changed."""
+    db_note = await crud.update_user_note_async(db, note_id=note_id, user_id=current_user.id, changes=changes)
+    if db_note is None:
+        raise HTTPException(status_code=404, detail="Note not found")
+    return db_note
+
+
+@app.delete("/notes/{note_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_note(note_id: int, db: AsyncSession = Depends(get_async_db),
+                      current_user: schemas.Principal = Depends(dependencies.get_current_principal_async)):
+    """Deletes a note; its passages are removed from the vector store in the background."""
+    if not await crud.delete_user_note_async(db, note_id=note_id, user_id=current_user.id):
+        raise HTTPException(status_code=404, detail="Note not found")
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+@app.get("/notes/{note_id}/status", response_model=schemas.NoteIndexStatus)
+async def read_note_index_status(note_id: int, db: AsyncSession = Depends(get_async_db),
+                                 current_user: schemas.Principal = Depends(dependencies.get_current_principal_async)):
+    """Reports whether a note's embedding has reached the vector store yet."""
+    if await crud.get_note_async(db, note_id=note_id, user_id=current_user.id) is None:
+        raise HTTPException(status_code=404, detail="Note not found")
+    return {"note_id": note_id, "status": crud.get_note_index_status(note_id)}
+
+
+# --- URL Assimilation ---
+@app.post("/assimilate/batch")
+def assimilate_batch(batch: schemas.AssimilateBatch,
+                     current_user: schemas.Principal = Depends(dependencies.get_current_principal)):
+    """
+    Assimilates a list of URLs into notes. Pages are crawled concurrently with per-host limits
+    and served from the fetch cache when unchanged. The response is an NDJSON stream with one
+    result object per URL, in completion order; `index` refers to the position in `urls`.
+    """
+    user_id = current_user.id
+
+    def results():
+        # The response outlives request-scoped dependencies, so it owns its own session.
+        db = SessionLocal()
+        try:
+            for result in tools.assimilate_urls(batch.urls, db=db, user_id=user_id):
+                yield json.dumps(result) + "\n"
+        finally:
+            db.close()
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+
+# --- Diagnostics ---
+@app.get("/stats/cache")
+def read_cache_stats(current_user: schemas.Principal = Depends(dependencies.get_current_principal)):
+    """Hit/miss counters for the embedding, retrieval, token-verification and completion caches."""
+    return {**cache.stats(), "embeddings": crud.embedding_cache.stats(),
+            "verified_tokens": dependencies.token_cache_stats(), "completions": completion_cache.stats()}
+
+
+@app.get("/stats/agents")
+def read_agent_stats(current_user: schemas.Principal = Depends(dependencies.get_current_principal)):
+    """
+    How group chat speakers were chosen (including LLM selections avoided), Ollama model
+    residency, and the prompt tokens saved by context packing.
+    """
+    return {"speaker_selection": router.stats(), "ollama": ollama_scheduler.scheduler.snapshot(),
+            "context": context_packer.stats()}
+
+
 # --- Agent Chat Endpoint ---
 @app.post("/chat/", response_model=ChatResponse)
 def chat_with_agents(
         request: ChatRequest,
         db: Session = Depends(get_db),
-        current_user: models.User = Depends(dependencies.get_current_user)
+        current_user: schemas.Principal = Depends(dependencies.get_current_principal)
 ):
     """
     Initiates a conversation with the Kairos agentic team.
     """
-    # Register the tools with the current user's context
-    team.register_tools(db_session=db, user_id=current_user.id)
+    team = _agent_team.get()
 
-    # Initiate the chat with the user's message
-    team.user_proxy.initiate_chat(
-        recipient=team.group_chat_manager,
-        message=request.message,
-    )
+    try:
+        with team.chat_slot():
+            # Each conversation gets its own agents, history and tool context.
+            kairos_team = team.build_team(db_session=db, user_id=current_user.id)
+            final_reply = kairos_team.run(request.message)
+    except team.ChatCapacityError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e),
+                            headers={"Retry-After": "5"})
 
-    # The last message in the chat history is the final reply
-    final_reply = team.groupchat.messages[-1]['content']
+    return {"reply": final_reply}
 
-    # Clear the chat history for the next interaction
-    team.groupchat.reset()
 
-    return {"reply": final_reply}
+# Seconds between SSE keep-alive comments while the agents are thinking.
+SSE_KEEPALIVE_SECONDS = 10
+
+
+@app.post("/chat/stream")
+async def stream_chat_with_agents(
+        chat: ChatRequest,
+        http_request: Request,
+        current_user: schemas.Principal = Depends(dependencies.get_current_principal)
+):
+    """
+    Streams a conversation with the Kairos agentic team as Server-Sent Events: each agent turn
+    (`message`), tool call (`tool_call`), tool result (`tool_result`) and model token (`token`)
+    as it is produced, ending with `done` (carrying the final reply), `cancelled` or `error`.
+    Closing the connection cancels the remaining rounds.
+    """
+    team = await run_in_threadpool(_agent_team.get)
+    try:
+        await run_in_threadpool(team.acquire_chat_slot)
+    except team.ChatCapacityError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e),
+                            headers={"Retry-After": "5"})
+
+    user_id = current_user.id
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+    cancelled = threading.Event()
+
+    def emit(event):
+        loop.call_soon_threadsafe(events.put_nowait, event)
+
+    def converse():
+        # Runs on its own thread with its own session; the response outlives request dependencies.
+        db = SessionLocal()
+        try:
+            kairos_team = team.build_team(db_session=db, user_id=user_id, stream=True)
+            streaming.run_streaming(kairos_team, chat.message, emit, cancelled)
+        except Exception as e:
+            emit({"type": "error", "detail": str(e)})
+        finally:
+            db.close()
+            team.release_chat_slot()
+
+    threading.Thread(target=converse, name="kairos-chat-stream", daemon=True).start()
+
+    async def event_source():
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(events.get(), timeout=SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    if await http_request.is_disconnected():
+                        return
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+                if event["type"] in ("done", "cancelled", "error"):
+                    return
+        finally:
+            # Reached on completion and when the client disconnects (the generator is closed).
+            cancelled.set()
 
+    return StreamingResponse(event_source(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
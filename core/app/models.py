@@ -1,7 +1,7 @@
 # File: core/app/models.py
 # --- Purpose: Defines the database tables as Python classes using SQLAlchemy ORM. ---
 
-from sqlalchemy import Column, Integer, String, Text, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Index, func
 from sqlalchemy.orm import relationship
 from .database import Base
 
@@ -15,22 +15,64 @@ class User(Base):
     # Relationships: These link the User model to other models.
     notes = relationship("Note", back_populates="owner")
     projects = relationship("Project", back_populates="owner")
+    anchor_logs = relationship("MicroAnchorLog", back_populates="owner")
 
 class Note(Base):
     __tablename__ = "notes"
+    # Serves keyset pagination: WHERE owner_id = ? AND id > ? ORDER BY id.
+    __table_args__ = (Index("ix_notes_owner_id_id", "owner_id", "id"),)
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, index=True)
     content = Column(Text)
     owner_id = Column(Integer, ForeignKey("users.id"))
+    # Set on insert and on every ORM update; lets a rebuild find notes that changed while it ran.
+    # NULL for notes written before the column existed.
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), index=True)
 
     owner = relationship("User", back_populates="notes")
 
+class VectorOutbox(Base):
+    """A vector-store write owed for a committed note change. Deleted once it has been applied."""
+    __tablename__ = "vector_outbox"
+
+    id = Column(Integer, primary_key=True, index=True)
+    # No foreign key: delete entries outlive their note.
+    note_id = Column(Integer, nullable=False, index=True)
+    owner_id = Column(Integer, nullable=False, index=True)
+    op = Column(String, nullable=False)  # "upsert", "replace" or "delete" (see crud)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
 class Project(Base):
     __tablename__ = "projects"
+    # One project per normalized name and owner; also serves exact and prefix name lookups.
+    __table_args__ = (Index("ux_projects_owner_id_name_norm", "owner_id", "name_norm", unique=True),)
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
+    # Case-folded, whitespace-collapsed name (see crud.normalize_project_name).
+    name_norm = Column(String)
     owner_id = Column(Integer, ForeignKey("users.id"))
 
     owner = relationship("User", back_populates="projects")
+    tasks = relationship("Task", back_populates="project")
+
+class Task(Base):
+    __tablename__ = "tasks"
+
+    id = Column(Integer, primary_key=True, index=True)
+    title = Column(String, nullable=False)
+    project_id = Column(Integer, ForeignKey("projects.id"), index=True)
+
+    project = relationship("Project", back_populates="tasks")
+
+class MicroAnchorLog(Base):
+    __tablename__ = "micro_anchor_logs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    anchor_name = Column(String, nullable=False)
+    reflection = Column(Text)
+    timestamp = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    owner_id = Column(Integer, ForeignKey("users.id"), index=True)
+
+    owner = relationship("User", back_populates="anchor_logs")
@@ -0,0 +1,334 @@
+# File: core/app/reindex.py
+# --- Purpose: Rebuilds the vector store from the notes table into a new collection generation. ---
+#
+#   python -m core.app.reindex [--model NAME] [--workers N] [--batch-size N] [--restart] [--no-swap]
+#                              [--keep-previous]
+#   python -m core.app.reindex --swap-only [--keep-previous]
+#
+# Notes are streamed from SQL in id order and encoded by a process pool. Vectors go into a new
+# generation of collections while the API keeps serving the live one; progress is checkpointed
+# so an interrupted run resumes where it stopped. When the rebuild is complete the generation
+# pointer is swapped atomically and running APIs follow it within a few seconds. Note writes
+# and Takeout imports that only reached the old generation meanwhile are then caught up, and
+# the old generation is dropped.
+
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from sqlalchemy import or_, select
+from . import consistency, crud, models
+from .database import SessionLocal
+from .embedding_cache import EmbeddingCache
+from .vector_store import (GENERATION_CHECK_SECONDS, VECTOR_STORE_PATH, CollectionResolver, drop_generation,
+                           get_client, read_generation, write_generation)
+
+CHECKPOINT_FILE = os.path.join(VECTOR_STORE_PATH, "reindex.json")
+# Passages per encode job sent to a worker process.
+REINDEX_BATCH_SIZE = 256
+# Notes read from SQL per query.
+NOTE_PAGE_SIZE = 500
+# Slack applied to the rebuild's start time when looking for notes changed during it.
+CATCH_UP_MARGIN = timedelta(minutes=1)
+
+
+# --- Worker Processes ---
+_worker_model = None
+
+
+def _init_worker(model_name: str):
+    # One model per process; torch is limited to one thread so processes don't oversubscribe cores.
+    global _worker_model
+    import torch
+    from sentence_transformers import SentenceTransformer
+    torch.set_num_threads(1)
+    _worker_model = SentenceTransformer(model_name)
+
+
+def _encode_in_worker(texts: list) -> list:
+    return _worker_model.encode(texts, batch_size=min(len(texts), crud.ENCODE_BATCH_SIZE)).tolist()
+
+
+# --- Checkpoint ---
+def _load_checkpoint():
+    try:
+        with open(CHECKPOINT_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _save_checkpoint(checkpoint: dict):
+    os.makedirs(VECTOR_STORE_PATH, exist_ok=True)
+    temp = f"{CHECKPOINT_FILE}.tmp"
+    with open(temp, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f)
+    os.replace(temp, CHECKPOINT_FILE)
+
+
+def _start_or_resume(model_name: str, restart: bool) -> dict:
+    live = read_generation()
+    checkpoint = _load_checkpoint()
+    if (checkpoint and not restart and not checkpoint.get("swapped") and checkpoint["generation"] > live
+            and checkpoint["model"] == model_name):
+        print(f"--- REINDEX: Resuming generation {checkpoint['generation']} after note "
+              f"{checkpoint['last_note_id']}. ---")
+        return checkpoint
+    generation = max(live, checkpoint["generation"] if checkpoint else 0) + 1
+    started_at = datetime.now(timezone.utc).replace(tzinfo=None).isoformat()  # naive UTC, like func.now()
+    checkpoint = {"generation": generation, "model": model_name, "started_at": started_at, "last_note_id": 0,
+                  "notes": 0, "passages": 0, "takeout_owner_id": 0, "notes_done": False, "complete": False,
+                  "swapped": False}
+    _save_checkpoint(checkpoint)
+    print(f"--- REINDEX: Building generation {generation} with '{model_name}'. ---")
+    return checkpoint
+
+
+# --- Streaming ---
+def _note_batches(after_id: int, batch_size: int):
+    """Yields (last_note_id, note_count, passages) groups of roughly batch_size passages, in note id order."""
+    query = select(models.Note.id, models.Note.owner_id, models.Note.title, models.Note.content)
+    passages, notes = [], 0
+    with SessionLocal() as db:
+        while True:
+            rows = db.execute(query.where(models.Note.id > after_id).order_by(models.Note.id)
+                              .limit(NOTE_PAGE_SIZE)).all()
+            if not rows:
+                break
+            for note_id, owner_id, title, content in rows:
+                passages.extend(crud._note_passages(note_id, owner_id, title, content))
+                notes += 1
+                after_id = note_id
+                if len(passages) >= batch_size:
+                    yield after_id, notes, passages
+                    passages, notes = [], 0
+    if passages or notes:
+        yield after_id, notes, passages
+
+
+def _write_passages(resolver: CollectionResolver, passages: list, embeddings: list):
+    by_owner = {}
+    for passage, embedding in zip(passages, embeddings):
+        by_owner.setdefault(passage["metadata"]["owner_id"], []).append((passage, embedding))
+    for owner_id, owned in by_owner.items():
+        resolver.get(owner_id).upsert(
+            embeddings=[embedding for _, embedding in owned],
+            documents=[p["document"] for p, _ in owned],
+            metadatas=[p["metadata"] for p, _ in owned],
+            ids=[p["id"] for p, _ in owned]
+        )
+
+
+def _pipeline(jobs, encode, workers: int):
+    """
+    Encodes (payload, texts) jobs `workers` at a time and yields (payload, embeddings) in
+    submission order, so checkpoints only ever advance past fully written notes.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as dispatch:
+        in_flight = deque()
+        for payload, texts in jobs:
+            in_flight.append((payload, dispatch.submit(encode, texts)))
+            if len(in_flight) >= workers * 2:
+                payload, future = in_flight.popleft()
+                yield payload, future.result()
+        while in_flight:
+            payload, future = in_flight.popleft()
+            yield payload, future.result()
+
+
+# --- Rebuild ---
+def _pages(collection, where: dict, batch_size: int):
+    """Yields (page, documents) for every vector matching `where`, batch_size at a time."""
+    offset = 0
+    while True:
+        page = collection.get(where=where, include=["documents", "metadatas"], limit=batch_size, offset=offset)
+        if not page["ids"]:
+            return
+        offset += len(page["ids"])
+        yield page, page["documents"]
+
+
+def _copy_takeout_vectors(checkpoint, live: CollectionResolver, target: CollectionResolver, encode, workers, batch_size):
+    """
+    Google Takeout searches exist only in the vector store, not in SQL, so they are carried
+    over from the live collections (re-embedded from their stored documents).
+    """
+    client = get_client()
+    with SessionLocal() as db:
+        owner_ids = db.scalars(select(models.User.id).where(models.User.id > checkpoint["takeout_owner_id"])
+                               .order_by(models.User.id)).all()
+    for owner_id in owner_ids:
+        try:
+            source = client.get_collection(name=live.name_for(owner_id))
+        except Exception:
+            source = None
+        if source is not None:
+            where = {"source": "google_takeout"}
+            if live.where_for(owner_id):
+                where = {"$and": [where, live.where_for(owner_id)]}
+            for page, embeddings in _pipeline(_pages(source, where, batch_size), encode, workers):
+                target.get(owner_id).upsert(ids=page["ids"], embeddings=embeddings, documents=page["documents"],
+                                            metadatas=page["metadatas"])
+        checkpoint["takeout_owner_id"] = owner_id
+        _save_checkpoint(checkpoint)
+
+
+def catch_up_takeout(previous: int, generation: int, batch_size: int = REINDEX_BATCH_SIZE) -> int:
+    """
+    Copies Takeout searches that reached the previous generation after _copy_takeout_vectors
+    ran (an import made during the rebuild writes to the generation that was live). Only ids
+    missing from the new generation are embedded. Returns how many were copied.
+    """
+    client = get_client()
+    old = CollectionResolver(get_client, generation=previous)
+    new = CollectionResolver(get_client, generation=generation)
+    with SessionLocal() as db:
+        owner_ids = db.scalars(select(models.User.id).order_by(models.User.id)).all()
+    copied = 0
+    for owner_id in owner_ids:
+        try:
+            source = client.get_collection(name=old.name_for(owner_id))
+        except Exception:
+            continue
+        where = {"source": "google_takeout"}
+        if old.where_for(owner_id):
+            where = {"$and": [where, old.where_for(owner_id)]}
+        target = new.get(owner_id)
+        for page, documents in _pages(source, where, batch_size):
+            present = set(target.get(ids=page["ids"], include=[])["ids"])
+            missing = [i for i, vector_id in enumerate(page["ids"]) if vector_id not in present]
+            if not missing:
+                continue
+            target.upsert(ids=[page["ids"][i] for i in missing],
+                          embeddings=crud.embed_texts([documents[i] for i in missing]),
+                          documents=[documents[i] for i in missing],
+                          metadatas=[page["metadatas"][i] for i in missing])
+            copied += len(missing)
+    print(f"--- REINDEX: Caught up {copied} Takeout searches imported during the rebuild. ---")
+    return copied
+
+
+def catch_up(checkpoint: dict) -> dict:
+    """
+    Re-applies note writes the rebuild may have missed, against the now-live generation:
+    notes created after the last pass or updated since the rebuild started are re-embedded,
+    and a consistency repair drops vectors of notes deleted meanwhile. Runs after running
+    APIs have switched generations, so nothing written from here on goes to the old one.
+    """
+    condition = models.Note.id > checkpoint["last_note_id"]
+    if checkpoint.get("started_at"):
+        since = datetime.fromisoformat(checkpoint["started_at"]) - CATCH_UP_MARGIN
+        condition = or_(condition, models.Note.updated_at >= since)
+    with SessionLocal() as db:
+        by_owner = {}
+        for note_id, owner_id in db.execute(select(models.Note.id, models.Note.owner_id).where(condition)):
+            by_owner.setdefault(owner_id, []).append(note_id)
+        reembedded = sum(crud.queue_vector_repairs(db, owner_id, reindex_ids=note_ids)
+                         for owner_id, note_ids in by_owner.items())
+        reports = consistency.check_all(db, repair=True)
+    # This process's embedding queue applies the queued writes; wait for them.
+    crud.embedding_queue.shutdown(timeout=None)
+    repaired = sum(report["queued"] for report in reports)
+    print(f"--- REINDEX: Caught up {reembedded} changed notes and {repaired} other drifted notes. ---")
+    return {"reembedded": reembedded, "repaired": repaired}
+
+
+def swap(checkpoint: dict, drop_previous: bool = True):
+    """
+    Points the live generation at a completed rebuild, waits for running APIs to follow,
+    catches up note writes and Takeout imports made during the rebuild and drops the previous
+    generation.
+    """
+    previous = read_generation()
+    write_generation(checkpoint["generation"], model=checkpoint["model"])
+    checkpoint["swapped"] = True
+    _save_checkpoint(checkpoint)
+    print(f"--- REINDEX: Generation {checkpoint['generation']} is now live. ---")
+
+    time.sleep(GENERATION_CHECK_SECONDS + 1)
+    catch_up(checkpoint)
+    if previous != checkpoint["generation"]:
+        catch_up_takeout(previous, checkpoint["generation"])
+    if drop_previous and previous != checkpoint["generation"]:
+        drop_generation(previous)
+
+
+def reindex(model_name: str = None, workers: int = None, batch_size: int = REINDEX_BATCH_SIZE,
+            restart: bool = False, do_swap: bool = True, drop_previous: bool = True) -> dict:
+    """Rebuilds every note's vectors into a new generation, resuming a previous run if possible."""
+    model_name = model_name or crud.EMBEDDING_MODEL_NAME
+    workers = workers or os.cpu_count() or 1
+    checkpoint = _start_or_resume(model_name, restart)
+    target = CollectionResolver(get_client, generation=checkpoint["generation"])
+    live = CollectionResolver(get_client, generation=read_generation())
+    embeddings_cache = EmbeddingCache(model_name)
+
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                             initargs=(model_name,)) as pool:
+        def encode(texts):
+            return embeddings_cache.encode(texts, lambda missing: pool.submit(_encode_in_worker, missing).result())
+
+        # Loop until a pass finds nothing new, so notes created during the rebuild are included.
+        while not checkpoint["notes_done"]:
+            jobs = (((last_id, notes, passages), [p["text"] for p in passages])
+                    for last_id, notes, passages in _note_batches(checkpoint["last_note_id"], batch_size))
+            written = 0
+            for (last_id, notes, passages), embeddings in _pipeline(jobs, encode, workers):
+                if passages:
+                    _write_passages(target, passages, embeddings)
+                checkpoint.update(last_note_id=last_id, notes=checkpoint["notes"] + notes,
+                                  passages=checkpoint["passages"] + len(passages))
+                _save_checkpoint(checkpoint)
+                written += notes
+                print(f"--- REINDEX: {checkpoint['notes']} notes, {checkpoint['passages']} passages "
+                      f"(through note {last_id}) ---")
+            if not written:
+                checkpoint["notes_done"] = True
+                _save_checkpoint(checkpoint)
+
+        _copy_takeout_vectors(checkpoint, live, target, encode, workers, batch_size)
+    embeddings_cache.flush()
+
+    checkpoint["complete"] = True
+    _save_checkpoint(checkpoint)
+    if do_swap and model_name == crud.EMBEDDING_MODEL_NAME:
+        swap(checkpoint, drop_previous=drop_previous)
+    elif do_swap:
+        # Queries embedded with the old model can't search the new vectors, so the API has to restart.
+        print(f"--- REINDEX: Generation {checkpoint['generation']} is complete. Stop the API, run "
+              f"KAIROS_EMBEDDING_MODEL={model_name} python -m core.app.reindex --swap-only, and start the "
+              f"API with the same setting. ---")
+    else:
+        print(f"--- REINDEX: Generation {checkpoint['generation']} is complete; run with --swap-only to go live. ---")
+    return checkpoint
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the Kairos vector store from the notes table.")
+    parser.add_argument("--model", default=None, help="Embedding model (defaults to the one the API uses).")
+    parser.add_argument("--workers", type=int, default=None, help="Encoder processes (defaults to CPU cores).")
+    parser.add_argument("--batch-size", type=int, default=REINDEX_BATCH_SIZE, help="Passages per encode job.")
+    parser.add_argument("--restart", action="store_true", help="Ignore any checkpoint and start a new generation.")
+    parser.add_argument("--no-swap", action="store_true", help="Build the generation but keep serving the old one.")
+    parser.add_argument("--swap-only", action="store_true", help="Make the last completed generation live.")
+    parser.add_argument("--keep-previous", action="store_true",
+                        help="Keep the previous generation's collections after swapping instead of dropping them.")
+    args = parser.parse_args()
+
+    if args.swap_only:
+        last = _load_checkpoint()
+        if not last or not last.get("complete"):
+            parser.error("There is no completed rebuild to swap in.")
+        if last["model"] != crud.EMBEDDING_MODEL_NAME:
+            # The catch-up embeds changed notes, so it has to use the generation's model.
+            parser.error(f"Generation {last['generation']} uses '{last['model']}'; "
+                         f"run with KAIROS_EMBEDDING_MODEL={last['model']}.")
+        swap(last, drop_previous=not args.keep_previous)
+    else:
+        print(reindex(model_name=args.model, workers=args.workers, batch_size=args.batch_size,
+                      restart=args.restart, do_swap=not args.no_swap, drop_previous=not args.keep_previous))
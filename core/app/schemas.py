@@ -1,7 +1,7 @@
 # File: core/app/schemas.py
 # --- Purpose: Defines the data shapes for API validation using Pydantic. ---
 
-from pydantic import BaseModel
+from pydantic import BaseModel, field_validator
 from typing import Optional, List
 from datetime import datetime
 
@@ -13,6 +13,11 @@ class Token(BaseModel):
 class TokenData(BaseModel):
     email: Optional[str] = None
 
+class Principal(BaseModel):
+    """The authenticated caller, without loading the ORM User or its relationships."""
+    id: int
+    email: str
+
 # --- Task Schemas ---
 class TaskBase(BaseModel):
     title: str
@@ -35,6 +40,18 @@ class NoteBase(BaseModel):
 class NoteCreate(NoteBase):
     pass
 
+class NoteUpdate(BaseModel):
+    title: Optional[str] = None
+    content: Optional[str] = None
+
+    @field_validator("title")
+    @classmethod
+    def title_not_null(cls, value):
+        # Omit the title to keep it; it can't be cleared (content can, with null).
+        if value is None:
+            raise ValueError("title cannot be null")
+        return value
+
 class Note(NoteBase):
     id: int
     owner_id: int
@@ -42,6 +59,23 @@ class Note(NoteBase):
     class Config:
         from_attributes = True
 
+class NoteSummary(BaseModel):
+    """A note listing entry without the full content."""
+    id: int
+    title: Optional[str] = None
+    size: int
+    snippet: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+class NoteIndexStatus(BaseModel):
+    note_id: int
+    status: str
+
+class AssimilateBatch(BaseModel):
+    urls: List[str]
+
 # --- Project Schemas ---
 class ProjectBase(BaseModel):
     name: str
@@ -88,3 +122,17 @@ class User(UserBase):
 
     class Config:
         from_attributes = True
+
+class UserProfile(UserBase):
+    """
+    Constant-size view of a user with aggregate counts. Collections are only present when
+    requested through /users/me/?include=..., and are capped at a bounded number of entries.
+    """
+    id: int
+    note_count: int
+    project_count: int
+    task_count: int
+    anchor_log_count: int
+    notes: Optional[List[NoteSummary]] = None
+    projects: Optional[List[Project]] = None
+    anchor_logs: Optional[List[MicroAnchorLog]] = None
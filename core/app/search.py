@@ -0,0 +1,90 @@
+# File: core/app/search.py
+# --- Purpose: Lexical (BM25) search over notes using an SQLite FTS5 index, plus rank fusion. ---
+
+import re
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+FTS_TABLE = "notes_fts"
+
+# The FTS table mirrors notes.title/notes.content ("external content"), so text is stored only once.
+# Triggers keep it in sync with every insert, update and delete on the notes table.
+_FTS_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        title, content, content='notes', content_rowid='id', tokenize='unicode61'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON notes BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON notes BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF title, content ON notes BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+        INSERT INTO {FTS_TABLE}(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END""",
+]
+
+# Standard reciprocal rank fusion constant; dampens the influence of top ranks.
+RRF_K = 60
+
+
+def init_fts(engine):
+    """
+    Creates the FTS5 index and its sync triggers if they are missing. On first creation the
+    index is rebuilt from the existing notes table so older notes are searchable too.
+    """
+    with engine.begin() as conn:
+        existed = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": FTS_TABLE}
+        ).first() is not None
+        for statement in _FTS_DDL:
+            conn.execute(text(statement))
+        if not existed:
+            conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+
+
+def to_fts_query(query: str) -> str:
+    """
+    Turns free text into a safe FTS5 expression: every term is quoted, so punctuation in
+    error codes, CLI flags or paths cannot be misread as query syntax, and terms are OR-ed
+    so BM25 ranks notes that match more of them higher.
+    """
+    terms = re.findall(r"[^\s\"]+", query or "")
+    return " OR ".join('"' + term + '"' for term in terms)
+
+
+def lexical_search(db: Session, user_id: int, query: str, limit: int = 20) -> list:
+    """Returns the user's best BM25 matches as dicts with note_id, title, snippet and score."""
+    fts_query = to_fts_query(query)
+    if not fts_query:
+        return []
+    try:
+        rows = db.execute(
+            text(f"""
+                SELECT n.id, n.title, snippet({FTS_TABLE}, 1, '', '', ' ... ', 64) AS snippet,
+                       bm25({FTS_TABLE}) AS score
+                FROM {FTS_TABLE} JOIN notes n ON n.id = {FTS_TABLE}.rowid
+                WHERE {FTS_TABLE} MATCH :query AND n.owner_id = :owner_id
+                ORDER BY score
+                LIMIT :limit
+            """),
+            {"query": fts_query, "owner_id": user_id, "limit": limit},
+        ).all()
+    except OperationalError as e:
+        print(f"--- SEARCH: FTS query failed for '{query}': {e} ---")
+        return []
+    return [{"note_id": row.id, "title": row.title, "snippet": row.snippet, "score": row.score} for row in rows]
+
+
+def reciprocal_rank_fusion(rankings, k: int = RRF_K) -> list:
+    """
+    Merges several ranked lists of keys into one. Each key scores sum(1 / (k + rank)) over
+    the lists it appears in; ties keep the order in which keys were first seen.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, start=1):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=lambda key: scores[key], reverse=True)
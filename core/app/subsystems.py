@@ -0,0 +1,77 @@
+# File: core/app/subsystems.py
+# --- Purpose: Lazily initialized heavy dependencies (ML models, vector store, agents, browsers). ---
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Load every registered subsystem in a background thread when the API starts.
+WARMUP_ON_STARTUP = os.getenv("KAIROS_WARMUP", "1") == "1"
+
+_registry = OrderedDict()
+
+
+class Subsystem:
+    """
+    A heavy dependency that is built on first use instead of at import time. get() runs the
+    loader exactly once, even under concurrent callers; a failed load is retried next call.
+    """
+
+    def __init__(self, name: str, loader):
+        self.name = name
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._value = None
+        self.loaded = False
+        self.load_seconds = None
+        self.error = None
+
+    def get(self):
+        if self.loaded:
+            return self._value
+        with self._lock:
+            if not self.loaded:
+                print(f"--- SUBSYSTEM: Loading {self.name}... ---")
+                started = time.perf_counter()
+                try:
+                    self._value = self._loader()
+                except Exception as e:
+                    self.error = str(e)
+                    raise
+                self.load_seconds = round(time.perf_counter() - started, 3)
+                self.error = None
+                self.loaded = True
+                print(f"--- SUBSYSTEM: {self.name} ready in {self.load_seconds}s ---")
+        return self._value
+
+    def status(self) -> dict:
+        return {"loaded": self.loaded, "load_seconds": self.load_seconds, "error": self.error}
+
+
+def register(name: str, loader) -> Subsystem:
+    """Declares a lazily loaded subsystem. Registering the same name twice returns the first one."""
+    if name not in _registry:
+        _registry[name] = Subsystem(name, loader)
+    return _registry[name]
+
+
+def status() -> dict:
+    """Load state of every registered subsystem, in registration order."""
+    return {name: subsystem.status() for name, subsystem in _registry.items()}
+
+
+def warm_up():
+    """Loads every registered subsystem, logging (not raising) failures."""
+    for subsystem in list(_registry.values()):
+        try:
+            subsystem.get()
+        except Exception as e:
+            print(f"--- SUBSYSTEM: Warm-up of {subsystem.name} failed: {e} ---")
+
+
+def start_background_warmup() -> threading.Thread:
+    """Starts warm_up() on a daemon thread so the API can serve while models load."""
+    thread = threading.Thread(target=warm_up, name="kairos-warmup", daemon=True)
+    thread.start()
+    return thread
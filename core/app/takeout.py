@@ -0,0 +1,119 @@
+# File: core/app/takeout.py
+# --- Purpose: Streams search activity out of Google Takeout 'My Activity' HTML exports. ---
+
+import codecs
+import hashlib
+import os
+import re
+from datetime import datetime
+from html.parser import HTMLParser
+
+# Bytes read from the export per parser feed; memory stays bounded by this, not the file size.
+READ_CHUNK_BYTES = 1024 * 1024
+
+_SEARCH_PREFIX = "Searched for"
+# e.g. "Jan 5, 2023, 10:15:32 AM EST". The trailing zone name is dropped before parsing.
+_TIMESTAMP_FORMATS = ("%b %d, %Y, %I:%M:%S %p", "%d %b %Y, %H:%M:%S", "%b %d, %Y, %H:%M:%S")
+_TIMESTAMP_ZONE = re.compile(r"\s+[A-Z]{2,5}([+-]\d{1,2}(:?\d{2})?)?$")
+
+
+def parse_timestamp(text: str):
+    """Parses an English Takeout timestamp to a naive datetime, or returns None."""
+    text = _TIMESTAMP_ZONE.sub("", " ".join(text.split()))
+    for fmt in _TIMESTAMP_FORMATS:
+        try:
+            return datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def record_id(user_id: int, record: dict) -> str:
+    """Content-derived vector id, so importing the same export twice yields the same ids."""
+    digest = hashlib.sha256(f"{record['query']}\0{record['timestamp'] or ''}".encode("utf-8")).hexdigest()
+    return f"takeout_{user_id}_{digest[:24]}"
+
+
+class _ActivityParser(HTMLParser):
+    """
+    Collects the text of every <div class="content-cell"> as it closes. Each cell is split on
+    <br> into lines; a search cell reads "Searched for <a>query</a><br>timestamp<br>".
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.records = []
+        self._cell_depth = 0    # div nesting inside the current content cell; 0 when outside
+        self._lines = None
+        self._link = None
+        self._in_link = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "div":
+            if self._cell_depth:
+                self._cell_depth += 1
+            elif "content-cell" in (dict(attrs).get("class") or "").split():
+                self._cell_depth = 1
+                self._lines, self._link = [""], None
+        elif not self._cell_depth:
+            return
+        elif tag == "br":
+            self._lines.append("")
+        elif tag == "a" and self._link is None:
+            self._in_link, self._link = True, ""
+
+    def handle_endtag(self, tag):
+        if not self._cell_depth:
+            return
+        if tag == "a":
+            self._in_link = False
+        elif tag == "div":
+            self._cell_depth -= 1
+            if not self._cell_depth:
+                self._close_cell()
+
+    def handle_data(self, data):
+        if self._cell_depth:
+            self._lines[-1] += data
+            if self._in_link:
+                self._link += data
+
+    def _close_cell(self):
+        lines = [" ".join(line.split()) for line in self._lines]
+        lines = [line for line in lines if line]
+        query = " ".join((self._link or "").split())
+        if lines and query and lines[0].startswith(_SEARCH_PREFIX):
+            timestamp = lines[1] if len(lines) > 1 else None
+            self.records.append({"query": query, "timestamp": timestamp,
+                                 "searched_at": parse_timestamp(timestamp) if timestamp else None})
+        self._lines, self._link, self._in_link = None, None, False
+
+
+class SearchActivityReader:
+    """
+    Iterates over the searches in a 'My Activity' export without loading it: the file is read
+    in READ_CHUNK_BYTES pieces and fed to an incremental parser. Each record is a dict with
+    query, timestamp (as exported) and searched_at (a datetime, or None if unparseable).
+    bytes_read / total_bytes track progress while iterating.
+    """
+
+    def __init__(self, path: str, chunk_bytes: int = READ_CHUNK_BYTES):
+        self.path = path
+        self.chunk_bytes = chunk_bytes
+        self.total_bytes = os.path.getsize(path)
+        self.bytes_read = 0
+
+    def __iter__(self):
+        parser = _ActivityParser()
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        with open(self.path, "rb") as f:
+            while True:
+                chunk = f.read(self.chunk_bytes)
+                self.bytes_read += len(chunk)
+                parser.feed(decoder.decode(chunk, final=not chunk))
+                if not chunk:
+                    parser.close()
+                yield from parser.records
+                parser.records.clear()
+                if not chunk:
+                    return
@@ -0,0 +1,211 @@
+# File: core/app/vector_store.py
+# --- Purpose: Owns the ChromaDB client and routes each user's vectors to their own collection. ---
+
+import argparse
+import json
+import os
+import re
+import threading
+import time
+from . import subsystems
+from .cache import LRUCache, MISSING
+
+VECTOR_STORE_PATH = "./core/app/data/vector_store"
+
+# The original single collection that every user's vectors were written to, filtered by owner_id.
+LEGACY_COLLECTION_NAME = "kairos_notes"
+
+# 0 gives every user their own collection. A positive value hashes users onto that many
+# shared collections instead (still filtered by owner_id), for deployments with very many users.
+VECTOR_SHARDS = int(os.getenv("KAIROS_VECTOR_SHARDS", "0"))
+
+# Which generation of collections is live. A rebuild (see reindex.py) writes a new generation
+# alongside the old one and then atomically rewrites this file; running APIs pick the change
+# up within GENERATION_CHECK_SECONDS. Generation 0 is the original, unversioned naming.
+GENERATION_FILE = os.path.join(VECTOR_STORE_PATH, "generation.json")
+GENERATION_CHECK_SECONDS = 5.0
+
+
+def _open_chroma_client():
+    # Imported here so that chromadb (and its dependencies) load on first use, not at boot.
+    import chromadb
+    return chromadb.PersistentClient(path=VECTOR_STORE_PATH)
+
+
+# The ChromaDB client is opened on first use. It stores data in the 'vector_store' directory.
+_chroma = subsystems.register("vector_store", _open_chroma_client)
+
+
+def get_client():
+    """Returns the shared ChromaDB client, opening it on first call."""
+    return _chroma.get()
+
+
+class CollectionResolver:
+    """
+    Maps an owner to the ChromaDB collection holding their vectors, caching the handles
+    so hot users never pay for a get_or_create_collection round-trip.
+    """
+
+    def __init__(self, get_client, shards: int = VECTOR_SHARDS, prefix: str = LEGACY_COLLECTION_NAME,
+                 cache_size: int = 1024, generation: int = None):
+        self._get_client = get_client
+        self.shards = shards
+        self.prefix = prefix
+        self._handles = LRUCache(cache_size)
+        self._lock = threading.Lock()
+        # A fixed generation pins the resolver (used by rebuilds); None follows GENERATION_FILE.
+        self._pinned = generation is not None
+        self._generation = generation if self._pinned else read_generation()
+        self._checked_at = time.monotonic()
+
+    @property
+    def generation(self) -> int:
+        if not self._pinned and time.monotonic() - self._checked_at >= GENERATION_CHECK_SECONDS:
+            self._checked_at = time.monotonic()
+            live = read_generation()
+            if live != self._generation:
+                print(f"--- VECTOR STORE: Switching to collection generation {live}. ---")
+                self._generation = live
+                self._handles.clear()
+        return self._generation
+
+    def name_for(self, owner_id: int) -> str:
+        """Collection name for an owner: one per user, or one per shard when sharding is on."""
+        generation = self.generation
+        prefix = f"{self.prefix}_g{generation}" if generation else self.prefix
+        if self.shards > 0:
+            return f"{prefix}_s{owner_id % self.shards}"
+        return f"{prefix}_u{owner_id}"
+
+    def where_for(self, owner_id: int):
+        """Metadata filter a query still needs; only shared (sharded) collections need one."""
+        return {"owner_id": owner_id} if self.shards > 0 else None
+
+    def get(self, owner_id: int):
+        """Returns the collection for an owner, creating it on first use."""
+        name = self.name_for(owner_id)
+        collection = self._handles.get(name)
+        if collection is MISSING:
+            with self._lock:
+                collection = self._handles.get(name)
+                if collection is MISSING:
+                    collection = self._get_client().get_or_create_collection(name=name)
+                    self._handles.put(name, collection)
+        return collection
+
+    def forget(self, owner_id: int = None):
+        """Drops cached handles (all of them, or one owner's) after collections are replaced."""
+        if owner_id is None:
+            self._handles.clear()
+        else:
+            self._handles.pop(self.name_for(owner_id))
+
+
+def read_generation(path: str = GENERATION_FILE) -> int:
+    """Returns the live collection generation (0 if no rebuild has ever been swapped in)."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return int(json.load(f)["generation"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return 0
+
+
+def write_generation(generation: int, path: str = GENERATION_FILE, **details):
+    """Atomically points every resolver following `path` at another generation."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp = f"{path}.tmp"
+    with open(temp, "w", encoding="utf-8") as f:
+        json.dump({"generation": generation, **details}, f)
+    os.replace(temp, path)
+
+
+collections = CollectionResolver(get_client)
+
+
+def generation_collection_names(generation: int, client=None, prefix: str = LEGACY_COLLECTION_NAME) -> list:
+    """Names of the per-user and per-shard collections that make up one generation."""
+    client = client or get_client()
+    base = f"{prefix}_g{generation}" if generation else prefix
+    pattern = re.compile(rf"^{re.escape(base)}_[us]\d+$")
+    # chromadb returns names on newer versions and Collection objects on older ones.
+    names = [getattr(entry, "name", entry) for entry in client.list_collections()]
+    return sorted(name for name in names if pattern.match(name))
+
+
+def drop_generation(generation: int, client=None) -> int:
+    """Deletes every collection of a generation that is no longer live. Returns how many were dropped."""
+    if generation == read_generation():
+        raise ValueError(f"Generation {generation} is live and cannot be dropped.")
+    client = client or get_client()
+    names = generation_collection_names(generation, client)
+    for name in names:
+        client.delete_collection(name=name)
+    print(f"--- VECTOR STORE: Dropped {len(names)} collections of generation {generation}. ---")
+    return len(names)
+
+
+# --- Migration from the single global collection ---
+def migrate_legacy_collection(client=None, resolver: CollectionResolver = collections,
+                              batch_size: int = 1000, delete_source: bool = False) -> dict:
+    """
+    Copies every vector in the legacy global collection into its owner's collection, keeping
+    ids, embeddings, documents and metadata. Copying is an upsert, so the migration can be
+    re-run safely. Vectors without an owner_id are left behind and counted.
+    """
+    client = client or get_client()
+    try:
+        legacy = client.get_collection(name=LEGACY_COLLECTION_NAME)
+    except Exception:
+        print(f"--- VECTOR STORE: No '{LEGACY_COLLECTION_NAME}' collection to migrate. ---")
+        return {"migrated": 0, "skipped": 0, "owners": 0}
+
+    migrated = skipped = 0
+    owners = set()
+    offset = 0
+    while True:
+        page = legacy.get(include=["embeddings", "documents", "metadatas"], limit=batch_size, offset=offset)
+        ids = page["ids"]
+        if not ids:
+            break
+        offset += len(ids)
+
+        by_owner = {}
+        for i, vector_id in enumerate(ids):
+            metadata = page["metadatas"][i] or {}
+            owner_id = metadata.get("owner_id")
+            if owner_id is None:
+                skipped += 1
+                continue
+            batch = by_owner.setdefault(owner_id, {"ids": [], "embeddings": [], "documents": [], "metadatas": []})
+            batch["ids"].append(vector_id)
+            batch["embeddings"].append(page["embeddings"][i])
+            batch["documents"].append(page["documents"][i])
+            batch["metadatas"].append(metadata)
+
+        for owner_id, batch in by_owner.items():
+            resolver.get(owner_id).upsert(**batch)
+            migrated += len(batch["ids"])
+            owners.add(owner_id)
+        print(f"--- VECTOR STORE: Migrated {migrated} vectors for {len(owners)} users so far... ---")
+
+    if delete_source and not skipped:
+        client.delete_collection(name=LEGACY_COLLECTION_NAME)
+        print(f"--- VECTOR STORE: Deleted legacy collection '{LEGACY_COLLECTION_NAME}'. ---")
+    elif delete_source:
+        print(f"--- VECTOR STORE: Kept legacy collection: {skipped} vectors have no owner_id. ---")
+
+    return {"migrated": migrated, "skipped": skipped, "owners": len(owners)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Kairos vector store maintenance.")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    migrate = subcommands.add_parser("migrate", help="Split the legacy global collection into per-user collections.")
+    migrate.add_argument("--batch-size", type=int, default=1000)
+    migrate.add_argument("--delete-source", action="store_true",
+                         help="Delete the legacy collection once every vector has been copied.")
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        print(migrate_legacy_collection(batch_size=args.batch_size, delete_source=args.delete_source))
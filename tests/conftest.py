@@ -0,0 +1,141 @@
+# File: tests/conftest.py
+# --- Purpose: Shared fixtures: isolated SQLite databases, a stub embedder and an authenticated API client. ---
+
+import atexit
+import hashlib
+import math
+import os
+import re
+import shutil
+import sys
+import tempfile
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Keep the API from loading models and browsers in the background during tests.
+os.environ.setdefault("KAIROS_WARMUP", "0")
+# Importing core.app.main creates tables and replays the outbox on database.engine; point it at a
+# throwaway directory so the real core/data/kairos.db is never touched. Each test then gets its own file.
+if "KAIROS_DATA_DIR" not in os.environ:
+    os.environ["KAIROS_DATA_DIR"] = tempfile.mkdtemp(prefix="kairos-tests-")
+    atexit.register(shutil.rmtree, os.environ["KAIROS_DATA_DIR"], True)
+
+EMBEDDING_DIMENSIONS = 64
+
+
+def fake_embedding(text: str) -> list:
+    """A deterministic bag-of-words vector: texts sharing words are similar, unrelated ones are not."""
+    vector = [0.0] * EMBEDDING_DIMENSIONS
+    for word in re.findall(r"[a-z0-9]+", text.lower()):
+        vector[int(hashlib.md5(word.encode("utf-8")).hexdigest(), 16) % EMBEDDING_DIMENSIONS] += 1.0
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return [x / norm for x in vector]
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    from core.app import models, search
+    from core.app.database import _apply_sqlite_pragmas
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'kairos.db'}", connect_args={"check_same_thread": False})
+    event.listen(engine, "connect", _apply_sqlite_pragmas)
+    models.Base.metadata.create_all(bind=engine)
+    search.init_fts(engine)
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    factory.engine = engine
+    yield factory
+    engine.dispose()
+
+
+@pytest.fixture
+def user(session_factory):
+    from core.app import cache, crud, models, schemas
+
+    with session_factory() as db:
+        row = models.User(email="tester@example.com", hashed_password="x")
+        db.add(row)
+        db.commit()
+        # Every test database reuses user id 1; forget what earlier tests cached for it.
+        cache.invalidate_owner(row.id)
+        crud._project_ids.invalidate_owner(row.id)
+        return schemas.Principal(id=row.id, email=row.email)
+
+
+@pytest.fixture
+def vectors(monkeypatch, session_factory):
+    """
+    Replaces the embedding model and the vector store write. Passages written inline land in
+    `indexed` (or raise when `fail_inline` is set) and queued writes in `queued`. With the
+    `chroma` fixture they are also written to the in-memory store.
+    """
+    from core.app import crud
+
+    stub = SimpleNamespace(indexed=[], queued=[], fail_inline=False, store=None)
+    write_to_store = crud._index_note_batch
+
+    def index(passages):
+        if stub.fail_inline:
+            raise RuntimeError("vector store unavailable")
+        stub.indexed.extend(passages)
+        if stub.store is not None:
+            write_to_store(passages)
+
+    def submit(note_id, passages, **item):
+        stub.queued.append({"note_id": note_id, "passages": passages, **item})
+
+    monkeypatch.setattr(crud, "_index_note_batch", index)
+    monkeypatch.setattr(crud, "_encode", lambda texts: [fake_embedding(text) for text in texts])
+    monkeypatch.setattr(crud, "embed_texts", lambda texts: [fake_embedding(text) for text in texts])
+    monkeypatch.setattr(crud.embedding_queue, "submit", submit)
+    monkeypatch.setattr(crud, "SessionLocal", session_factory)
+    return stub
+
+
+@pytest.fixture
+def chroma(monkeypatch, vectors):
+    """An in-memory vector store behind crud and the retrieval tools; inline index writes land in it."""
+    from core.app import crud
+    from core.app.agents import tools
+    from core.app.vector_store import CollectionResolver
+    from tests.fake_chroma import FakeChroma
+
+    client = FakeChroma()
+    resolver = CollectionResolver(lambda: client, generation=0)
+    monkeypatch.setattr(crud, "collections", resolver)
+    monkeypatch.setattr(tools, "collections", resolver)
+    vectors.store = resolver
+    return client
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path, session_factory, user, vectors):
+    """TestClient logged in as `user`, with every session on the test database and no model or vector store."""
+    from fastapi.testclient import TestClient
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+    from core.app import database, dependencies, main
+    from core.app.database import _apply_sqlite_pragmas
+
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'kairos.db'}")
+    event.listen(async_engine.sync_engine, "connect", _apply_sqlite_pragmas)
+    async_sessions = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+    def get_db():
+        with session_factory() as db:
+            yield db
+
+    async def get_async_db():
+        async with async_sessions() as db:
+            yield db
+
+    monkeypatch.setattr(main, "SessionLocal", session_factory)
+    main.app.dependency_overrides[database.get_db] = get_db
+    main.app.dependency_overrides[database.get_async_db] = get_async_db
+    main.app.dependency_overrides[dependencies.get_current_principal] = lambda: user
+    main.app.dependency_overrides[dependencies.get_current_principal_async] = lambda: user
+    yield TestClient(main.app)
+    main.app.dependency_overrides.clear()
+    async_engine.sync_engine.dispose()
@@ -0,0 +1,88 @@
+# File: tests/fake_chroma.py
+# --- Purpose: An in-memory stand-in for the parts of the ChromaDB client the app uses. ---
+
+import math
+
+
+def _matches(metadata: dict, where) -> bool:
+    if not where:
+        return True
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(_matches(metadata, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            if "$in" in condition and metadata.get(key) not in condition["$in"]:
+                return False
+            if "$eq" in condition and metadata.get(key) != condition["$eq"]:
+                return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+def _cosine_distance(a, b) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return 1.0 - (dot / norm if norm else 0.0)
+
+
+class FakeCollection:
+    def __init__(self, name: str):
+        self.name = name
+        self.records = {}  # id -> (embedding, document, metadata), in insertion order
+
+    def upsert(self, ids, embeddings, documents=None, metadatas=None):
+        for i, record_id in enumerate(ids):
+            self.records[record_id] = (list(embeddings[i]), (documents or [None] * len(ids))[i],
+                                       dict((metadatas or [{}] * len(ids))[i] or {}))
+
+    add = upsert
+
+    def count(self) -> int:
+        return len(self.records)
+
+    def get(self, ids=None, where=None, include=None, limit=None, offset=0):
+        selected = [(record_id, record) for record_id, record in self.records.items()
+                    if (ids is None or record_id in ids) and _matches(record[2], where)]
+        selected = selected[offset:offset + limit if limit is not None else None]
+        return {"ids": [record_id for record_id, _ in selected],
+                "documents": [record[1] for _, record in selected],
+                "metadatas": [record[2] for _, record in selected]}
+
+    def delete(self, ids=None, where=None):
+        for record_id, record in list(self.records.items()):
+            if (ids is None or record_id in ids) and (where is None or _matches(record[2], where)):
+                if ids is not None or where is not None:
+                    del self.records[record_id]
+
+    def query(self, query_embeddings, n_results=10, where=None, include=None):
+        results = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        for embedding in query_embeddings:
+            ranked = sorted(((_cosine_distance(embedding, record[0]), record_id, record)
+                             for record_id, record in self.records.items() if _matches(record[2], where)),
+                            key=lambda hit: hit[0])[:n_results]
+            results["ids"].append([record_id for _, record_id, _ in ranked])
+            results["documents"].append([record[1] for _, _, record in ranked])
+            results["metadatas"].append([record[2] for _, _, record in ranked])
+            results["distances"].append([distance for distance, _, _ in ranked])
+        return results
+
+
+class FakeChroma:
+    def __init__(self):
+        self.collections = {}
+
+    def get_or_create_collection(self, name: str):
+        return self.collections.setdefault(name, FakeCollection(name))
+
+    def get_collection(self, name: str):
+        if name not in self.collections:
+            raise ValueError(f"Collection {name} does not exist.")
+        return self.collections[name]
+
+    def delete_collection(self, name: str):
+        del self.collections[name]
+
+    def list_collections(self):
+        return list(self.collections)
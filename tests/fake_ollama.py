@@ -0,0 +1,219 @@
+# File: tests/fake_ollama.py
+# --- Purpose: A stand-in Ollama server that simulates model load and eviction costs. ---
+#
+#   python tests/fake_ollama.py [--port 11435] [--max-loaded 1] [--load-seconds 3]
+#                               [--unload-seconds 0.5] [--reply-seconds 0.2]
+#
+# Used by the scheduler tests through serve(); run directly and point the API at it with
+# KAIROS_OLLAMA_URL=http://localhost:11435 to watch /chat/ against slow model swaps. It
+# implements the parts of the Ollama API the agents use: /api/ps, /api/generate (load/unload),
+# /api/tags and the OpenAI-compatible /v1/chat/completions, which echoes the last user message
+# (streamed as server-sent events when the request asks for it). GET /fake/stats reports how
+# many loads and evictions the traffic has caused.
+
+import argparse
+import json
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_KEEP_ALIVE = 300.0
+
+
+def parse_keep_alive(value) -> float:
+    """Ollama durations: seconds as a number, or strings like "30m", "1h", "90s". Negative means forever."""
+    if value is None:
+        return DEFAULT_KEEP_ALIVE
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = re.fullmatch(r"\s*(-?\d+(?:\.\d+)?)\s*(ms|s|m|h)?\s*", str(value))
+    if not match:
+        return DEFAULT_KEEP_ALIVE
+    scale = {"ms": 0.001, "s": 1, "m": 60, "h": 3600, None: 1}[match.group(2)]
+    return float(match.group(1)) * scale
+
+
+class FakeOllama:
+    """Loaded models in LRU order; loading one past max_loaded evicts the least recently used."""
+
+    def __init__(self, max_loaded: int = 1, load_seconds: float = 3.0, unload_seconds: float = 0.5,
+                 reply_seconds: float = 0.2):
+        self.max_loaded = max_loaded
+        self.load_seconds = load_seconds
+        self.unload_seconds = unload_seconds
+        self.reply_seconds = reply_seconds
+        self._loaded = OrderedDict()  # model -> expiry (monotonic seconds, None for never)
+        self._lock = threading.Lock()
+        # Like Ollama, only one model loads at a time.
+        self._load_lock = threading.Lock()
+        self.stats = {"loads": 0, "evictions": 0, "unloads": 0, "completions": 0, "load_seconds": 0.0}
+
+    def _expire(self):
+        now = time.monotonic()
+        for model, expiry in list(self._loaded.items()):
+            if expiry is not None and expiry <= now:
+                del self._loaded[model]
+
+    @staticmethod
+    def _expiry(keep_alive: float):
+        return None if keep_alive < 0 else time.monotonic() + keep_alive
+
+    def ensure_loaded(self, model: str, keep_alive: float):
+        with self._load_lock:
+            with self._lock:
+                self._expire()
+                if model in self._loaded:
+                    self._loaded[model] = self._expiry(keep_alive)
+                    self._loaded.move_to_end(model)
+                    return
+                evicted = []
+                while len(self._loaded) >= self.max_loaded:
+                    evicted.append(self._loaded.popitem(last=False)[0])
+                self.stats["evictions"] += len(evicted)
+            time.sleep(self.unload_seconds * len(evicted) + self.load_seconds)
+            with self._lock:
+                self._loaded[model] = self._expiry(keep_alive)
+                self.stats["loads"] += 1
+                self.stats["load_seconds"] += self.load_seconds
+
+    def unload(self, model: str):
+        with self._lock:
+            if self._loaded.pop(model, "missing") != "missing":
+                self.stats["unloads"] += 1
+        time.sleep(self.unload_seconds)
+
+    def ps(self) -> list:
+        with self._lock:
+            self._expire()
+            now = time.monotonic()
+            models = []
+            for model, expiry in self._loaded.items():
+                remaining = timedelta(days=3650) if expiry is None else timedelta(seconds=expiry - now)
+                name = model if ":" in model else f"{model}:latest"
+                models.append({"name": name, "model": name, "size": 0,
+                               "expires_at": (datetime.now(timezone.utc) + remaining).isoformat()})
+            return models
+
+    def reply_text(self, model: str, messages: list) -> str:
+        self.ensure_loaded(model, DEFAULT_KEEP_ALIVE)
+        time.sleep(self.reply_seconds)
+        with self._lock:
+            self.stats["completions"] += 1
+        last = next((m.get("content") for m in reversed(messages) if m.get("role") == "user"), "") or ""
+        return f"[{model}] {last}" if isinstance(last, str) else f"[{model}]"
+
+    def complete(self, model: str, messages: list) -> dict:
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}", "object": "chat.completion", "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": self.reply_text(model, messages)}}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        }
+
+    def complete_chunks(self, model: str, messages: list) -> list:
+        """The same reply as OpenAI stream chunks, one per word, ending with a finish_reason."""
+        completion_id, created = f"chatcmpl-{uuid.uuid4().hex[:12]}", int(time.time())
+        words = self.reply_text(model, messages).split(" ")
+        deltas = [{"role": "assistant", "content": words[0]}] + [{"content": " " + word} for word in words[1:]]
+        chunks = [{"index": 0, "delta": delta, "finish_reason": None} for delta in deltas]
+        chunks.append({"index": 0, "delta": {}, "finish_reason": "stop"})
+        return [{"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                 "choices": [choice]} for choice in chunks]
+
+
+def _handler(ollama: FakeOllama):
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, payload, status: int = 200):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _stream(self, chunks: list):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            for chunk in chunks:
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.close_connection = True
+
+        def _body(self) -> dict:
+            length = int(self.headers.get("Content-Length") or 0)
+            return json.loads(self.rfile.read(length) or b"{}")
+
+        def do_GET(self):
+            if self.path == "/api/ps":
+                self._reply({"models": ollama.ps()})
+            elif self.path == "/api/tags":
+                self._reply({"models": ollama.ps()})
+            elif self.path == "/fake/stats":
+                with ollama._lock:
+                    self._reply({**ollama.stats, "loaded": list(ollama._loaded)})
+            else:
+                self._reply({"error": "not found"}, 404)
+
+        def do_POST(self):
+            try:
+                body = self._body()
+            except ValueError:
+                return self._reply({"error": "invalid JSON"}, 400)
+            model = body.get("model")
+            if not model:
+                return self._reply({"error": "model is required"}, 400)
+            if self.path == "/api/generate":
+                keep_alive = parse_keep_alive(body.get("keep_alive"))
+                if keep_alive == 0:
+                    ollama.unload(model)
+                    return self._reply({"model": model, "response": "", "done": True, "done_reason": "unload"})
+                ollama.ensure_loaded(model, keep_alive)
+                self._reply({"model": model, "response": "", "done": True, "done_reason": "load"})
+            elif self.path == "/v1/chat/completions" and body.get("stream"):
+                self._stream(ollama.complete_chunks(model, body.get("messages") or []))
+            elif self.path == "/v1/chat/completions":
+                self._reply(ollama.complete(model, body.get("messages") or []))
+            else:
+                self._reply({"error": "not found"}, 404)
+
+        def log_message(self, format, *args):
+            pass  # Keep pytest output readable.
+
+    return Handler
+
+
+def serve(port: int = 11435, **options):
+    """
+    Starts a fake server on a background thread; returns (server, FakeOllama). Port 0 picks a
+    free port (see server.server_address). Stop with server.shutdown().
+    """
+    ollama = FakeOllama(**options)
+    server = ThreadingHTTPServer(("127.0.0.1", port), _handler(ollama))
+    threading.Thread(target=server.serve_forever, daemon=True, name="fake-ollama").start()
+    return server, ollama
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Ollama server that simulates model swapping costs.")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--max-loaded", type=int, default=1, help="Models that fit in memory at once.")
+    parser.add_argument("--load-seconds", type=float, default=3.0, help="Time to load a model.")
+    parser.add_argument("--unload-seconds", type=float, default=0.5, help="Time to evict a model.")
+    parser.add_argument("--reply-seconds", type=float, default=0.2, help="Time to produce a completion.")
+    args = parser.parse_args()
+
+    server, _ = serve(args.port, max_loaded=args.max_loaded, load_seconds=args.load_seconds,
+                      unload_seconds=args.unload_seconds, reply_seconds=args.reply_seconds)
+    print(f"--- FAKE OLLAMA: Listening on http://127.0.0.1:{args.port} ---")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,57 @@
+# File: tests/test_assimilate.py
+# --- Purpose: assimilate_urls gives up cleanly when its crawl dies or the browser pool stops. ---
+
+from concurrent.futures import Future
+
+import pytest
+
+from core.app.agents import tools
+
+
+class _Pool:
+    """Stands in for the browser pool: never runs the crawl, hands back a prepared future."""
+
+    def __init__(self, future: Future, running: bool = True):
+        self.future = future
+        self.running = running
+
+    def submit(self, coro):
+        coro.close()
+        return self.future
+
+
+@pytest.fixture(autouse=True)
+def fast_poll(monkeypatch):
+    monkeypatch.setattr(tools, "ASSIMILATE_POLL_SECONDS", 0.01)
+
+
+def _urls():
+    return ["https://example.com/a", "https://example.org/b", "not a url"]
+
+
+def test_crawl_failure_is_raised(monkeypatch):
+    crawl = Future()
+    crawl.set_exception(RuntimeError("loop died"))
+    monkeypatch.setattr(tools, "browser_pool", _Pool(crawl))
+
+    results = tools.assimilate_urls(_urls(), db=None, user_id=1)
+    assert next(results)["status"] == "invalid"
+    with pytest.raises(RuntimeError, match="loop died"):
+        next(results)
+
+
+def test_cancelled_crawl_fails_remaining_jobs(monkeypatch):
+    crawl = Future()
+    crawl.cancel()
+    monkeypatch.setattr(tools, "browser_pool", _Pool(crawl))
+
+    results = list(tools.assimilate_urls(_urls(), db=None, user_id=1))
+    assert [(result["index"], result["status"]) for result in results] == [(2, "invalid"), (0, "failed"), (1, "failed")]
+
+
+def test_stopped_pool_fails_remaining_jobs(monkeypatch):
+    monkeypatch.setattr(tools, "browser_pool", _Pool(Future(), running=False))
+
+    results = [result for result in tools.assimilate_urls(_urls(), db=None, user_id=1) if result["status"] == "failed"]
+    assert [result["index"] for result in results] == [0, 1]
+    assert "browser pool stopped" in results[0]["error"]
@@ -0,0 +1,82 @@
+# File: tests/test_bulk_notes.py
+# --- Purpose: POST /notes/bulk must read its body and stream results for both payload formats. ---
+
+import asyncio
+import json
+
+from sqlalchemy.exc import OperationalError
+
+from core.app import crud, ingest, models
+
+
+def _results(response):
+    return [json.loads(line) for line in response.text.splitlines() if line.strip()]
+
+
+def test_bulk_ndjson(client, session_factory, vectors):
+    body = "\n".join(json.dumps({"title": f"Note {i}", "content": f"Body {i}"}) for i in range(3))
+    response = client.post("/notes/bulk", content=body, headers={"Content-Type": "application/x-ndjson"})
+
+    assert response.status_code == 200
+    results = _results(response)
+    assert [r["index"] for r in results] == [0, 1, 2]
+    assert all(r["status"] == "created" and r["index_status"] == "indexed" for r in results)
+    assert sorted(passage["metadata"]["note_id"] for passage in vectors.indexed) == [r["id"] for r in results]
+    assert vectors.queued == []
+    with session_factory() as db:
+        assert db.query(models.Note).count() == 3
+        assert db.query(models.VectorOutbox).count() == 0
+
+
+def test_bulk_json_array(client, session_factory):
+    items = [{"title": "First", "content": "One"}, {"content": "No title"}, {"title": "Third", "content": "Three"}]
+    response = client.post("/notes/bulk", json=items)
+
+    assert response.status_code == 200
+    results = {r["index"]: r for r in _results(response)}
+    assert results[0]["status"] == "created"
+    assert results[1]["status"] == "error"
+    assert results[2]["status"] == "created"
+    with session_factory() as db:
+        assert sorted(note.title for note in db.query(models.Note)) == ["First", "Third"]
+
+
+def test_failed_inline_indexing_goes_to_the_outbox(client, session_factory, vectors):
+    vectors.fail_inline = True
+    response = client.post("/notes/bulk", json=[{"title": "A", "content": "alpha"}, {"title": "B", "content": "beta"}])
+
+    results = _results(response)
+    assert [r["index_status"] for r in results] == ["pending", "pending"]
+    assert [item["note_id"] for item in vectors.queued] == [r["id"] for r in results]
+    with session_factory() as db:
+        outbox = {entry.id: entry.note_id for entry in db.query(models.VectorOutbox)}
+    # Each queued write carries its outbox row, which stays until the queue applies it.
+    assert {item["outbox_id"]: item["note_id"] for item in vectors.queued} == outbox
+
+
+def test_failed_chunk_is_reported_and_later_chunks_still_run(session_factory, user, vectors, monkeypatch):
+    write = crud.create_user_notes_bulk
+    calls = []
+
+    def flaky(db, notes, user_id):
+        calls.append(len(notes))
+        if len(calls) == 1:
+            db.add(models.Note(title="half-written", owner_id=user_id))
+            db.flush()
+            raise OperationalError("INSERT", {}, Exception("database is locked"))
+        return write(db, notes, user_id)
+
+    async def body():
+        yield "\n".join(json.dumps({"title": f"Note {i}", "content": "x"}) for i in range(4)).encode("utf-8")
+
+    async def run(db):
+        return [result async for result in ingest.ingest_notes(body(), True, db, user.id, chunk_size=2)]
+
+    monkeypatch.setattr(crud, "create_user_notes_bulk", flaky)
+    with session_factory() as db:
+        results = asyncio.run(run(db))
+
+    assert [(r["index"], r["status"]) for r in results] == [(0, "error"), (1, "error"), (2, "created"), (3, "created")]
+    assert "database is locked" in results[0]["detail"]
+    with session_factory() as db:
+        assert sorted(note.title for note in db.query(models.Note)) == ["Note 2", "Note 3"]
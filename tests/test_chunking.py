@@ -0,0 +1,58 @@
+# File: tests/test_chunking.py
+# --- Purpose: Notes are split into overlapping passages that cover the whole text. ---
+
+import pytest
+
+from core.app import chunking, crud
+
+
+def test_short_text_is_one_passage():
+    assert chunking.chunk_text("short note", size=100, overlap=10) == [(0, 10)]
+    assert chunking.chunk_text("", size=100, overlap=10) == [(0, 0)]
+    assert chunking.chunk_text(None, size=100, overlap=10) == [(0, 0)]
+
+
+def test_passages_cover_the_text_with_overlap():
+    text = " ".join(f"word{i}" for i in range(400))
+    spans = chunking.chunk_text(text, size=200, overlap=40)
+
+    assert spans[0][0] == 0 and spans[-1][1] == len(text)
+    for (start, end), (next_start, _) in zip(spans, spans[1:]):
+        assert end - start <= 200
+        assert next_start < end  # consecutive passages overlap, so no text falls between them
+        assert next_start > start
+
+
+def test_passages_end_on_the_best_boundary_in_the_last_quarter():
+    paragraph = "First sentence here. " * 8  # 168 characters
+    text = paragraph + "\n\n" + "x" * 300
+    start, end = chunking.chunk_text(text, size=200, overlap=20)[0]
+    assert text[start:end].endswith("\n\n")
+
+    # A sentence break is used when no paragraph break falls late enough.
+    text = "a" * 160 + ". " + "b" * 300
+    assert chunking.chunk_text(text, size=200, overlap=20)[0] == (0, 162)
+
+
+def test_text_without_breaks_is_cut_at_the_window():
+    text = "x" * 450
+    assert chunking.chunk_text(text, size=200, overlap=50) == [(0, 200), (150, 350), (300, 450)]
+
+
+@pytest.mark.parametrize("size, overlap", [(0, 0), (100, 100), (100, -1)])
+def test_invalid_settings_are_rejected(size, overlap):
+    with pytest.raises(ValueError):
+        chunking.chunk_text("text", size=size, overlap=overlap)
+
+
+def test_note_passages_carry_offsets_and_title():
+    content = "para one. " * 300
+    passages = crud._note_passages(7, 3, "Title", content)
+
+    assert len(passages) > 1
+    assert [p["id"] for p in passages] == [f"note_7_p{i}" for i in range(len(passages))]
+    for passage in passages:
+        meta = passage["metadata"]
+        assert passage["document"] == content[meta["start"]:meta["end"]]
+        assert passage["text"].startswith("Title: Title\nContent: ")
+        assert (meta["note_id"], meta["owner_id"]) == (7, 3)
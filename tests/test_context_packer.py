@@ -0,0 +1,85 @@
+# File: tests/test_context_packer.py
+# --- Purpose: Agent prompts are packed into the model's token budget without touching the stored history. ---
+
+import copy
+from types import SimpleNamespace
+
+from core.app.agents import context_packer
+from core.app.agents.context_packer import RETRIEVAL_SEPARATOR, ContextPacker
+
+
+def _agent():
+    return SimpleNamespace(name="ResearchAgent", system_message="You research the user's notes.",
+                           llm_config={"tools": [{"type": "function", "function": {"name": "retrieve_context"}}]})
+
+
+def _turn(i, sentences=30):
+    return {"role": "user" if i % 2 == 0 else "assistant", "name": f"Agent{i % 3}",
+            "content": " ".join(f"Turn {i} makes point {j} about the garden plan." for j in range(sentences))}
+
+
+def _prompt_tokens(packer, messages):
+    return packer._overhead() + sum(context_packer._message_tokens(message) for message in messages)
+
+
+def test_history_within_budget_is_sent_as_is():
+    messages = [_turn(i, sentences=2) for i in range(5)]
+    assert ContextPacker(_agent(), "m", budget=4000)(messages) is messages
+
+
+def test_older_turns_are_summarized_between_the_request_and_recent_turns():
+    messages = [_turn(i) for i in range(10)]
+    original = copy.deepcopy(messages)
+    packer = ContextPacker(_agent(), "m", budget=2500)
+    packed = packer(messages)
+
+    assert packed[0] == messages[0]
+    assert packed[1]["name"] == "ContextSummary"
+    assert packed[1]["content"].count("\n- ") == 10 - 1 - context_packer.KEEP_RECENT_MESSAGES
+    assert packed[2:] == messages[-context_packer.KEEP_RECENT_MESSAGES:]
+    assert _prompt_tokens(packer, packed) <= 2500
+    assert messages == original
+
+
+def test_a_tool_call_is_never_separated_from_its_result():
+    messages = [_turn(i) for i in range(10)]
+    messages[5] = {"role": "assistant", "name": "ResearchAgent", "content": None,
+                   "tool_calls": [{"id": "1", "function": {"name": "retrieve_context", "arguments": "{}"}}]}
+    messages[6] = {"role": "tool", "name": "ToolExecutor", "content": "Sourdough needs feeding.",
+                   "tool_responses": [{"tool_call_id": "1", "role": "tool", "content": "Sourdough needs feeding."}]}
+    packed = ContextPacker(_agent(), "m", budget=2000)(messages)
+
+    assert packed[2:] == messages[5:]
+
+
+def test_retrieved_context_is_trimmed_lowest_ranked_notes_first():
+    notes = [f"Note {rank}: " + "relevant detail " * 60 for rank in range(6)]
+    result = RETRIEVAL_SEPARATOR.join(notes)
+    messages = [{"role": "user", "content": "What do my notes say?"},
+                {"role": "tool", "content": result, "tool_responses": [{"role": "tool", "content": result}]},
+                {"role": "assistant", "content": "Let me summarize."}]
+    original = copy.deepcopy(messages)
+    packer = ContextPacker(_agent(), "m", budget=800)
+    packed = packer(messages)
+
+    kept = packed[1]["content"].split(RETRIEVAL_SEPARATOR)
+    assert kept[0] == notes[0] and len(kept) < len(notes)
+    assert packed[1]["tool_responses"][0]["content"] == packed[1]["content"]
+    assert _prompt_tokens(packer, packed) <= 800
+    assert messages == original
+
+
+def test_trim_retrieval_keeps_whole_notes_from_the_top():
+    notes = ["a" * 400, "b" * 400, "c" * 400]  # 100 tokens each
+    text = RETRIEVAL_SEPARATOR.join(notes)
+    assert context_packer.trim_retrieval(text, 1000) == text
+    assert context_packer.trim_retrieval(text, 210) == RETRIEVAL_SEPARATOR.join(notes[:2])
+    # Enough room left for part of the next note: it is truncated rather than dropped.
+    trimmed = context_packer.trim_retrieval(text, 150).split(RETRIEVAL_SEPARATOR)
+    assert trimmed[0] == notes[0] and trimmed[1].startswith("b") and trimmed[1].endswith(" [...]")
+
+
+def test_truncate_to_tokens_cuts_at_a_word_boundary():
+    text = "alpha beta gamma delta epsilon"
+    assert context_packer.truncate_to_tokens(text, 100) == text
+    assert context_packer.truncate_to_tokens(text, 4) == "alpha beta [...]"
@@ -0,0 +1,54 @@
+# File: tests/test_embedding_cache.py
+# --- Purpose: Two cache instances on the same files (as the API and a reindex run) see each other's rows. ---
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from core.app.embedding_cache import EmbeddingCache  # noqa: E402
+
+
+def _encoder(calls):
+    def encode(texts):
+        calls.extend(texts)
+        return [[float(len(text)), float(i)] for i, text in enumerate(texts)]
+    return encode
+
+
+def test_rows_written_by_one_instance_are_found_by_the_other(tmp_path):
+    api, worker = EmbeddingCache("m", path=str(tmp_path), capacity=8), EmbeddingCache("m", path=str(tmp_path), capacity=8)
+    calls = []
+    assert api.encode(["alpha"], _encoder(calls)) == [[5.0, 0.0]]
+    # The worker opened nothing yet; then the API stores more after the worker has opened the files.
+    worker.encode(["beta"], _encoder(calls))
+    api.encode(["gamma"], _encoder(calls))
+    calls.clear()
+
+    assert worker.encode(["alpha", "gamma", "beta"], _encoder(calls)) == [[5.0, 0.0], [5.0, 0.0], [4.0, 0.0]]
+    assert calls == []
+
+
+def test_instances_share_the_write_cursor(tmp_path):
+    first, second = EmbeddingCache("m", path=str(tmp_path), capacity=4), EmbeddingCache("m", path=str(tmp_path), capacity=4)
+    first.encode(["a1", "a2"], _encoder([]))
+    second.encode(["b1", "b2"], _encoder([]))
+    # Both appended to the same ring instead of overwriting rows 0 and 1 in turn.
+    calls = []
+    first.encode(["a1", "a2", "b1", "b2"], _encoder(calls))
+    second.encode(["a1", "a2", "b1", "b2"], _encoder(calls))
+    assert calls == []
+
+    # A full ring evicts the oldest row for everyone.
+    second.encode(["c1"], _encoder([]))
+    first.encode(["a1"], _encoder(calls))
+    assert calls == ["a1"]
+
+
+def test_rows_survive_a_reopen(tmp_path):
+    cache = EmbeddingCache("m", path=str(tmp_path), capacity=8)
+    cache.encode(["kept"], _encoder([]))
+    cache.flush()
+
+    calls = []
+    assert EmbeddingCache("m", path=str(tmp_path), capacity=8).encode(["kept"], _encoder(calls)) == [[4.0, 0.0]]
+    assert calls == []
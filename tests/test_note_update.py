@@ -0,0 +1,17 @@
+# File: tests/test_note_update.py
+# --- Purpose: PATCH /notes/{id} validation. ---
+
+import pytest
+from pydantic import ValidationError
+
+from core.app import schemas
+
+
+def test_null_title_is_rejected():
+    with pytest.raises(ValidationError):
+        schemas.NoteUpdate.model_validate({"title": None})
+
+
+def test_omitted_title_is_left_unset():
+    update = schemas.NoteUpdate.model_validate({"content": None})
+    assert update.model_dump(exclude_unset=True) == {"content": None}
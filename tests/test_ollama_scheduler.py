@@ -0,0 +1,160 @@
+# File: tests/test_ollama_scheduler.py
+# --- Purpose: ModelScheduler admission, starvation, eviction and preloading against a fake Ollama. ---
+
+import json
+import threading
+import time
+
+import pytest
+import requests
+
+from core.app.agents.ollama_scheduler import ModelScheduler
+from tests.fake_ollama import serve
+
+
+@pytest.fixture
+def ollama():
+    server, fake = serve(0, max_loaded=2, load_seconds=0.05, unload_seconds=0, reply_seconds=0)
+    fake.url = f"http://127.0.0.1:{server.server_address[1]}"
+    yield fake
+    server.shutdown()
+    server.server_close()
+
+
+def _scheduler(ollama, **options) -> ModelScheduler:
+    ollama.max_loaded = options.get("max_resident", 1)
+    return ModelScheduler(base_url=ollama.url, keep_alive="30m", **options)
+
+
+def _call(scheduler, model, log, label=None, release=None):
+    """One scheduled "completion": records when it ran, optionally holding the slot until `release` is set."""
+    with scheduler.slot(model):
+        log.append(label or model)
+        if release is not None:
+            release.wait(timeout=10)
+
+
+def _start(*args, **kwargs) -> threading.Thread:
+    thread = threading.Thread(target=_call, args=args, kwargs=kwargs, daemon=True)
+    thread.start()
+    return thread
+
+
+def _join(*threads):
+    for thread in threads:
+        thread.join(timeout=10)
+        assert not thread.is_alive()
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.02)
+
+
+def test_resident_model_runs_at_once_and_queued_calls_share_one_load(ollama):
+    scheduler = _scheduler(ollama, max_resident=1, max_wait=30)
+    log, release = [], threading.Event()
+    _call(scheduler, "a", log)
+    holder = _start(scheduler, "a", log, release=release)
+    _wait_for(lambda: len(log) == 2)
+    assert scheduler.snapshot()["immediate"] == 2  # "a" stayed resident for the second call
+
+    # While "a" is busy: one call for "c", then two for "b". "b" has more calls queued, so it goes first.
+    waiters = [_start(scheduler, "c", log)]
+    _wait_for(lambda: scheduler.snapshot()["queued_now"].get("c") == 1)
+    waiters += [_start(scheduler, "b", log) for _ in range(2)]
+    _wait_for(lambda: scheduler.snapshot()["queued_now"].get("b") == 2)
+    assert log == ["a", "a"]
+
+    release.set()
+    _join(holder, *waiters)
+    assert log == ["a", "a", "b", "b", "c"]
+    assert ollama.stats["loads"] == 3  # a, b and c once each
+    assert scheduler.snapshot()["queued"] == 3
+
+
+def test_overdue_call_drains_the_resident_batch(ollama):
+    scheduler = _scheduler(ollama, max_resident=1, max_wait=0.3)
+    log, release = [], threading.Event()
+    holder = _start(scheduler, "a", log, release=release)
+    _wait_for(lambda: log == ["a"])
+    waiter = _start(scheduler, "b", log)
+    time.sleep(0.5)  # "b" is now past max_wait
+
+    # A new call for the resident model no longer jumps the queue.
+    late = _start(scheduler, "a", log, label="a-late")
+    time.sleep(0.3)
+    assert log == ["a"]
+
+    release.set()
+    _join(holder, waiter, late)
+    assert log == ["a", "b", "a-late"]
+
+
+def test_evicts_least_recently_used_idle_model(ollama):
+    scheduler = _scheduler(ollama, max_resident=2, max_wait=30)
+    log = []
+    for model in ("a", "b", "a", "c"):
+        _call(scheduler, model, log)
+    assert sorted(scheduler.snapshot()["resident"]) == ["a", "c"]
+    assert sorted(entry["name"] for entry in ollama.ps()) == ["a:latest", "c:latest"]
+    assert ollama.stats["unloads"] == 1
+
+
+def test_never_evicts_a_model_with_calls_in_flight(ollama):
+    scheduler = _scheduler(ollama, max_resident=2, max_wait=30)
+    log, release = [], threading.Event()
+    _call(scheduler, "a", log)
+    _call(scheduler, "b", log)
+    # "a" is the least recently used, but it is busy, so "b" has to make way for "c".
+    holder = _start(scheduler, "a", log, label="a-busy", release=release)
+    _wait_for(lambda: "a-busy" in log)
+    _call(scheduler, "c", log)
+    assert sorted(scheduler.snapshot()["resident"]) == ["a", "c"]
+
+    release.set()
+    _join(holder)
+
+
+def test_preloads_the_model_that_usually_comes_next(ollama):
+    scheduler = _scheduler(ollama, max_resident=1, max_wait=30)
+    log = []
+    scheduler.new_conversation()
+    for _ in range(3):
+        _call(scheduler, "a", log)
+        _call(scheduler, "b", log)
+    assert scheduler.snapshot()["preloads"] == 0
+
+    # "b" has followed "a" every time, so once the server is idle after "a" it is loaded ahead of time.
+    _call(scheduler, "a", log)
+    _wait_for(lambda: scheduler.snapshot()["resident"] == ["b"])
+    assert scheduler.snapshot()["preloads"] == 1
+    loads = ollama.stats["loads"]
+    _call(scheduler, "b", log)
+    assert ollama.stats["loads"] == loads
+
+
+def test_transitions_are_not_counted_across_conversations(ollama):
+    scheduler = _scheduler(ollama, max_resident=1, max_wait=30)
+    log = []
+    # Every conversation makes a single call, so "b" never follows "a" within one.
+    for model in ("a", "b") * 4:
+        scheduler.new_conversation()
+        _call(scheduler, model, log)
+    time.sleep(0.2)
+    assert scheduler.snapshot()["preloads"] == 0
+    assert ollama.stats["loads"] == 8
+
+
+def test_fake_server_streams_chat_completions(ollama):
+    response = requests.post(f"{ollama.url}/v1/chat/completions", timeout=5, json={
+        "model": "a", "stream": True, "messages": [{"role": "user", "content": "hello there"}]})
+    assert response.headers["Content-Type"] == "text/event-stream"
+    events = [line[len("data: "):] for line in response.text.splitlines() if line.startswith("data: ")]
+    assert events[-1] == "[DONE]"
+    chunks = [json.loads(event) for event in events[:-1]]
+    assert {chunk["object"] for chunk in chunks} == {"chat.completion.chunk"}
+    assert "".join(chunk["choices"][0]["delta"].get("content", "") for chunk in chunks) == "[a] hello there"
+    assert chunks[-1]["choices"][0]["finish_reason"] == "stop"
@@ -0,0 +1,66 @@
+# File: tests/test_projects.py
+# --- Purpose: Project lookup by normalized name, near-miss suggestions and duplicate handling. ---
+
+from core.app import crud, models, schemas
+from core.app.agents import tools
+
+
+def _create(db, user, name):
+    return crud.create_user_project(db, schemas.ProjectCreate(name=name), user.id)
+
+
+def test_lookup_ignores_case_and_whitespace(session_factory, user):
+    with session_factory() as db:
+        project = _create(db, user, "Garden  Plans")
+        assert crud.get_project_id_by_name(db, user.id, "  garden plans ") == project.id
+        assert crud.get_project_id_by_name(db, user.id, "garden") is None
+
+
+def test_cached_miss_is_cleared_by_create(session_factory, user):
+    with session_factory() as db:
+        assert crud.get_project_id_by_name(db, user.id, "Taxes") is None
+        project = _create(db, user, "Taxes")
+        assert crud.get_project_id_by_name(db, user.id, "taxes") == project.id
+
+
+def test_duplicate_name_returns_existing_project(session_factory, user):
+    with session_factory() as db:
+        first = _create(db, user, "Reading List")
+        project, created = crud.get_or_create_user_project(db, schemas.ProjectCreate(name="reading list"), user.id)
+        assert (project.id, created) == (first.id, False)
+        assert db.query(models.Project).count() == 1
+
+
+def test_tool_reports_project_created_by_another_chat(session_factory, user):
+    with session_factory() as db, session_factory() as other:
+        # This chat caches the miss, then another chat creates the project.
+        assert crud.get_project_id_by_name(db, user.id, "Launch") is None
+        _create(other, user, "Launch")
+        crud._project_ids.put(crud._project_ids.key_for(user.id, "launch"), None)
+
+        assert tools.create_project_tool("launch", db=db, user_id=user.id) == "Project 'Launch' already exists."
+
+
+def test_backfilled_duplicates_stay_reachable(session_factory, user):
+    with session_factory() as db:
+        older = models.Project(name="Ideas", owner_id=user.id)
+        newer = models.Project(name="ideas ", owner_id=user.id)
+        db.add_all([older, newer])
+        db.commit()
+        crud.backfill_project_name_norms(db)
+        assert (older.name_norm, newer.name_norm) == ("ideas", f"ideas#{newer.id}")
+        assert crud.get_project_id_by_name(db, user.id, "IDEAS") == older.id
+
+        db.delete(older)
+        db.commit()
+        crud._project_ids.invalidate_owner(user.id)
+        assert crud.get_project_id_by_name(db, user.id, "IDEAS") == newer.id
+
+
+def test_suggestions_by_prefix_then_similarity(session_factory, user):
+    with session_factory() as db:
+        for name in ("Home Renovation", "Home Budget", "Holiday"):
+            _create(db, user, name)
+        assert crud.suggest_project_names(db, user.id, "home") == ["Home Budget", "Home Renovation"]
+        assert crud.suggest_project_names(db, user.id, "Holliday") == ["Holiday"]
+        assert crud.suggest_project_names(db, user.id, "") == []
@@ -0,0 +1,34 @@
+# File: tests/test_reindex.py
+# --- Purpose: Takeout searches imported during a rebuild reach the new generation before the old one is dropped. ---
+
+from core.app import reindex
+
+from tests.conftest import fake_embedding
+from tests.fake_chroma import FakeChroma
+
+
+def _takeout(collection, record_id, query, owner_id):
+    collection.upsert(ids=[record_id], embeddings=[fake_embedding(query)], documents=[query],
+                      metadatas=[{"source": "google_takeout", "owner_id": owner_id}])
+
+
+def test_takeout_imported_after_the_copy_is_caught_up(monkeypatch, session_factory, user, vectors):
+    chroma = FakeChroma()
+    monkeypatch.setattr(reindex, "get_client", lambda: chroma)
+    monkeypatch.setattr(reindex, "SessionLocal", session_factory)
+    old = chroma.get_or_create_collection(f"kairos_notes_u{user.id}")
+    new = chroma.get_or_create_collection(f"kairos_notes_g1_u{user.id}")
+
+    _takeout(old, "takeout_copied", "weather berlin", user.id)
+    _takeout(new, "takeout_copied", "weather berlin", user.id)
+    # Imported after _copy_takeout_vectors ran, so only the old generation has it.
+    _takeout(old, "takeout_late", "train times", user.id)
+    old.upsert(ids=["note_7_p0"], embeddings=[fake_embedding("a note")], documents=["a note"],
+               metadatas=[{"note_id": 7, "owner_id": user.id}])
+
+    assert reindex.catch_up_takeout(previous=0, generation=1) == 1
+    assert sorted(new.records) == ["takeout_copied", "takeout_late"]
+    assert new.records["takeout_late"][1] == "train times"
+    assert new.records["takeout_late"][2]["source"] == "google_takeout"
+    # Running it again finds nothing left to copy.
+    assert reindex.catch_up_takeout(previous=0, generation=1) == 0
@@ -0,0 +1,75 @@
+# File: tests/test_retrieval_batch.py
+# --- Purpose: Several sub-queries are searched in one vector-store call and reported per query. ---
+
+from core.app import crud, schemas
+from core.app.agents import tools
+
+
+def _count_queries(monkeypatch, chroma, user_id):
+    queries = []
+    collection = chroma.get_or_create_collection(f"kairos_notes_u{user_id}")
+    query = collection.query
+
+    def counted(*args, **kwargs):
+        queries.append(kwargs.get("query_embeddings"))
+        return query(*args, **kwargs)
+
+    monkeypatch.setattr(collection, "query", counted)
+    return queries
+
+
+def _index(db, user, title, content):
+    note = crud.create_user_note(db, schemas.NoteCreate(title=title, content=content), user.id)
+    crud._index_note_batch(crud._note_passages(note.id, user.id, note.title, note.content))
+    return note
+
+
+def test_queries_share_one_vector_search(monkeypatch, session_factory, user, chroma):
+    with session_factory() as db:
+        _index(db, user, "Sourdough", "feed the starter twice a day")
+        _index(db, user, "Bikes", "oil the chain every month")
+        queries = _count_queries(monkeypatch, chroma, user.id)
+
+        context = tools.retrieve_context_batch(["sourdough starter", "bike chain"], db, user.id, mode="vector")
+
+    assert len(queries) == 1 and len(queries[0]) == 2
+    first, second = context.split("\n\n")
+    assert first.startswith("### Query 1: sourdough starter\n") and second.startswith("### Query 2: bike chain\n")
+    # Vector search ranks every note for every query; each is written out once, under the first query.
+    assert "feed the starter" in first and "oil the chain" in first
+    assert "No new information" in second and "'Bikes' (query 1)" in second
+
+
+def test_a_note_matching_several_queries_is_shown_under_the_first(session_factory, user, vectors):
+    with session_factory() as db:
+        _index(db, user, "Bread", "sourdough and rye loaves")
+        _index(db, user, "Rye", "rye whiskey tasting notes")
+
+        context = tools.retrieve_context_batch(["sourdough", "rye"], db, user.id, mode="lexical")
+
+    first, second = context.split("\n\n")
+    assert "sourdough and rye loaves" in first
+    assert "rye whiskey" in second and "sourdough and rye" not in second
+    assert "Also relevant, shown above: 'Bread' (query 1)." in second
+
+
+def test_repeated_queries_are_searched_once(monkeypatch, session_factory, user, chroma):
+    with session_factory() as db:
+        _index(db, user, "Sourdough", "feed the starter twice a day")
+        queries = _count_queries(monkeypatch, chroma, user.id)
+
+        context = tools.retrieve_context_batch(["Sourdough starter", "  sourdough   STARTER", ""], db, user.id,
+                                               mode="vector")
+        again = tools.retrieve_context_batch(["sourdough starter"], db, user.id, mode="vector")
+
+    assert context.count("### Query") == 1 and context.startswith("### Query 1: Sourdough starter\n")
+    assert again == context
+    assert len(queries) == 1 and len(queries[0]) == 1
+
+
+def test_invalid_batches_are_rejected(session_factory, user, chroma):
+    with session_factory() as db:
+        too_many = [f"question {i}" for i in range(tools.RETRIEVAL_MAX_QUERIES + 1)]
+        assert tools.retrieve_context_batch(too_many, db, user.id).startswith("Error: At most")
+        assert tools.retrieve_context_batch(["", "  "], db, user.id).startswith("Error: Provide")
+        assert tools.retrieve_context_batch(["q"], db, user.id, mode="fuzzy").startswith("Error: Unknown")
@@ -0,0 +1,96 @@
+# File: tests/test_retrieval_cache.py
+# --- Purpose: Query embeddings and per-user retrieval results are reused until the user's notes change. ---
+
+from core.app import cache, crud, schemas
+from core.app.agents import tools
+
+
+def _count_queries(monkeypatch, chroma, user_id):
+    queries = []
+    collection = chroma.get_or_create_collection(f"kairos_notes_u{user_id}")
+    query = collection.query
+
+    def counted(*args, **kwargs):
+        queries.append(kwargs.get("query_embeddings"))
+        return query(*args, **kwargs)
+
+    monkeypatch.setattr(collection, "query", counted)
+    return queries
+
+
+def _index(db, user, title, content):
+    note = crud.create_user_note(db, schemas.NoteCreate(title=title, content=content), user.id)
+    crud._index_note_batch(crud._note_passages(note.id, user.id, note.title, note.content))
+    return note
+
+
+def test_repeated_query_is_served_from_the_cache(monkeypatch, session_factory, user, chroma):
+    with session_factory() as db:
+        _index(db, user, "Sourdough", "feed the starter twice a day")
+        queries = _count_queries(monkeypatch, chroma, user.id)
+
+        first = tools.retrieve_context("sourdough starter", db, user.id, mode="vector")
+        again = tools.retrieve_context("  Sourdough   STARTER ", db, user.id, mode="vector")
+
+    assert "feed the starter" in first
+    assert again == first
+    assert len(queries) == 1
+
+
+def test_new_note_invalidates_the_owners_results(monkeypatch, session_factory, user, chroma):
+    with session_factory() as db:
+        _index(db, user, "Sourdough", "feed the starter twice a day")
+        queries = _count_queries(monkeypatch, chroma, user.id)
+        before = tools.retrieve_context("starter rye", db, user.id, mode="vector")
+
+        _index(db, user, "Rye", "a rye starter ferments faster")
+        after = tools.retrieve_context("starter rye", db, user.id, mode="vector")
+
+    assert "ferments faster" not in before
+    assert "ferments faster" in after
+    assert len(queries) == 2
+
+
+def test_applied_vector_write_invalidates_results(session_factory, user, chroma):
+    with session_factory() as db:
+        note = crud.create_user_note(db, schemas.NoteCreate(title="Bikes", content="oil the chain"), user.id)
+        # Queued, not yet applied: the search (and its cached result) can't see the note.
+        assert tools.retrieve_context("chain", db, user.id, mode="vector") == \
+            "No relevant information found in the knowledge base."
+
+        crud._apply_vector_batch([{"note_id": note.id, "owner_id": user.id, "op": crud.OUTBOX_UPSERT,
+                                   "passages": crud._note_passages(note.id, user.id, note.title, note.content)}])
+        assert "oil the chain" in tools.retrieve_context("chain", db, user.id, mode="vector")
+
+
+def test_other_owners_results_survive_an_invalidation():
+    results = cache.OwnerScopedCache(16)
+    mine, theirs = results.key_for(101, "q"), results.key_for(102, "q")
+    results.put(mine, "mine")
+    results.put(theirs, "theirs")
+
+    results.invalidate_owner(101)
+    assert results.get(results.key_for(101, "q")) is cache.MISSING
+    assert results.get(results.key_for(102, "q")) == "theirs"
+
+
+def test_result_computed_across_an_invalidation_is_not_served():
+    results = cache.OwnerScopedCache(16)
+    key = results.key_for(101, "q")  # taken before the search starts
+    results.invalidate_owner(101)  # a write lands while it runs
+    results.put(key, "stale")
+    assert results.get(results.key_for(101, "q")) is cache.MISSING
+
+
+def test_query_embeddings_are_reused(monkeypatch, vectors):
+    encoded = []
+    monkeypatch.setattr(crud, "_encode", lambda texts: encoded.extend(texts) or [[1.0] for _ in texts])
+    monkeypatch.setattr(cache, "query_embeddings", cache.LRUCache(8))
+
+    crud.embed_query("What is RRF?")
+    crud.embed_query("  what is   rrf? ")
+    crud.embed_queries(["what is rrf?", "new question"])
+    crud.embed_queries(["transient chat line"], remember=False)
+    crud.embed_queries(["transient chat line"], remember=False)
+
+    assert encoded == ["What is RRF?", "new question", "transient chat line", "transient chat line"]
@@ -0,0 +1,90 @@
+# File: tests/test_search.py
+# --- Purpose: The FTS5 index follows the notes table, and BM25 hits fuse with vector hits. ---
+
+from sqlalchemy import text
+
+from core.app import crud, models, schemas, search
+from core.app.agents import tools
+
+
+def _note(db, user, title, content):
+    return crud.create_user_note(db, schemas.NoteCreate(title=title, content=content), user.id)
+
+
+def _ids(db, user, query):
+    return [hit["note_id"] for hit in search.lexical_search(db, user.id, query)]
+
+
+def test_triggers_keep_the_index_in_sync(session_factory, user, vectors):
+    with session_factory() as db:
+        note = _note(db, user, "Router", "reset with ERR_CONN_RESET")
+        assert _ids(db, user, "ERR_CONN_RESET") == [note.id]
+
+        crud.update_user_note(db, note.id, user.id, schemas.NoteUpdate(content="replaced the cable"))
+        assert _ids(db, user, "ERR_CONN_RESET") == []
+        assert _ids(db, user, "cable") == [note.id]
+
+        crud.delete_user_note(db, note.id, user.id)
+        assert _ids(db, user, "cable") == []
+
+
+def test_existing_notes_are_indexed_when_fts_is_created(session_factory, user):
+    with session_factory() as db:
+        for suffix in ("ai", "ad", "au"):
+            db.execute(text(f"DROP TRIGGER {search.FTS_TABLE}_{suffix}"))
+        db.execute(text(f"DROP TABLE {search.FTS_TABLE}"))
+        db.commit()
+        db.add(models.Note(title="Legacy", content="written before FTS existed", owner_id=user.id))
+        db.commit()
+    search.init_fts(session_factory.engine)
+    with session_factory() as db:
+        assert len(_ids(db, user, "legacy")) == 1
+
+
+def test_lexical_search_is_scoped_to_the_owner(session_factory, user, vectors):
+    with session_factory() as db:
+        other = models.User(email="other@example.com", hashed_password="x")
+        db.add(other)
+        db.commit()
+        crud.create_user_note(db, schemas.NoteCreate(title="Theirs", content="kubectl --dry-run"), other.id)
+        mine = _note(db, user, "Mine", "kubectl apply")
+        assert _ids(db, user, "kubectl") == [mine.id]
+
+
+def test_query_syntax_is_neutralized(session_factory, user, vectors):
+    assert search.to_fts_query('--force "x" a:b NEAR(') == '"--force" OR "x" OR "a:b" OR "NEAR("'
+    assert search.to_fts_query("   ") == ""
+    with session_factory() as db:
+        note = _note(db, user, "Git", "git push --force-with-lease")
+        assert _ids(db, user, "--force-with-lease)") == [note.id]
+        assert search.lexical_search(db, user.id, "   ") == []
+
+
+def test_reciprocal_rank_fusion():
+    fused = search.reciprocal_rank_fusion([["a", "b", "c"], ["c", "d"]])
+    # "c" is in both lists, so it beats "a", which leads only one of them; "b" and "d" tie
+    # at second place and keep the order they were first seen in.
+    assert fused == ["c", "a", "b", "d"]
+    assert search.reciprocal_rank_fusion([["x", "y"], []]) == ["x", "y"]
+
+
+def test_lexical_hit_fuses_with_a_vector_hit_for_the_same_note(session_factory, user, chroma):
+    with session_factory() as db:
+        exact = _note(db, user, "Deploy failure", "the build failed with E1234 after the upgrade")
+        semantic = _note(db, user, "Release notes", "deploy pipeline upgrade checklist")
+        for note in (exact, semantic):
+            crud._index_note_batch(crud._note_passages(note.id, user.id, note.title, note.content))
+
+        lexical = tools._lexical_groups("E1234 upgrade", db, user.id)
+        vector = tools._vector_groups("E1234 upgrade", user.id)
+        fused = tools._fuse_groups(vector, lexical)
+        hybrid = tools.retrieve_context("E1234 upgrade", db, user.id, mode="hybrid")
+
+    assert {group["key"] for group in lexical} == {exact.id, semantic.id}
+    keys = [group["key"] for group in fused]
+    # Each note appears once even though both searches found it.
+    assert sorted(keys) == sorted({exact.id, semantic.id})
+    by_key = {group["key"]: group for group in fused}
+    # A note found by both keeps its vector passages rather than the FTS snippet.
+    assert by_key[exact.id]["passages"][0]["start"] == 0
+    assert hybrid.count("Title: Deploy failure") == 1
@@ -0,0 +1,78 @@
+# File: tests/test_speaker_router.py
+# --- Purpose: The group chat router picks the obvious next speaker and leaves the rest to the LLM. ---
+
+import pytest
+
+from core.app import cache
+from core.app.agents import router
+
+
+class Agent:
+    def __init__(self, name):
+        self.name = name
+
+
+class GroupChat:
+    def __init__(self, agents, messages):
+        self.agents = agents
+        self.messages = messages
+
+    def agent_by_name(self, name):
+        return next(agent for agent in self.agents if agent.name == name)
+
+
+EXECUTOR = Agent("ToolExecutor")
+RESEARCH = Agent("ResearchAgent")
+GHOSTWRITER = Agent("GhostwriterAgent")
+TASKMASTER = Agent("TaskMasterAgent")
+AGENTS = [EXECUTOR, RESEARCH, GHOSTWRITER, TASKMASTER]
+ROLES = {
+    RESEARCH: "Researches web sources, papers, facts.",
+    GHOSTWRITER: "Writes drafts, essays, prose in your voice.",
+    TASKMASTER: "Manages tasks, projects, deadlines, schedules.",
+}
+
+
+@pytest.fixture
+def route(monkeypatch, vectors):
+    monkeypatch.setattr(cache, "query_embeddings", cache.LRUCache(32))
+    speaker_router = router.SpeakerRouter(EXECUTOR, ROLES)
+    return lambda last_speaker, *messages: speaker_router(last_speaker, GroupChat(AGENTS, list(messages)))
+
+
+def test_tool_call_goes_to_the_executor_and_its_result_back(route):
+    call = {"name": "TaskMasterAgent", "content": None, "tool_calls": [{"id": "1", "function": {"name": "create_task"}}]}
+    result = {"role": "tool", "name": "ToolExecutor", "content": "Task created."}
+
+    assert route(TASKMASTER, call) is EXECUTOR
+    assert route(EXECUTOR, call, result) is TASKMASTER
+
+
+def test_a_single_mention_hands_over(route):
+    assert route(RESEARCH, {"content": "GhostwriterAgent, turn these notes into a post."}) is GHOSTWRITER
+    # Naming yourself is not a handover; naming two agents is ambiguous.
+    assert route(RESEARCH, {"content": "ResearchAgent here. TaskMasterAgent, please file this."}) is TASKMASTER
+    before = router.stats()["mention"]
+    route(RESEARCH, {"content": "Ask GhostwriterAgent or TaskMasterAgent."})
+    assert router.stats()["mention"] == before
+
+
+def test_similarity_picks_the_closest_role(route):
+    assert route(RESEARCH, {"content": "Please draft an essay in my voice."}) is GHOSTWRITER
+    assert route(GHOSTWRITER, {"content": "Which deadlines are on the schedules?"}) is TASKMASTER
+    # The last speaker is never picked, even when its role matches best.
+    assert route(TASKMASTER, {"content": "Which deadlines are on the schedules?"}) == "auto"
+
+
+def test_unclear_turns_fall_back_to_the_llm(route, monkeypatch):
+    before = router.stats()["llm_fallback"]
+    assert route(RESEARCH) == "auto"
+    assert route(RESEARCH, {"content": ""}) == "auto"
+    assert route(RESEARCH, {"content": "Hello there!"}) == "auto"
+
+    def unavailable(queries, remember=True):
+        raise RuntimeError("embedding model not loaded")
+
+    monkeypatch.setattr(router.crud, "embed_queries", unavailable)
+    assert route(RESEARCH, {"content": "Please draft an essay in my voice."}) == "auto"
+    assert router.stats()["llm_fallback"] == before + 4
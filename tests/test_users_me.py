@@ -0,0 +1,52 @@
+# File: tests/test_users_me.py
+# --- Purpose: /users/me/ returns aggregate counts and embeds only the collections asked for. ---
+
+from core.app import crud, models, schemas
+
+
+def _populate(session_factory, user):
+    with session_factory() as db:
+        for i in range(3):
+            crud.create_user_note(db, schemas.NoteCreate(title=f"Note {i}", content=f"body {i}"), user.id)
+        garden = crud.create_user_project(db, schemas.ProjectCreate(name="Garden"), user.id)
+        crud.create_user_project(db, schemas.ProjectCreate(name="Taxes"), user.id)
+        crud.create_project_task(db, schemas.TaskCreate(title="Plant beans"), garden.id)
+        crud.create_project_task(db, schemas.TaskCreate(title="Weed"), garden.id)
+        crud.create_anchor_log(db, schemas.MicroAnchorLogCreate(anchor_name="Breathe"), user.id)
+
+        # Another user's rows must not be counted.
+        other = models.User(email="other@example.com", hashed_password="x")
+        db.add(other)
+        db.commit()
+        crud.create_user_note(db, schemas.NoteCreate(title="Theirs", content="not mine"), other.id)
+        theirs = crud.create_user_project(db, schemas.ProjectCreate(name="Garden"), other.id)
+        crud.create_project_task(db, schemas.TaskCreate(title="Not mine"), theirs.id)
+
+
+def test_counts_without_collections(client, session_factory, user):
+    _populate(session_factory, user)
+    response = client.get("/users/me/")
+
+    assert response.status_code == 200
+    assert response.json() == {"id": user.id, "email": user.email, "note_count": 3, "project_count": 2,
+                               "task_count": 2, "anchor_log_count": 1}
+
+
+def test_include_embeds_recent_entries_up_to_the_limit(client, session_factory, user):
+    _populate(session_factory, user)
+    body = client.get("/users/me/", params={"include": "notes, projects", "include_limit": 2}).json()
+
+    assert [note["title"] for note in body["notes"]] == ["Note 2", "Note 1"]
+    assert "content" not in body["notes"][0]  # summaries, not full bodies
+    assert [project["name"] for project in body["projects"]] == ["Taxes", "Garden"]
+    assert sorted(task["title"] for task in body["projects"][1]["tasks"]) == ["Plant beans", "Weed"]
+    assert "anchor_logs" not in body
+    assert body["note_count"] == 3
+
+
+def test_unknown_include_is_rejected(client):
+    response = client.get("/users/me/", params={"include": "notes,friends"})
+    assert response.status_code == 400
+    assert "friends" in response.json()["detail"]
+
+    assert client.get("/users/me/", params={"include_limit": crud.PROFILE_MAX_ITEMS + 1}).status_code == 422
@@ -0,0 +1,113 @@
+# File: tests/test_vector_outbox.py
+# --- Purpose: Note changes leave an outbox row until the vector store has followed them. ---
+
+import pytest
+
+from core.app import crud, models, schemas
+from tests.conftest import fake_embedding
+
+
+def _outbox(db):
+    db.expire_all()
+    return [(entry.note_id, entry.op) for entry in db.query(models.VectorOutbox).order_by(models.VectorOutbox.id)]
+
+
+def _drain(vectors):
+    """Applies everything queued so far, as the embedding queue's worker would."""
+    items, vectors.queued[:] = list(vectors.queued), []
+    crud._apply_vector_batch(items)
+
+
+def _documents(chroma, user):
+    return sorted(record[1] for record in chroma.get_or_create_collection(f"kairos_notes_u{user.id}").records.values())
+
+
+def test_applied_write_clears_its_outbox_row(session_factory, user, chroma, vectors):
+    with session_factory() as db:
+        note = crud.create_user_note(db, schemas.NoteCreate(title="Tea", content="steep for three minutes"), user.id)
+        assert _outbox(db) == [(note.id, crud.OUTBOX_UPSERT)]
+
+        _drain(vectors)
+        assert _outbox(db) == []
+    assert _documents(chroma, user) == ["steep for three minutes"]
+
+
+def test_replace_survives_a_failed_apply_and_is_replayed(session_factory, user, chroma, vectors):
+    with session_factory() as db:
+        note = crud.create_user_note(db, schemas.NoteCreate(title="Tea", content="steep for three minutes"), user.id)
+        _drain(vectors)
+        crud.update_user_note(db, note.id, user.id, schemas.NoteUpdate(content="steep for five minutes"))
+
+        vectors.fail_inline = True
+        with pytest.raises(RuntimeError):
+            _drain(vectors)
+        assert _outbox(db) == [(note.id, crud.OUTBOX_REPLACE)]
+
+        # The next process finds the row and queues it again with the note's current passages.
+        vectors.fail_inline = False
+        assert crud.replay_vector_outbox(db) == 1
+        (item,) = vectors.queued
+        assert item["op"] == crud.OUTBOX_REPLACE
+        assert [p["document"] for p in item["passages"]] == ["steep for five minutes"]
+
+        _drain(vectors)
+        assert _outbox(db) == []
+    assert _documents(chroma, user) == ["steep for five minutes"]
+
+
+def test_replay_turns_upserts_into_replaces_and_missing_notes_into_deletes(session_factory, user, vectors):
+    with session_factory() as db:
+        kept = crud.create_user_note(db, schemas.NoteCreate(title="Kept", content="still here"), user.id)
+        gone = crud.create_user_note(db, schemas.NoteCreate(title="Gone", content="deleted soon"), user.id)
+        crud.delete_user_note(db, gone.id, user.id)
+        vectors.queued.clear()
+
+        assert crud.replay_vector_outbox(db) == 3
+    assert [(item["note_id"], item["op"], bool(item["passages"])) for item in vectors.queued] == [
+        (kept.id, crud.OUTBOX_REPLACE, True),
+        (gone.id, crud.OUTBOX_DELETE, False),
+        (gone.id, crud.OUTBOX_DELETE, False),
+    ]
+
+
+def test_delete_drops_passages_and_the_legacy_vector(session_factory, user, chroma, vectors):
+    with session_factory() as db:
+        note = crud.create_user_note(db, schemas.NoteCreate(title="Old", content="indexed before chunking"), user.id)
+        _drain(vectors)
+        # Notes indexed before chunking have one vector with no note_id metadata.
+        chroma.get_or_create_collection(f"kairos_notes_u{user.id}").upsert(
+            ids=[f"note_{note.id}"], embeddings=[fake_embedding("old")], documents=["legacy"], metadatas=[{}])
+
+        crud.delete_user_note(db, note.id, user.id)
+        _drain(vectors)
+        assert _outbox(db) == []
+    assert _documents(chroma, user) == []
+
+
+def test_only_the_latest_write_of_a_note_is_applied(session_factory, user, chroma, vectors):
+    with session_factory() as db:
+        note = crud.create_user_note(db, schemas.NoteCreate(title="Draft", content="first"), user.id)
+        crud.update_user_note(db, note.id, user.id, schemas.NoteUpdate(content="second"))
+        crud.update_user_note(db, note.id, user.id, schemas.NoteUpdate(content="third"))
+        assert len(_outbox(db)) == 3
+
+        _drain(vectors)
+        assert _outbox(db) == []
+    assert [p["document"] for p in vectors.indexed] == ["third"]
+    assert _documents(chroma, user) == ["third"]
+
+
+def test_api_records_writes_only_for_real_changes(client, session_factory, vectors):
+    note_id = client.post("/notes/", json={"title": "Tea", "content": "green"}).json()["id"]
+    vectors.queued.clear()
+
+    assert client.patch(f"/notes/{note_id}", json={"title": "Tea"}).status_code == 200
+    assert vectors.queued == []
+    assert client.patch(f"/notes/{note_id}", json={"content": "oolong"}).status_code == 200
+    assert client.delete(f"/notes/{note_id}").status_code == 204
+    assert client.delete(f"/notes/{note_id}").status_code == 404
+
+    assert [item["op"] for item in vectors.queued] == [crud.OUTBOX_REPLACE, crud.OUTBOX_DELETE]
+    with session_factory() as db:
+        assert _outbox(db) == [(note_id, crud.OUTBOX_UPSERT), (note_id, crud.OUTBOX_REPLACE),
+                               (note_id, crud.OUTBOX_DELETE)]